@@ -111,6 +111,7 @@ class ActiveLearning:
                                                 uSet=uSet, clf_model=clf_model, dataset=trainDataset,
                                                 budgetSize=self.budget)
             activeSet, uSet = coreSetSampler.query()
+            self.exact_picks = coreSetSampler.exact_picks
             clf_model.train()
 
         elif self.cfg.ACTIVE_LEARNING.SAMPLING_FN.startswith("typiclust"):
@@ -130,6 +131,7 @@ class ActiveLearning:
                                val_dataloader=val_dataloader, train_dataloader=train_dataloader)
             self.delta = herding.delta
             activeSet, uSet = herding.select_samples()
+            self.exact_picks = herding.exact_picks
 
         elif self.cfg.ACTIVE_LEARNING.SAMPLING_FN.lower() in ["herding"]:
             from .herding import Herding
@@ -138,12 +140,14 @@ class ActiveLearning:
                               kernel=self.cfg.ACTIVE_LEARNING.KERNEL,
                               clf_model=clf_model, dataset=trainDataset, dataObj=self.dataObj)
             activeSet, uSet = herding.select_samples()
+            self.exact_picks = herding.exact_picks
 
         elif self.cfg.ACTIVE_LEARNING.SAMPLING_FN.lower() in ["prob_cover", 'probcover']:
             from .prob_cover import ProbCover
             probcov = ProbCover(self.cfg, lSet, uSet, budgetSize=self.budget,
                             delta=self.cfg.ACTIVE_LEARNING.DELTA, dataset=trainDataset)
             activeSet, uSet = probcov.select_samples()
+            self.exact_picks = probcov.exact_picks
 
         elif self.cfg.ACTIVE_LEARNING.SAMPLING_FN == "bald" or self.cfg.ACTIVE_LEARNING.SAMPLING_FN == "BALD":
             activeSet, uSet = self.sampler.bald(budgetSize=self.budget, uSet=uSet, clf_model=clf_model, dataset=trainDataset)
@@ -161,6 +165,12 @@ class ActiveLearning:
             # Do active sampling
             activeSet, uSet = adv_sampler.sample_for_labeling(vae=vae, discriminator=disc, \
                                 unlabeled_dataloader=uSet_loader, uSet=uSet)
+        elif self.cfg.ACTIVE_LEARNING.SAMPLING_FN == "vaal_feat":
+            adv_sampler = AdversarySampler(
+                cfg=self.cfg, dataObj=self.dataObj, budgetSize=self.budget)
+
+            # VAE and discriminator over precomputed features, no image decoding
+            activeSet, uSet = adv_sampler.vaal_features(lSet=lSet, uSet=uSet, dataset=trainDataset)
         else:
             print(f"{self.cfg.ACTIVE_LEARNING.SAMPLING_FN} is either not implemented or there is some spelling mistake.")
             raise NotImplementedError
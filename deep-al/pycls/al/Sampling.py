@@ -11,47 +11,56 @@ import torch
 import math
 import time
 from tqdm import tqdm
-from scipy import stats
 from torch.autograd import Variable
 import torch.nn.functional as F
 import torch.nn as nn
 
 import pycls.datasets.utils as ds_utils
 from pycls.utils.io import compute_cand_size
-from .vaal_util import train_vae_disc
+from .vaal_util import train_vae_disc, train_vae_disc_features
+from .anytime import SelectionDeadline
+from .clustering import make_generator
+from .kcenter import KCenterGreedy, min_dist_to_labeled
+from pycls.datasets.pool_state import remaining
+from .uncertainty import UncertaintyScorer
+from pycls.models.ensemble import StackedEnsemble, variation_ratio
 
 
-def distance(X1, X2, mu):
-    Y1, Y2 = mu
+def gradient_embedding_dist(X1, X2, ind):
+    """
+    l2 distances between the gradient embeddings x1 (x) x2 of all points and that of point ind.
+    Uses |a (x) b|^2 = |a|^2 |b|^2 and <a (x) b, c (x) d> = <a, c> <b, d>, so the
+    (C*D)-dim embeddings are never materialized.
+    """
     X1_vec, X1_norm_square = X1
     X2_vec, X2_norm_square = X2
-    Y1_vec, Y1_norm_square = Y1
-    Y2_vec, Y2_norm_square = Y2
-    dist = X1_norm_square * X2_norm_square + Y1_norm_square * Y2_norm_square - 2 * (X1_vec @ Y1_vec) * (X2_vec @ Y2_vec)
+    dist = X1_norm_square * X2_norm_square + X1_norm_square[ind] * X2_norm_square[ind] \
+        - 2 * (X1_vec @ X1_vec[ind]) * (X2_vec @ X2_vec[ind])
     # Numerical errors may cause the distance squared to be negative.
-    assert np.min(dist) / np.max(dist) > -1e-4
-    dist = np.sqrt(np.clip(dist, a_min=0, a_max=None))
-    return dist
+    return dist.clamp_(min=0).sqrt_()
 
 
-def init_centers(X1, X2, chosen, chosen_list,  mu, D2):
-    if len(chosen) == 0:
-        ind = np.argmax(X1[1] * X2[1])
-        mu = [((X1[0][ind], X1[1][ind]), (X2[0][ind], X2[1][ind]))]
-        D2 = distance(X1, X2, mu[0]).ravel().astype(float)
-        D2[ind] = 0
-    else:
-        newD = distance(X1, X2, mu[-1]).ravel().astype(float)
-        D2 = np.minimum(D2, newD)
-        D2[chosen_list] = 0
-        Ddist = (D2 ** 2) / sum(D2 ** 2)
-        customDist = stats.rv_discrete(name='custm', values=(np.arange(len(Ddist)), Ddist))
-        ind = customDist.rvs(size=1)[0]
-        while ind in chosen: ind = customDist.rvs(size=1)[0]
-        mu.append(((X1[0][ind], X1[1][ind]), (X2[0][ind], X2[1][ind])))
-    chosen.add(ind)
-    chosen_list.append(ind)
-    return chosen, chosen_list, mu, D2
+def kmeans_pp_centers(X1, X2, budgetSize, generator):
+    """
+    k-means++ seeding over the implicit gradient embeddings (BADGE).
+    The running D vector stays on the device of X1 and the next center is drawn with
+    torch.multinomial over D^2, masked at the already chosen points.
+    """
+    n = X1[0].shape[0]
+    chosen = torch.zeros(n, dtype=torch.bool, device=X1[0].device)
+    ind = torch.argmax(X1[1] * X2[1])
+    D2 = gradient_embedding_dist(X1, X2, ind)
+    chosen_list = [ind]
+    chosen[ind] = True
+    for _ in range(budgetSize - 1):
+        weights = (D2 ** 2).masked_fill_(chosen, 0)
+        if weights.sum() <= 0:
+            weights = (~chosen).float()
+        ind = torch.multinomial(weights, 1, generator=generator)[0]
+        chosen_list.append(ind)
+        chosen[ind] = True
+        D2 = torch.minimum(D2, gradient_embedding_dist(X1, X2, ind))
+    return torch.stack(chosen_list).cpu().numpy()
 
 
 def compute_norm(x1, x2, device, batch_size=512, save_dir=None):
@@ -267,10 +276,14 @@ class CoreSetMIPSampling():
     """
     Implements coreset MIP sampling operation
     """
-    def __init__(self, cfg, dataObj, lSet, uSet, dataset, budgetSize, clf_model=None, isMIP = False, device='cuda'):
+    def __init__(self, cfg, dataObj, lSet, uSet, dataset, budgetSize, clf_model=None, isMIP = False, device='cuda',
+                 time_budget=None):
         self.dataObj = dataObj
         self.cuda_id = torch.cuda.current_device()
         self.cfg = cfg
+        if time_budget is None:
+            time_budget = self.cfg.ACTIVE_LEARNING.TIME_BUDGET
+        self.deadline = SelectionDeadline(time_budget)
         self.isMIP = isMIP
         self.device = device
         self.budgetSize = budgetSize
@@ -309,98 +322,19 @@ class CoreSetMIPSampling():
         features = np.concatenate(features, axis=0)
         return features
 
-    def gpu_compute_dists(self,M1,M2):
-        """
-        Computes L2 norm square on gpu
-        Assume
-        M1: M x D matrix
-        M2: N x D matrix
-
-        output: M x N matrix
-        """
-        M1_norm = (M1**2).sum(1).reshape(-1,1)
-
-        M2_t = torch.transpose(M2, 0, 1)
-        M2_norm = (M2**2).sum(1).reshape(1,-1)
-        dists = M1_norm + M2_norm - 2.0 * torch.mm(M1, M2_t)
-        return dists
-
-    def compute_dists(self, X, X_train):
-        dists = -2 * np.dot(X, X_train.T) + np.sum(X_train**2,axis=1) + np.sum(X**2, axis=1).reshape((-1,1))
-        return dists
-
-    def optimal_greedy_k_center(self, labeled, unlabeled):
-        n_lSet = labeled.shape[0]
-        lSetIds = np.arange(n_lSet)
-        n_uSet = unlabeled.shape[0]
-
-        #order is important
-        features = np.vstack((labeled,unlabeled))
-        print("Started computing distance matrix of {}x{}".format(features.shape[0], features.shape[0]))
-        start = time.time()
-        distance_mat = self.compute_dists(features, features)
-        end = time.time()
-        print("Distance matrix computed in {} seconds".format(end-start))
-        greedy_indices = []
-        for i in range(self.budgetSize):
-            if i!=0 and i%500==0:
-                print("Sampled {} samples".format(i))
-            lab_temp_indexes = np.array(np.append(lSetIds, greedy_indices),dtype=int)
-            min_dist = np.min(distance_mat[lab_temp_indexes, n_lSet:],axis=0)
-            active_index = np.argmax(min_dist)
-            greedy_indices.append(n_lSet + active_index)
-
-        remainSet = set(np.arange(features.shape[0])) - set(greedy_indices) - set(lSetIds)
-        remainSet = np.array(list(remainSet))
-        return greedy_indices-n_lSet, remainSet
-
     def greedy_k_center(self, labeled, unlabeled):
-        greedy_indices = [None for i in range(self.budgetSize)]
-        greedy_indices_counter = 0
-
-        print(f"[GPU] Labeled.shape: {labeled.shape}")
-        print(f"[GPU] Unlabeled.shape: {unlabeled.shape}")
-        # get the minimum distances between the labeled and unlabeled examples (iteratively, to avoid memory issues):
+        print(f"Labeled.shape: {labeled.shape}")
+        print(f"Unlabeled.shape: {unlabeled.shape}")
         st = time.time()
-        min_dist,_ = torch.min(self.gpu_compute_dists(labeled[0,:].reshape((1,labeled.shape[1])), unlabeled), dim=0)
-        min_dist = torch.reshape(min_dist, (1, min_dist.shape[0]))
+        engine = KCenterGreedy(labeled, unlabeled, device=self.device,
+                               num_candidates=self.cfg.ACTIVE_LEARNING.KCENTER_CANDIDATES)
         print(f"time taken: {time.time() - st} seconds")
 
-        temp_range = 500
-        dist = np.empty((temp_range, unlabeled.shape[0]))
-        for j in tqdm(range(1, labeled.shape[0], temp_range), desc="Getting first farthest index"):
-            if j + temp_range < labeled.shape[0]:
-                dist = self.gpu_compute_dists(labeled[j:j+temp_range, :], unlabeled)
-            else:
-                dist = self.gpu_compute_dists(labeled[j:, :], unlabeled)
-
-            min_dist = torch.cat((min_dist, torch.min(dist,dim=0)[0].reshape((1,min_dist.shape[1]))))
-
-            min_dist = torch.min(min_dist, dim=0)[0]
-            min_dist = torch.reshape(min_dist, (1, min_dist.shape[0]))
-
-        # iteratively insert the farthest index and recalculate the minimum distances:
-        _, farthest = torch.max(min_dist, dim=1)
-        greedy_indices [greedy_indices_counter] = farthest.item()
-        greedy_indices_counter += 1
-
-        amount = self.budgetSize-1
-
-        for i in tqdm(range(amount), desc = "Constructing Active set"):
-            dist = self.gpu_compute_dists(unlabeled[greedy_indices[greedy_indices_counter-1], :].reshape((1,unlabeled.shape[1])), unlabeled)
-
-            min_dist = torch.cat((min_dist, dist.reshape((1, min_dist.shape[1]))))
-
-            min_dist, _ = torch.min(min_dist, dim=0)
-            min_dist = min_dist.reshape((1, min_dist.shape[0]))
-            _, farthest = torch.max(min_dist, dim=1)
-            greedy_indices [greedy_indices_counter] = farthest.item()
-            greedy_indices_counter += 1
-
-        remainSet = set(np.arange(unlabeled.shape[0])) - set(greedy_indices)
-        remainSet = np.array(list(remainSet))
+        greedy_indices, remainSet = engine.select(self.budgetSize, deadline=self.deadline)
+        self.exact_picks = engine.exact_picks
+        self.deadline.report(self.exact_picks)
         if self.isMIP:
-            return greedy_indices,remainSet,math.sqrt(np.max(min_dist))
+            return greedy_indices, remainSet, math.sqrt(engine.max_min_dist())
         else:
             return greedy_indices, remainSet
 
@@ -535,8 +469,6 @@ class Sampling:
             best_temp = 1.0
 
         clf = model.cuda()
-        embDim = clf.fc_in_dim
-        num_classes = clf.num_classes
 
         if herding:
             subset_size = compute_cand_size(len(lSet) * 1., budgetSize, max_size=35000)
@@ -550,21 +482,16 @@ class Sampling:
         uSetLoader = self.dataObj.getSequentialDataLoader(indexes=subset_uSet, batch_size=256, data=dataset)
         uSetLoader.dataset.no_aug = True
 
-        embeddings = torch.zeros([subset_size, embDim])
-        probs = torch.zeros(subset_size, num_classes)
-        idxs = 0
+        embeddings = []
+        probs = []
         for i, (x_u, _) in enumerate(tqdm(uSetLoader, desc="uSet Activations")):
             with torch.no_grad():
-                x_u = Variable(x_u.cuda())
+                x_u = x_u.cuda()
                 output_dict = clf(x_u)
-                out = output_dict['features'].cpu()
-                cout = output_dict['preds'].cpu()
-
-                batchProbs = F.softmax(cout / best_temp, dim=1)
-                for j in range(len(x_u)):
-                    probs[idxs] = batchProbs[j]
-                    embeddings[idxs] = out[j]
-                    idxs += 1
+                embeddings.append(output_dict['features'].cpu())
+                probs.append(F.softmax(output_dict['preds'] / best_temp, dim=1).cpu())
+        embeddings = torch.cat(embeddings, dim=0)
+        probs = torch.cat(probs, dim=0)
 
         if normalize:
             embeddings = F.normalize(embeddings, dim=-1)
@@ -577,21 +504,16 @@ class Sampling:
             lSetLoader = self.dataObj.getSequentialDataLoader(indexes=lSet, batch_size=256, data=dataset)
             lSetLoader.dataset.no_aug = True
 
-            l_embeddings = torch.zeros([len(lSet), embDim])
-            l_probs = torch.zeros(len(lSet), num_classes)
-            idxs = 0
+            l_embeddings = []
+            l_probs = []
             for i, (x_l, _) in enumerate(tqdm(lSetLoader, desc="uSet Activations")):
                 with torch.no_grad():
-                    x_l = Variable(x_l.cuda())
+                    x_l = x_l.cuda()
                     output_dict = clf(x_l)
-                    out = output_dict['features'].cpu()
-                    cout = output_dict['preds'].cpu()
-
-                    batchProbs = F.softmax(cout / best_temp, dim=1)
-                    for j in range(len(x_l)):
-                        l_probs[idxs] = batchProbs[j]
-                        l_embeddings[idxs] = out[j]
-                        idxs += 1
+                    l_embeddings.append(output_dict['features'].cpu())
+                    l_probs.append(F.softmax(output_dict['preds'] / best_temp, dim=1).cpu())
+            l_embeddings = torch.cat(l_embeddings, dim=0)
+            l_probs = torch.cat(l_probs, dim=0)
 
             if normalize:
                 l_embeddings = F.normalize(l_embeddings, dim=-1)
@@ -633,18 +555,16 @@ class Sampling:
                 probs, embeddings, budgetSize, l_probs=l_probs, l_embeddings=l_embeddings,
                 kernel_name='rbf', h=h, init=init)
         else:
-            mu = None
-            D2 = None
-            chosen = set()
-            emb_norms_square = np.sum(embeddings ** 2, axis=-1)
-
-            prob_norms_square = np.sum(probs ** 2, axis=-1)
-            for _ in range(budgetSize):
-                chosen, chosen_list, mu, D2 = init_centers((probs, prob_norms_square), (embeddings, emb_norms_square), chosen, chosen_list, mu, D2)
+            probs_t = torch.from_numpy(np.ascontiguousarray(probs)).float().cuda()
+            embeddings_t = torch.from_numpy(np.ascontiguousarray(embeddings)).float().cuda()
+            emb_norms_square = torch.sum(embeddings_t ** 2, dim=-1)
+            prob_norms_square = torch.sum(probs_t ** 2, dim=-1)
+            chosen_list = kmeans_pp_centers((probs_t, prob_norms_square), (embeddings_t, emb_norms_square),
+                                            budgetSize, generator=make_generator(probs_t.device))
 
 
         activeSet = subset_uSet[chosen_list]
-        remainSet = np.array(sorted(list(set(uSet) - set(activeSet))))
+        remainSet = remaining(uSet, activeSet)
         assert len(activeSet.shape) == 1 and  len(activeSet) == budgetSize
 
         print(f'Finished the selection of {len(activeSet)} samples.')
@@ -779,7 +699,7 @@ class Sampling:
             print(f'sampling took {time.time() - start_time}sec')
 
         activeSet = uSet[chosen_list]
-        remainSet = np.array(sorted(list(set(total_uSet) - set(activeSet))))
+        remainSet = remaining(total_uSet, activeSet)
         assert len(activeSet.shape) == 1 and  len(activeSet) == budgetSize
 
         print(f'Finished the selection of {len(activeSet)} samples.')
@@ -789,6 +709,42 @@ class Sampling:
         return activeSet, remainSet
 
 
+    def head_only_dropout(self, clf_model):
+        """
+        True if the only dropout of clf_model sits between the penultimate features and
+        clf_model.fc (as in ResNet), so MC-dropout only needs the classifier head.
+        """
+        dropouts = [m for m in clf_model.modules() if isinstance(m, torch.nn.Dropout)]
+        return getattr(clf_model, 'use_dropout', False) and hasattr(clf_model, 'fc') \
+            and len(dropouts) == 1 and dropouts[0] is getattr(clf_model, 'drop', None)
+
+    @torch.no_grad()
+    def bald_head_only(self, uSet, clf_model, dataset):
+        """
+        BALD scores from a single backbone pass: the penultimate features of each batch are
+        reused for all DROPOUT_ITERATIONS dropout masks, drawn as one T x B x D tensor and
+        evaluated with one batched matmul through clf_model.fc.
+        """
+        T = self.cfg.ACTIVE_LEARNING.DROPOUT_ITERATIONS
+        p = clf_model.drop.p
+        clf_model.eval()
+
+        uSetLoader = self.dataObj.getSequentialDataLoader(indexes=uSet, batch_size=int(self.cfg.TRAIN.BATCH_SIZE/self.cfg.NUM_GPUS),data=dataset)
+        uSetLoader.dataset.no_aug = True
+        U_X = []
+        for x, _ in tqdm(uSetLoader, desc="Head-only dropout iterations"):
+            x = x.cuda(self.cuda_id)
+            z = clf_model(x)['features'] # B x D, dropout is inactive in eval mode
+            masks = torch.empty((T,) + z.shape, device=z.device).bernoulli_(1 - p).div_(1 - p)
+            dropout_score = F.softmax(clf_model.fc(masks * z.unsqueeze(0)), dim=-1) # T x B x C
+
+            avg_pi = dropout_score.mean(dim=0)
+            G_X = -torch.sum(avg_pi * torch.log2(avg_pi + 1e-6), dim=-1)
+            F_X = -torch.sum(dropout_score * torch.log2(dropout_score + 1e-6), dim=-1).mean(dim=0)
+            U_X.append(G_X - F_X)
+        uSetLoader.dataset.no_aug = False
+        return torch.cat(U_X).cpu().numpy()
+
     def bald(self, budgetSize, uSet, clf_model, dataset):
         "Implements BALD acquisition function where we maximize information gain."
 
@@ -796,6 +752,15 @@ class Sampling:
 
         assert self.cfg.ACTIVE_LEARNING.DROPOUT_ITERATIONS != 0, "Expected dropout iterations > 0."
 
+        if self.cfg.ACTIVE_LEARNING.BALD_HEAD_ONLY and self.head_only_dropout(clf_model):
+            U_X = self.bald_head_only(uSet, clf_model, dataset)
+            sorted_idx = np.argsort(U_X)[::-1]
+            activeSet = uSet[sorted_idx[:budgetSize]]
+            remainSet = uSet[sorted_idx[budgetSize:]]
+            # Setting task model in train mode for further learning
+            clf_model.train()
+            return activeSet, remainSet
+
         #Set Batchnorm in eval mode whereas dropout in train mode
         clf_model.train()
         for m in clf_model.modules():
@@ -854,36 +819,24 @@ class Sampling:
         For more details refer equation 4 in
         http://openaccess.thecvf.com/content_cvpr_2018/papers/Beluch_The_Power_of_CVPR_2018_paper.pdf
         """
-        from scipy import stats
         T = len(clf_models)
 
         for cmodel in clf_models:
             cmodel.cuda(self.cuda_id)
             cmodel.eval()
+        ensemble = StackedEnsemble(clf_models).cuda(self.cuda_id).eval()
 
         uSetLoader = self.dataObj.getSequentialDataLoader(indexes=uSet, batch_size=int(self.cfg.TRAIN.BATCH_SIZE/self.cfg.NUM_GPUS),data=dataset)
         uSetLoader.dataset.no_aug = True
         print("len usetLoader: {}".format(len(uSetLoader)))
 
-        temp_i=0
-        var_r_scores = np.zeros((len(uSet),1), dtype=float)
-
-        for k, (x_u, y_u) in enumerate(tqdm(uSetLoader, desc="uSet Forward Passes through "+str(T)+" models")):
-            x_u = x_u.type(torch.cuda.FloatTensor)
-            ens_preds = np.zeros((x_u.shape[0], T), dtype=float)
-            for i in range(len(clf_models)):
-               with torch.no_grad():
-                    x_u = x_u.cuda(self.cuda_id)
-                    y_u = y_u.cuda(self.cuda_id)
-                    temp_op = clf_models[i](x_u, y_u)
-                    _, temp_pred = torch.max(temp_op, 1)
-                    temp_pred = temp_pred.cpu().numpy()
-                    ens_preds[:,i] = temp_pred
-            _, mode_cnt = stats.mode(ens_preds, 1)
-            temp_varr = 1.0 - (mode_cnt / T*1.0)
-            var_r_scores[temp_i : temp_i+x_u.shape[0]] = temp_varr
-
-            temp_i = temp_i + x_u.shape[0]
+        var_r_scores = []
+        for k, (x_u, _) in enumerate(tqdm(uSetLoader, desc="uSet Forward Passes through "+str(T)+" models")):
+            with torch.no_grad():
+                x_u = x_u.cuda(self.cuda_id).float()
+                # one batched forward for all committee members, vote on-device
+                var_r_scores.append(variation_ratio(ensemble(x_u)))
+        var_r_scores = torch.cat(var_r_scores).cpu().numpy()
 
         var_r_scores = np.squeeze(np.array(var_r_scores))
         print("var_r_scores: ")
@@ -897,115 +850,48 @@ class Sampling:
         uSetLoader.dataset.no_aug = False
         return activeSet, remainSet
 
-    def confidence(self, budgetSize, lSet, uSet, model, dataset):
-
+    def uncertainty(self, budgetSize, lSet, uSet, model, dataset, measure):
         """
-        Implements the uncertainty principle as a acquisition function.
+        Picks the budgetSize points of uSet with the highest uncertainty (conf, entropy or margin).
+        The pool is streamed once and only a running top-budgetSize is kept, see UncertaintyScorer.
         """
-        num_classes = self.cfg.MODEL.NUM_CLASSES
         assert model.training == False, "Model expected in eval mode whereas currently it is in {}".format(model.training)
 
         clf = model.cuda()
-        subset_size = 10000
-        subset_uSet = np.random.permutation(uSet)[:subset_size]
-
-        u_ranks = []
-        x_ls, y_ls = self.get_lSet(lSet, dataset)
+        pool_size = self.cfg.ACTIVE_LEARNING.UNC_POOL_SIZE
+        pool = np.random.permutation(uSet)[:pool_size] if 0 < pool_size < len(uSet) else uSet
 
-        uSetLoader = self.dataObj.getSequentialDataLoader(indexes=subset_uSet, batch_size=256, data=dataset)
+        uSetLoader = self.dataObj.getSequentialDataLoader(indexes=pool, batch_size=256, data=dataset)
         uSetLoader.dataset.no_aug = True
+        print("len(uSetLoader): {}".format(len(uSetLoader)))
 
-        n_uLoader = len(uSetLoader)
-        print("len(uSetLoader): {}".format(n_uLoader))
-        for i, (x_u, y_u) in enumerate(tqdm(uSetLoader, desc="uSet Activations")):
-            with torch.no_grad():
-                x_u = x_u.cuda(0)
-                y_u = y_u.cuda(0)
-
-                try:
-                    temp_u_rank = torch.nn.functional.softmax(clf(x_u, y_u)['preds'], dim=1)
-                except:
-                    temp_u_rank = torch.nn.functional.softmax(clf(x_ls, y_ls, x_u, return_logits=True)['preds'], dim=1)
-
-                temp_u_rank, _ = torch.max(temp_u_rank, dim=1)
-                temp_u_rank = 1 - temp_u_rank
-                u_ranks.append(temp_u_rank.detach().cpu().numpy())
-
-        u_ranks = np.concatenate(u_ranks, axis=0)
-        # Now u_ranks has shape: [U_Size x 1]
-
-        # index of u_ranks serve as key to refer in u_idx
-        print(f"u_ranks.shape: {u_ranks.shape}")
-        # we add -1 for reversing the sorted array
-        sorted_idx = np.argsort(u_ranks)[::-1] # argsort helps to return the indices of u_ranks such that their corresponding values are sorted.
-        activeSet = sorted_idx[:budgetSize]
-
-        activeSet = subset_uSet[activeSet].astype(int)
-        remainSet = np.array(sorted(list(set(uSet) - set(activeSet))))
+        scorer = UncertaintyScorer(clf, budgetSize, measures=[measure], device=torch.device('cuda', 0),
+                                   lSet_fn=lambda: self.get_lSet(lSet, dataset))
+        activeSet = pool[scorer.select(uSetLoader)[measure]].astype(int)
+        remainSet = np.setdiff1d(uSet, activeSet)
         uSetLoader.dataset.no_aug = False
         assert len(activeSet.shape) == 1 and  len(activeSet) == budgetSize
 
         print(f'Finished the selection of {len(activeSet)} samples.')
         print(f'Active set is {activeSet}')
 
-
         return activeSet, remainSet
 
 
-    def entropy(self, budgetSize, lSet, uSet, model, dataset, val_dataloader=None):
+    def confidence(self, budgetSize, lSet, uSet, model, dataset):
 
         """
         Implements the uncertainty principle as a acquisition function.
         """
-        assert model.training == False, "Model expected in eval mode whereas currently it is in {}".format(model.training)
-
-        clf = model.cuda()
-
-        best_temp = 1.0
-        subset_size = 10000
-        subset_uSet = np.random.permutation(uSet)[:subset_size]
-
-        u_ranks = []
-        x_ls, y_ls = self.get_lSet(lSet, dataset)
-        x_ls = x_ls.cuda(0)
-        y_ls = y_ls.to(x_ls.device)
-
-        uSetLoader = self.dataObj.getSequentialDataLoader(indexes=subset_uSet, batch_size=256, data=dataset)
-        uSetLoader.dataset.no_aug = True
-
-        n_uLoader = len(uSetLoader)
-        print("len(uSetLoader): {}".format(n_uLoader))
-        for i, (x_u, y_u) in enumerate(tqdm(uSetLoader, desc="uSet Activations")):
-            with torch.no_grad():
-                x_u = x_u.cuda(0)
-                y_u = y_u.to(x_u.device)
+        return self.uncertainty(budgetSize, lSet, uSet, model, dataset, measure='conf')
 
-                logits = clf(x_u, y_u)['preds']
-                logits = logits / best_temp
-                temp_u_rank = torch.nn.functional.softmax(logits, dim=1)
 
-                temp_u_rank = temp_u_rank * torch.log(temp_u_rank + 1e-8)
-                temp_u_rank = -1*torch.sum(temp_u_rank, dim=1)
-                u_ranks.append(temp_u_rank.detach().cpu().numpy())
-
-        u_ranks = np.concatenate(u_ranks, axis=0)
-        # Now u_ranks has shape: [U_Size x 1]
-
-        # index of u_ranks serve as key to refer in u_idx
-        print(f"u_ranks.shape: {u_ranks.shape}")
-        # we add -1 for reversing the sorted array
-        sorted_idx = np.argsort(u_ranks)[::-1] # argsort helps to return the indices of u_ranks such that their corresponding values are sorted.
-        activeSet = sorted_idx[:budgetSize]
-
-        activeSet = subset_uSet[activeSet].astype(int)
-        remainSet = np.array(sorted(list(set(uSet) - set(activeSet))))
-        uSetLoader.dataset.no_aug = False
-        assert len(activeSet.shape) == 1 and  len(activeSet) == budgetSize
-
-        print(f'Finished the selection of {len(activeSet)} samples.')
-        print(f'Active set is {activeSet}')
+    def entropy(self, budgetSize, lSet, uSet, model, dataset, val_dataloader=None):
 
-        return activeSet, remainSet
+        """
+        Implements the uncertainty principle as a acquisition function.
+        """
+        return self.uncertainty(budgetSize, lSet, uSet, model, dataset, measure='entropy')
 
 
     def margin(self, budgetSize, lSet, uSet, model, dataset):
@@ -1013,53 +899,7 @@ class Sampling:
         """
         Implements the uncertainty principle as a acquisition function.
         """
-        assert model.training == False, "Model expected in eval mode whereas currently it is in {}".format(model.training)
-
-        clf = model.cuda()
-        subset_size = 10000
-        subset_uSet = np.random.permutation(uSet)[:subset_size]
-
-        u_ranks = []
-        x_ls, y_ls = self.get_lSet(lSet, dataset)
-
-        uSetLoader = self.dataObj.getSequentialDataLoader(indexes=subset_uSet, batch_size=256, data=dataset)
-        uSetLoader.dataset.no_aug = True
-
-        n_uLoader = len(uSetLoader)
-        print("len(uSetLoader): {}".format(n_uLoader))
-        for i, (x_u, y_u) in enumerate(tqdm(uSetLoader, desc="uSet Activations")):
-            with torch.no_grad():
-                x_u = x_u.cuda(0)
-                y_u = y_u.cuda(0)
-                try:
-                    temp_u_rank = torch.nn.functional.softmax(clf(x_u, y_u)['preds'], dim=1)
-                except:
-                    temp_u_rank = torch.nn.functional.softmax(clf(x_ls, y_ls, x_u,
-                                                                  return_logits=True)['preds'], dim=1)
-
-                temp_u_rank, _ = torch.sort(temp_u_rank, descending=True)
-                difference = temp_u_rank[:, 0] - temp_u_rank[:, 1]
-                # for code consistency across uncertainty, entropy methods i.e., picking datapoints with max value
-                difference = 1.0 - difference
-                u_ranks.append(difference.detach().cpu().numpy())
-        u_ranks = np.concatenate(u_ranks, axis=0)
-        # Now u_ranks has shape: [U_Size x 1]
-
-        # index of u_ranks serve as key to refer in u_idx
-        print(f"u_ranks.shape: {u_ranks.shape}")
-        # we add -1 for reversing the sorted array
-        sorted_idx = np.argsort(u_ranks)[::-1] # argsort helps to return the indices of u_ranks such that their corresponding values are sorted.
-        activeSet = sorted_idx[:budgetSize]
-
-        activeSet = subset_uSet[activeSet].astype(int)
-        remainSet = np.array(sorted(list(set(uSet) - set(activeSet))))
-        uSetLoader.dataset.no_aug = False
-        assert len(activeSet.shape) == 1 and  len(activeSet) == budgetSize
-
-        print(f'Finished the selection of {len(activeSet)} samples.')
-        print(f'Active set is {activeSet}')
-
-        return activeSet, remainSet
+        return self.uncertainty(budgetSize, lSet, uSet, model, dataset, measure='margin')
 
 
 class AdversarySampler:
@@ -1077,10 +917,6 @@ class AdversarySampler:
             cfg.VAAL.IM_SIZE = 32
 
 
-    def compute_dists(self, X, X_train):
-        dists = -2 * np.dot(X, X_train.T) + np.sum(X_train**2,axis=1) + np.sum(X**2, axis=1)[:, np.newaxis]
-        return dists
-
     def vaal_perform_training(self, lSet, uSet, dataset, debug=False):
         oldmode = self.dataObj.eval_mode
         self.dataObj.eval_mode = True
@@ -1097,40 +933,45 @@ class AdversarySampler:
 
         return vae, disc, uSetLoader
 
+    @torch.no_grad()
+    def feature_disc_scores(self, vae, discriminator, features, batch_size=8192):
+        """Discriminator probability of being labeled for every feature row."""
+        vae.eval()
+        discriminator.eval()
+        preds = []
+        for i in range(0, features.shape[0], batch_size):
+            _, _, mu, _ = vae(features[i:i + batch_size])
+            preds.append(discriminator(mu).view(-1))
+        return torch.cat(preds)
+
+    def vaal_features(self, lSet, uSet, dataset):
+        """
+        VAAL on the fixed features of ds_utils.load_features: the VAE and discriminator are MLPs
+        trained from in-memory feature tensors, and the points the discriminator finds least
+        likely to be labeled are selected.
+        """
+        feature_type = self.cfg.ACTIVE_LEARNING.UNC_FEATURE
+        all_features = ds_utils.load_features(self.cfg.DATASET.NAME, self.cfg.RNG_SEED, train=True, is_diffusion=False,
+                                              feature_type=feature_type, dataset=dataset)
+        device = f'cuda:{self.cuda_id}'
+        l_features = torch.as_tensor(all_features[lSet.astype(int)], dtype=torch.float32, device=device)
+        u_features = torch.as_tensor(all_features[uSet.astype(int)], dtype=torch.float32, device=device)
+
+        vae, disc = train_vae_disc_features(self.cfg, l_features, u_features)
+        preds = self.feature_disc_scores(vae, disc, u_features)
+
+        # select the points which the discriminator thinks are the most likely to be unlabeled
+        querry_indices = torch.topk(-preds, int(self.budget)).indices.cpu().numpy()
+        remain_mask = np.ones(len(uSet), dtype=bool)
+        remain_mask[querry_indices] = False
+        activeSet = uSet[querry_indices]
+        remainSet = uSet[remain_mask]
+        return activeSet, remainSet
+
     def greedy_k_center(self, labeled, unlabeled):
-        greedy_indices = []
-
-        # get the minimum distances between the labeled and unlabeled examples (iteratively, to avoid memory issues):
-        min_dist = np.min(self.compute_dists(labeled[0, :].reshape((1, labeled.shape[1])), unlabeled), axis=0)
-        min_dist = min_dist.reshape((1, min_dist.shape[0]))
-        temp_range = 1000
-        for j in range(1, labeled.shape[0], temp_range):
-            if j + temp_range < labeled.shape[0]:
-                dist = self.compute_dists(labeled[j:j+temp_range, :], unlabeled)
-            else:
-                dist = self.compute_dists(labeled[j:, :], unlabeled)
-            min_dist = np.vstack((min_dist, np.min(dist, axis=0).reshape((1, min_dist.shape[1]))))
-            min_dist = np.min(min_dist, axis=0)
-            min_dist = min_dist.reshape((1, min_dist.shape[0]))
-
-        # iteratively insert the farthest index and recalculate the minimum distances:
-        farthest = np.argmax(min_dist)
-        greedy_indices.append(farthest)
-
-        amount = self.cfg.ACTIVE_LEARNING.BUDGET_SIZE-1
-        for i in range(amount):
-            if i!=0 and i%500 == 0:
-                print("{} Sampled out of {}".format(i, amount+1))
-            dist = self.compute_dists(unlabeled[greedy_indices[-1], :].reshape((1,unlabeled.shape[1])), unlabeled)
-            min_dist = np.vstack((min_dist, dist.reshape((1, min_dist.shape[1]))))
-            min_dist = np.min(min_dist, axis=0)
-            min_dist = min_dist.reshape((1, min_dist.shape[0]))
-            farthest = np.argmax(min_dist)
-            greedy_indices.append(farthest)
-
-        remainSet = set(np.arange(unlabeled.shape[0])) - set(greedy_indices)
-        remainSet = np.array(list(remainSet))
-        return greedy_indices, remainSet
+        engine = KCenterGreedy(labeled, unlabeled, device=f'cuda:{self.cuda_id}',
+                               num_candidates=self.cfg.ACTIVE_LEARNING.KCENTER_CANDIDATES)
+        return engine.select(self.budget)
 
 
     def get_vae_activations(self, vae, dataLoader):
@@ -1181,49 +1022,12 @@ class AdversarySampler:
         return all_preds
 
 
-    def gpu_compute_dists(self, M1, M2):
-        """
-        Computes L2 norm square on gpu
-        Assume
-        M1: M x D matrix
-        M2: N x D matrix
-
-        output: M x N matrix
-        """
-        M1_norm = (M1**2).sum(1).reshape(-1,1)
-
-        M2_t = torch.transpose(M2, 0, 1)
-        M2_norm = (M2**2).sum(1).reshape(1,-1)
-        dists = M1_norm + M2_norm - 2.0 * torch.mm(M1, M2_t)
-        return dists
-
-
     def efficient_compute_dists(self, labeled, unlabeled):
         """
+        Returns the squared distance from every unlabeled point to its nearest labeled point, as a N_U x 1 matrix.
         """
-        N_L = labeled.shape[0]
-        N_U = unlabeled.shape[0]
-        dist_matrix = None
-
-        temp_range = 1000
-
-        unlabeled = torch.from_numpy(unlabeled).cuda(self.cuda_id)
-        temp_dist_matrix = np.empty((N_U, temp_range))
-        for i in tqdm(range(0, N_L, temp_range), desc="Computing Distance Matrix"):
-            end_index = i+temp_range if i+temp_range < N_L else N_L
-            temp_labeled = labeled[i:end_index, :]
-            temp_labeled = torch.from_numpy(temp_labeled).cuda(self.cuda_id)
-            temp_dist_matrix = self.gpu_compute_dists(unlabeled, temp_labeled)
-            temp_dist_matrix = torch.min(temp_dist_matrix, dim=1)[0]
-            temp_dist_matrix = torch.reshape(temp_dist_matrix,(temp_dist_matrix.shape[0],1))
-            if dist_matrix is None:
-                dist_matrix = temp_dist_matrix
-            else:
-                dist_matrix = torch.cat((dist_matrix, temp_dist_matrix), dim=1)
-                dist_matrix = torch.min(dist_matrix, dim=1)[0]
-                dist_matrix = torch.reshape(dist_matrix,(dist_matrix.shape[0],1))
-
-        return dist_matrix.cpu().numpy()
+        min_dist = min_dist_to_labeled(labeled, unlabeled, device=f'cuda:{self.cuda_id}')
+        return min_dist.reshape(-1, 1)
 
 
     @torch.no_grad()
@@ -1279,7 +1083,7 @@ class AdversarySampler:
         # select the points which the discriminator things are the most likely to be unlabeled
         _, querry_indices = torch.topk(all_preds, int(self.budget))
         querry_indices = querry_indices.numpy()
-        remain_indices = np.asarray(list(set(all_indices) - set(querry_indices)))
+        remain_indices = remaining(all_indices, querry_indices)
         assert len(remain_indices) + len(querry_indices) == len(all_indices)," Indices are overlapped between activeSet and uSet"
         activeSet = all_indices[querry_indices]
         uSet = all_indices[remain_indices]
@@ -1318,7 +1122,7 @@ class AdversarySampler:
         # select the points which the discriminator things are the most likely to be unlabeled
         _, querry_indices = torch.topk(all_preds, int(self.budget))
         querry_indices = querry_indices.numpy()
-        remain_indices = np.asarray(list(set(all_indices) - set(querry_indices)))
+        remain_indices = remaining(all_indices, querry_indices)
         assert len(remain_indices) + len(querry_indices) == len(all_indices), " Indices are overlapped between activeSet and uSet"
         activeSet = all_indices[querry_indices]
         uSet = all_indices[remain_indices]
@@ -24,8 +24,8 @@ import torch.optim as optim
 import torch.nn.functional as F
 import math
 from tqdm import tqdm
+from pycls.datasets.pool_state import remaining
 
-torch.autograd.set_detect_anomaly(True)
 eps = 1e-10
 infty = 1e10
 
@@ -56,7 +56,7 @@ class SampleModel(nn.Module):
         if self.lSet_num > 0:
             self.lSet_centroid_vals = lSet_features.clone()
 
-        centroids = self.init_centroids().cuda()
+        centroids = self.init_centroids()
         self.centroids = nn.Parameter(centroids)
 
     def init_centroids(self):
@@ -123,7 +123,7 @@ class ActiveFT:
     def __init__(self, cfg, lSet, uSet, budgetSize, clf_model, dataset, dataObj, device='cuda', permute=True):
         self.cfg = cfg
         self.ds_name = self.cfg['DATASET']['NAME']
-        self.device = device
+        self.device = device if torch.cuda.is_available() else 'cpu'
         self.budgetSize = budgetSize
 
         self.lSet = lSet
@@ -148,6 +148,9 @@ class ActiveFT:
 
         self.lr = 0.001
         self.max_iter = 300 if self.ds_name not in ['IMAGENET', 'IMBALANCED_IMAGENET'] else 100
+        # the loss is checked every check_every iterations, tol <= 0 runs all max_iter iterations
+        self.check_every = self.cfg.ACTIVE_LEARNING.ACTIVEFT_CHECK_EVERY
+        self.tol = self.cfg.ACTIVE_LEARNING.ACTIVEFT_TOL
 
 
     @torch.no_grad()
@@ -180,7 +183,7 @@ class ActiveFT:
         sample_ids = self.optimize_dist(norm_rel_features) # 0 <= elements < |uSet|
 
         activeSet = self.relevant_indices[sample_ids].reshape(-1)
-        remainSet = np.array(sorted(list(set(self.total_uSet) - set(activeSet))))
+        remainSet = remaining(self.total_uSet, activeSet)
         assert len(activeSet) == self.budgetSize, 'added a different number of samples'
 
         print(f'Finished the selection of {len(activeSet)} samples.')
@@ -193,15 +196,17 @@ class ActiveFT:
     def optimize_dist(self, norm_rel_features, slice=None):
         #  features: (|lSet| + |uSet|, c)
         lSet_num = len(self.lSet)
-        lSet_features = norm_rel_features[:lSet_num].cuda()
-        uSet_features = norm_rel_features[lSet_num:].cuda()
+        lSet_features = norm_rel_features[:lSet_num].to(self.device)
+        uSet_features = norm_rel_features[lSet_num:].to(self.device)
 
         sample_model = SampleModel(
-            lSet_features, uSet_features, self.budgetSize).cuda()
+            lSet_features, uSet_features, self.budgetSize).to(self.device)
 
         optimizer = optim.Adam(sample_model.parameters(), lr=self.lr)
         scheduler = None
 
+        window_loss = torch.zeros((), device=self.device)
+        prev_loss = None
         for i in range(self.max_iter):
             loss = sample_model.get_loss()
             optimizer.zero_grad()
@@ -209,27 +214,62 @@ class ActiveFT:
             optimizer.step()
             if scheduler is not None:
                 scheduler.step()
-            lr = optimizer.param_groups[0]["lr"]
-            print("Iter: %d, lr: %.6f, loss: %f" % (i, lr, loss.item()))
             sample_model.correct_centroids()
 
+            # the loss is only synchronized with the host every check_every iterations
+            window_loss += loss.detach()
+            if (i + 1) % self.check_every == 0 or i + 1 == self.max_iter:
+                cur_loss = window_loss.item() / ((i % self.check_every) + 1)
+                window_loss.zero_()
+                lr = optimizer.param_groups[0]["lr"]
+                print("Iter: %d, lr: %.6f, loss: %f" % (i, lr, cur_loss))
+                if self.tol > 0 and prev_loss is not None and abs(prev_loss - cur_loss) <= self.tol * abs(prev_loss):
+                    print(f'Converged after {i + 1} iterations')
+                    break
+                prev_loss = cur_loss
+
         centroids = sample_model.centroids.detach()
         centroids = F.normalize(centroids, dim=1)
-        slice = sample_model.slice
-
-        sample_slice_num = math.ceil(centroids.shape[0] / slice)
-        sample_ids = set()
-        for sid in range(sample_slice_num):
-            start = sid * slice
-            end = min((sid + 1) * slice, centroids.shape[0])
-
-            dist = torch.matmul(centroids[start:end], uSet_features.transpose(1, 0)).cpu()  # (slice_num, |uSet|)
-            _, ids_sort = torch.sort(dist, dim=1, descending=True)
-            for i in range(lSet_num, ids_sort.shape[0], 1):
-                for j in range(ids_sort.shape[1]):
-                    if ids_sort[i, j].item() not in sample_ids:
-                        sample_ids.add(ids_sort[i, j].item())
-                        break
-
-        sample_ids = list(sample_ids)
-        return sample_ids
+        sims = torch.matmul(centroids[lSet_num:], uSet_features.transpose(1, 0)).cpu()  # (budget, |uSet|)
+        return greedy_unique_assignment(sims)
+
+
+def greedy_unique_assignment(sims, k=8):
+    """
+    Row i (in order) takes its most similar column that no earlier row has taken.
+
+    Equivalent to scanning fully sorted rows one by one, but uses topk candidate lists.
+    In every round each pending row proposes its best untaken candidate; the longest prefix
+    of pending rows with pairwise distinct proposals is final, since each of them only
+    competes with earlier rows which are already fixed. Rows whose candidates are all taken
+    get a longer topk list.
+    """
+    num_rows, num_cols = sims.shape
+    k = min(k, num_cols)
+    candidates = torch.topk(sims, k, dim=1).indices
+    taken = torch.zeros(num_cols, dtype=torch.bool, device=sims.device)
+    assigned = torch.full((num_rows,), -1, dtype=torch.long, device=sims.device)
+
+    start = 0
+    while start < num_rows:
+        pending = torch.arange(start, num_rows, device=sims.device)
+        free = ~taken[candidates[pending]]
+        exhausted = ~free.any(dim=1)
+        if exhausted.any():
+            k = min(2 * candidates.shape[1], num_cols)
+            candidates = torch.topk(sims, k, dim=1).indices
+            continue
+        proposals = candidates[pending].gather(1, free.int().argmax(dim=1, keepdim=True)).squeeze(1)
+
+        # first pending row whose proposal repeats an earlier proposal
+        order = torch.argsort(proposals, stable=True)
+        sorted_proposals = proposals[order]
+        is_repeat = torch.zeros_like(proposals, dtype=torch.bool)
+        is_repeat[order[1:]] = sorted_proposals[1:] == sorted_proposals[:-1]
+        num_final = int(is_repeat.int().argmax()) if is_repeat.any() else len(pending)
+
+        assigned[start:start + num_final] = proposals[:num_final]
+        taken[proposals[:num_final]] = True
+        start += num_final
+
+    return assigned.cpu().numpy().tolist()
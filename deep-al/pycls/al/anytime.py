@@ -0,0 +1,56 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import time
+import numpy as np
+import torch
+
+
+class SelectionDeadline:
+    """
+    Wall-clock budget (in seconds) for greedy samplers.
+
+    The clock starts when the sampler is constructed so that kernel / graph
+    construction is accounted for. Once the budget is spent, samplers stop
+    refreshing their gains and fill the remaining picks with the top residual
+    gains of the last refresh (see fill_from_scores).
+    A time_budget of None or <= 0 disables the deadline.
+    """
+
+    def __init__(self, time_budget=None, start_time=None):
+        if time_budget is not None and time_budget <= 0:
+            time_budget = None
+        self.time_budget = time_budget
+        self.start_time = time.time() if start_time is None else start_time
+
+    @property
+    def enabled(self):
+        return self.time_budget is not None
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def expired(self):
+        return self.enabled and self.elapsed() > self.time_budget
+
+    def report(self, exact_picks):
+        num_exact = int(np.sum(exact_picks))
+        if self.enabled:
+            print(f'Deadline {self.time_budget}sec: {num_exact}/{len(exact_picks)} exact picks '
+                  f'({np.round(self.elapsed(), 4)}sec elapsed)')
+        return num_exact
+
+
+def fill_from_scores(scores, num_picks, excluded):
+    """
+    Returns the indices of the num_picks highest scores, skipping excluded indices.
+    Used as the cheap fallback once a SelectionDeadline has expired.
+    """
+    scores = torch.as_tensor(scores).detach().reshape(-1).clone().float()
+    excluded = torch.as_tensor(np.asarray(excluded) if not torch.is_tensor(excluded) else excluded)
+    if excluded.numel() > 0:
+        scores[excluded.to(scores.device).long()] = -float('inf')
+    return torch.topk(scores, num_picks).indices
@@ -0,0 +1,370 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Torch clustering engine shared by TypiClust, purity estimation and k-medoids."""
+
+import contextlib
+import numpy as np
+import torch
+
+from pycls.datasets.utils.quantized import QuantizedFeatures
+
+
+def engine_kwargs(cfg):
+    """Reads the clustering engine options from cfg.CLUSTERING."""
+    return dict(device=cfg.CLUSTERING.DEVICE or None,
+                num_threads=cfg.CLUSTERING.NUM_THREADS,
+                seed=cfg.RNG_SEED if cfg.CLUSTERING.DETERMINISTIC else None,
+                deterministic=cfg.CLUSTERING.DETERMINISTIC)
+
+
+def get_device(device=None):
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(device)
+
+
+@contextlib.contextmanager
+def cpu_threads(num_threads):
+    """Temporarily sets the number of intra-op threads used on CPU (<= 0 keeps the torch default)."""
+    if num_threads is None or num_threads <= 0:
+        yield
+        return
+    prev_threads = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(prev_threads)
+
+
+def make_generator(device, seed=None):
+    if seed is None:
+        seed = np.random.randint(2 ** 31 - 1)
+    generator = torch.Generator(device=device)
+    generator.manual_seed(int(seed))
+    return generator
+
+
+def to_tensor(x, device):
+    if isinstance(x, QuantizedFeatures):
+        # dequantized on the device, without a float32 copy on the host
+        q = x.to_device(device)
+        return q.tile(0, q.shape[0]).contiguous()
+    if not torch.is_tensor(x):
+        x = torch.from_numpy(np.ascontiguousarray(x))
+    return x.to(device=device, dtype=torch.float32).contiguous()
+
+
+def sq_dists(x, centers, x_sq_norms=None, c_sq_norms=None):
+    """Squared l2 distances through a single GEMM: |x|^2 + |c|^2 - 2 x c^T."""
+    if x_sq_norms is None:
+        x_sq_norms = (x * x).sum(dim=1)
+    if c_sq_norms is None:
+        c_sq_norms = (centers * centers).sum(dim=1)
+    dists = torch.addmm(c_sq_norms.unsqueeze(0), x, centers.T, beta=1.0, alpha=-2.0)
+    dists.add_(x_sq_norms.unsqueeze(1))
+    return dists.clamp_(min=0)
+
+
+def assign(x, centers, batch_size=8192, x_sq_norms=None):
+    """
+    Blocked nearest-center assignment.
+    Returns the labels and squared distances to the assigned centers.
+    """
+    c_sq_norms = (centers * centers).sum(dim=1)
+    labels = torch.empty(x.shape[0], dtype=torch.long, device=x.device)
+    min_dists = torch.empty(x.shape[0], dtype=x.dtype, device=x.device)
+    for i in range(0, x.shape[0], batch_size):
+        x_norms = None if x_sq_norms is None else x_sq_norms[i:i + batch_size]
+        dists = sq_dists(x[i:i + batch_size], centers, x_norms, c_sq_norms)
+        min_dists[i:i + batch_size], labels[i:i + batch_size] = dists.min(dim=1)
+    return labels, min_dists
+
+
+def cluster_sums(x, labels, num_clusters, weights=None, deterministic=False, batch_size=8192):
+    """Per-cluster sums of x (and counts). The deterministic path uses one-hot GEMMs instead of atomics."""
+    if weights is None:
+        weights = torch.ones(x.shape[0], dtype=x.dtype, device=x.device)
+    if deterministic:
+        sums = torch.zeros(num_clusters, x.shape[1], dtype=x.dtype, device=x.device)
+        counts = torch.zeros(num_clusters, dtype=x.dtype, device=x.device)
+        for i in range(0, x.shape[0], batch_size):
+            one_hot = torch.zeros(min(batch_size, x.shape[0] - i), num_clusters, dtype=x.dtype, device=x.device)
+            one_hot[torch.arange(one_hot.shape[0], device=x.device), labels[i:i + batch_size]] = weights[i:i + batch_size]
+            sums += one_hot.T @ x[i:i + batch_size]
+            counts += one_hot.sum(dim=0)
+    else:
+        sums = torch.zeros(num_clusters, x.shape[1], dtype=x.dtype, device=x.device)
+        sums.index_add_(0, labels, x * weights.unsqueeze(1))
+        counts = torch.zeros(num_clusters, dtype=x.dtype, device=x.device)
+        counts.index_add_(0, labels, weights)
+    return sums, counts
+
+
+def kmeans_pp(x, num_clusters, generator, centers=None, weights=None, batch_size=8192):
+    """
+    k-means++ seeding. When centers are given, they are kept and only the missing
+    num_clusters - len(centers) centers are added (used to warm-start a larger k).
+    """
+    n = x.shape[0]
+    if weights is None:
+        weights = torch.ones(n, dtype=x.dtype, device=x.device)
+    if centers is None or len(centers) == 0:
+        first = torch.multinomial(weights, 1, generator=generator)
+        centers = x[first]
+    else:
+        centers = to_tensor(centers, x.device)
+    _, min_dists = assign(x, centers, batch_size)
+
+    new_centers = [centers]
+    for _ in range(num_clusters - centers.shape[0]):
+        probs = min_dists * weights
+        if probs.sum() <= 0:
+            probs = weights
+        idx = torch.multinomial(probs, 1, generator=generator)
+        new_centers.append(x[idx])
+        min_dists = torch.minimum(min_dists, sq_dists(x, x[idx]).squeeze(1))
+    return torch.cat(new_centers, dim=0)
+
+
+def kmeans_parallel(x, num_clusters, generator, num_rounds=5, oversampling=None, batch_size=8192):
+    """
+    k-means|| initialization (Bahmani et al. 2012): a few rounds of independent
+    oversampling, followed by weighted k-means++ on the small candidate set.
+    """
+    n = x.shape[0]
+    if oversampling is None:
+        oversampling = 2 * num_clusters
+    first = torch.randint(n, (1,), generator=generator, device=x.device)
+    candidates = x[first]
+    _, min_dists = assign(x, candidates, batch_size)
+    for _ in range(num_rounds):
+        cost = min_dists.sum()
+        if cost <= 0:
+            break
+        probs = (oversampling * min_dists / cost).clamp_(max=1.0)
+        picked = (torch.rand(n, generator=generator, device=x.device) < probs).nonzero().squeeze(1)
+        if len(picked) == 0:
+            continue
+        candidates = torch.cat([candidates, x[picked]], dim=0)
+        _, new_dists = assign(x, x[picked], batch_size)
+        min_dists = torch.minimum(min_dists, new_dists)
+
+    if candidates.shape[0] <= num_clusters:
+        missing = num_clusters - candidates.shape[0]
+        extra = torch.randperm(n, generator=generator, device=x.device)[:missing]
+        return torch.cat([candidates, x[extra]], dim=0)
+
+    labels, _ = assign(x, candidates, batch_size)
+    weights = torch.bincount(labels, minlength=candidates.shape[0]).to(x.dtype)
+    return kmeans_pp(candidates, num_clusters, generator, weights=weights, batch_size=batch_size)
+
+
+class KMeans:
+    """
+    Lloyd or mini-batch k-means in torch, with an sklearn-like interface. tol only applies to
+    Lloyd iterations; mini-batch runs stop on max_iter epochs or max_no_improvement (None
+    disables it) and reassign starved centers (reassignment_ratio, 0 disables it).
+
+    init is 'k-means||', 'k-means++' or an array of initial centers. On CPU the
+    intra-op thread pool is set to num_threads; with deterministic=True and a fixed
+    seed, repeated runs produce identical clusterings.
+    """
+
+    def __init__(self, n_clusters, init='k-means||', max_iter=100, tol=1e-4, minibatch=False,
+                 batch_size=5000, assign_batch_size=8192, max_no_improvement=10, reassignment_ratio=0.01,
+                 device=None, num_threads=0, seed=None, deterministic=False):
+        self.n_clusters = n_clusters
+        self.init = init
+        self.max_iter = max_iter
+        self.tol = tol
+        self.minibatch = minibatch
+        self.batch_size = batch_size
+        self.assign_batch_size = assign_batch_size
+        self.max_no_improvement = max_no_improvement
+        self.reassignment_ratio = reassignment_ratio
+        self.device = get_device(device)
+        self.num_threads = num_threads
+        self.seed = seed
+        self.deterministic = deterministic
+
+    def init_centers(self, x, generator):
+        if not isinstance(self.init, str):
+            return to_tensor(self.init, x.device)
+        if self.init == 'k-means||':
+            return kmeans_parallel(x, self.n_clusters, generator, batch_size=self.assign_batch_size)
+        if self.init == 'k-means++':
+            return kmeans_pp(x, self.n_clusters, generator, batch_size=self.assign_batch_size)
+        raise NotImplementedError(f'{self.init} initialization not implemented')
+
+    def abs_tol(self, x):
+        # as in sklearn, the tolerance is relative to the mean feature variance
+        return self.tol * x.var(dim=0).mean().item()
+
+    def lloyd(self, x, centers):
+        x_sq_norms = (x * x).sum(dim=1)
+        tol = self.abs_tol(x)
+        for i in range(self.max_iter):
+            labels, _ = assign(x, centers, self.assign_batch_size, x_sq_norms)
+            sums, counts = cluster_sums(x, labels, self.n_clusters, deterministic=self.deterministic)
+            # empty clusters keep their previous center
+            new_centers = torch.where(counts.unsqueeze(1) > 0, sums / counts.clamp(min=1).unsqueeze(1), centers)
+            shift = ((new_centers - centers) ** 2).sum()
+            centers = new_centers
+            if shift <= tol:
+                break
+        return centers
+
+    def minibatch_lloyd(self, x, centers, generator):
+        """
+        Mini-batch k-means as sklearn's MiniBatchKMeans: max_iter counts passes over the data
+        (n / batch_size steps each), the run stops early when the smoothed batch inertia has not
+        improved for max_no_improvement steps, and centers that received less than
+        reassignment_ratio of the largest center count are moved to random batch points.
+        """
+        n = x.shape[0]
+        batch_size = min(self.batch_size, n)
+        num_steps = self.max_iter * -(-n // batch_size)
+        total_counts = torch.zeros(self.n_clusters, dtype=x.dtype, device=x.device)
+        # exponentially weighted average of the batch inertia, as in sklearn
+        alpha = min(2.0 * batch_size / (n + 1), 1.0)
+        ewa_inertia, best_inertia, no_improvement = None, None, 0
+        since_reassign = 0
+        for step in range(num_steps):
+            batch = torch.randint(n, (batch_size,), generator=generator, device=x.device)
+            x_batch = x[batch]
+            labels, min_dists = assign(x_batch, centers, self.assign_batch_size)
+            sums, counts = cluster_sums(x_batch, labels, self.n_clusters, deterministic=self.deterministic)
+            # per-center learning rate 1 / (number of points seen so far)
+            total_counts += counts
+            rate = (counts / total_counts.clamp(min=1)).unsqueeze(1)
+            batch_means = sums / counts.clamp(min=1).unsqueeze(1)
+            centers = torch.where(counts.unsqueeze(1) > 0, centers + rate * (batch_means - centers), centers)
+
+            since_reassign += batch_size
+            if self.reassignment_ratio > 0 and since_reassign >= 10 * self.n_clusters:
+                since_reassign = 0
+                centers, total_counts = self.reassign(x_batch, centers, total_counts, generator)
+
+            if step == 0:
+                continue
+            batch_inertia = min_dists.sum().item() / batch_size
+            ewa_inertia = batch_inertia if ewa_inertia is None else \
+                ewa_inertia * (1 - alpha) + batch_inertia * alpha
+            if best_inertia is None or ewa_inertia < best_inertia:
+                best_inertia, no_improvement = ewa_inertia, 0
+            else:
+                no_improvement += 1
+            if self.max_no_improvement is not None and no_improvement >= self.max_no_improvement:
+                break
+        return centers
+
+    def reassign(self, x_batch, centers, total_counts, generator):
+        """Moves low-count centers to random points of the batch (at most half the batch)."""
+        to_reassign = total_counts < self.reassignment_ratio * total_counts.max()
+        max_reassign = x_batch.shape[0] // 2
+        if to_reassign.sum() > max_reassign:
+            keep = torch.argsort(total_counts, stable=True)[max_reassign:]
+            to_reassign[keep] = False
+        num_reassign = int(to_reassign.sum())
+        if num_reassign == 0 or num_reassign == self.n_clusters:
+            return centers, total_counts
+        picked = torch.randperm(x_batch.shape[0], generator=generator, device=x_batch.device)[:num_reassign]
+        centers = centers.clone()
+        centers[to_reassign] = x_batch[picked]
+        # not reset to zero, so reassigned centers are not reassigned again right away
+        total_counts[to_reassign] = total_counts[~to_reassign].min()
+        return centers, total_counts
+
+    @torch.no_grad()
+    def fit(self, X):
+        with cpu_threads(self.num_threads if self.device.type == 'cpu' else 0):
+            x = to_tensor(X, self.device)
+            generator = make_generator(self.device, self.seed)
+            centers = self.init_centers(x, generator)
+            if self.minibatch:
+                centers = self.minibatch_lloyd(x, centers, generator)
+            else:
+                centers = self.lloyd(x, centers)
+            labels, min_dists = assign(x, centers, self.assign_batch_size)
+
+        self.cluster_centers_ = centers.cpu().numpy()
+        self.labels_ = labels.cpu().numpy()
+        self.inertia_ = min_dists.sum().item()
+        return self
+
+    def predict(self, X):
+        x = to_tensor(X, self.device)
+        labels, _ = assign(x, to_tensor(self.cluster_centers_, self.device), self.assign_batch_size)
+        return labels.cpu().numpy()
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
+
+
+def medoid_update(x, labels, num_clusters):
+    """
+    For every cluster, returns the member with the minimal total l2 distance to the other
+    members (-1 for empty clusters). x is a mini-batch, so the full distance matrix fits in memory.
+    """
+    dists = sq_dists(x, x).sqrt_()
+    one_hot = torch.zeros(x.shape[0], num_clusters, dtype=x.dtype, device=x.device)
+    one_hot[torch.arange(x.shape[0], device=x.device), labels] = 1
+    # total distance from each point to the members of its own cluster
+    scores = (dists @ one_hot).gather(1, labels.unsqueeze(1)).squeeze(1)
+
+    order = torch.argsort(scores, stable=True)
+    order = order[torch.argsort(labels[order], stable=True)]
+    sorted_labels = labels[order]
+    is_first = torch.ones_like(sorted_labels, dtype=torch.bool)
+    is_first[1:] = sorted_labels[1:] != sorted_labels[:-1]
+
+    medoids = torch.full((num_clusters,), -1, dtype=torch.long, device=x.device)
+    medoids[sorted_labels[is_first]] = order[is_first]
+    return medoids
+
+
+class MiniBatchKMedoids:
+    """Mini-batch k-medoids on the torch engine (l2 distances, random initial medoids)."""
+
+    def __init__(self, n_clusters=3, max_iter=100, batch_size=100, random_state=None,
+                 device=None, num_threads=0):
+        self.n_clusters = n_clusters
+        self.max_iter = max_iter
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.device = get_device(device)
+        self.num_threads = num_threads
+
+    @torch.no_grad()
+    def fit(self, X):
+        with cpu_threads(self.num_threads if self.device.type == 'cpu' else 0):
+            x = to_tensor(X, self.device)
+            n_samples = x.shape[0]
+            generator = make_generator(self.device, self.random_state)
+
+            # Initialize medoids randomly
+            medoids = x[torch.randperm(n_samples, generator=generator, device=x.device)[:self.n_clusters]].clone()
+            for i in range(self.max_iter):
+                minibatch = x[torch.randperm(n_samples, generator=generator, device=x.device)[:self.batch_size]]
+                labels, _ = assign(minibatch, medoids)
+                new_medoids = medoid_update(minibatch, labels, self.n_clusters)
+                # clusters without points in this minibatch keep their medoid
+                has_points = new_medoids >= 0
+                medoids[has_points] = minibatch[new_medoids[has_points]]
+
+        self.medoids_ = medoids.cpu().numpy()
+        return self
+
+    def predict(self, X):
+        labels, _ = assign(to_tensor(X, self.device), to_tensor(self.medoids_, self.device))
+        return labels.cpu().numpy()
+
+    def fit_predict(self, X):
+        self.fit(X)
+        self.labels_ = self.predict(X)
+        return self.labels_
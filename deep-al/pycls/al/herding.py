@@ -13,6 +13,8 @@ import pycls.datasets.utils as ds_utils
 
 from pycls.utils.metrics import compute_coverage
 from pycls.utils.io import compute_cand_size
+from pycls.al.anytime import SelectionDeadline, fill_from_scores
+from pycls.datasets.pool_state import remaining
 
 
 def compute_norm(x1, x2, device, batch_size=512):
@@ -106,8 +108,11 @@ class RationalQuadKernel(object):
 class Herding:
     def __init__(self, cfg, lSet, uSet, budgetSize, delta, clf_model,
                  dataObj=None, dataset=None, kernel="rbf", device="cuda",
-                 batch_size=1024, permute=True):
+                 batch_size=1024, permute=True, time_budget=None):
         self.cfg = cfg
+        if time_budget is None:
+            time_budget = self.cfg.ACTIVE_LEARNING.TIME_BUDGET
+        self.deadline = SelectionDeadline(time_budget)
         self.ds_name = self.cfg['DATASET']['NAME']
         self.seed = self.cfg['RNG_SEED']
         self.dataset = dataset
@@ -121,6 +126,7 @@ class Herding:
             self.all_features = self.get_representation(
                 clf_model, np.arange(len(dataset)), dataset)
             print(f'Obtained features from a classifier')
+            self.all_features = self.all_features / np.linalg.norm(self.all_features, axis=-1, keepdims=True)
         else:
             feature_type = self.cfg.ACTIVE_LEARNING.UNC_FEATURE
             print('==================================')
@@ -129,11 +135,9 @@ class Herding:
             self.all_features = ds_utils.load_features(
                 self.ds_name, self.seed, train=True, is_diffusion=False, feature_type=feature_type,
                 dataset=dataset)
+            # load_features returns l2-normalized features
             print(f'Obtained features from {feature_type}')
 
-        # normalize features
-        self.all_features = self.all_features / np.linalg.norm(self.all_features, axis=-1, keepdims=True)
-
         self.batch_size = batch_size
         self.lSet = lSet
         self.total_uSet = copy.deepcopy(uSet)
@@ -233,7 +237,16 @@ class Herding:
             max_embedding = torch.zeros(1, len(inner_lSet) + len(fixed_inner_uSet)).to(self.device) # 1 x N
 
         selected = []
+        self.exact_picks = np.zeros(self.budgetSize, dtype=bool)
+        # residual gains of the last refresh, used as fallback scores when the deadline expires
+        mean_max_embedding = None
         for i in range(self.budgetSize):
+            if mean_max_embedding is not None and self.deadline.expired():
+                # out of time: fill the remaining picks with the top residual gains of the last refresh
+                fallback = fill_from_scores(mean_max_embedding, self.budgetSize - i, inner_lSet).to(self.device)
+                inner_lSet = torch.cat((inner_lSet, fallback.view(-1)))
+                break
+
             num_lSet = len(inner_lSet)
             num_uSet = len(inner_uSet)
 
@@ -252,6 +265,7 @@ class Herding:
             inner_uSet = fixed_inner_uSet[inner_uSet_bool]
 
             max_embedding = updated_max_embedding[selected_index].unsqueeze(0) + max_embedding
+            self.exact_picks[i] = True
 
             if len(set(inner_lSet.cpu().numpy())) != num_lSet + 1:
                 print(f'inner_lSet: {len(set(inner_lSet.numpy()))} is not equal to {num_lSet+1}')
@@ -269,8 +283,9 @@ class Herding:
         print(f'Mean coverage herding: {coverage}')
 
         assert len(selected) == self.budgetSize, 'added a different number of samples'
+        self.deadline.report(self.exact_picks)
         activeSet = self.relevant_indices[selected].reshape(-1)
-        remainSet = np.array(sorted(list(set(self.total_uSet) - set(activeSet))))
+        remainSet = remaining(self.total_uSet, activeSet)
 
         print(f'Finished the selection of {len(activeSet)} samples.')
         print(f'Active set is {activeSet}')
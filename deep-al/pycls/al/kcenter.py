@@ -0,0 +1,106 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Greedy k-center engine shared by Coreset and VAAL."""
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from pycls.al.anytime import fill_from_scores
+from pycls.al.clustering import get_device, sq_dists, to_tensor
+from pycls.datasets.pool_state import remaining
+
+
+class KCenterGreedy:
+    """
+    Greedy k-center over squared l2 distances.
+
+    A single min-distance vector over the unlabeled points is kept and updated in place:
+    labeled points are folded in with GEMM tiles and every pick costs one matrix-vector
+    product into a preallocated buffer, so B picks over N points need B * N distance
+    evaluations and no per-pick allocations.
+
+    With num_candidates > 0, only the num_candidates points farthest from their nearest
+    labeled neighbour can be picked and distances are only maintained for them. This is a
+    deliberate stand-in for kNN pruning, whose kNN graph alone costs N^2 distance
+    evaluations, more than the B * N of the greedy it prunes. It is a heuristic: points in
+    dense regions close to the lSet are dropped, so num_candidates should be well above the
+    budget. Without labeled points every distance is inf and the ranking is meaningless, so
+    no pruning is done then.
+    """
+
+    def __init__(self, labeled, unlabeled, device=None, tile_size=1024, num_candidates=0):
+        self.device = get_device(device)
+        self.unlabeled = to_tensor(unlabeled, self.device)
+        self.tile_size = tile_size
+        self.num_unlabeled = self.unlabeled.shape[0]
+
+        self.min_dist = torch.full((self.num_unlabeled,), float('inf'), device=self.device)
+        self.add_labeled(labeled)
+
+        self.candidates = None
+        has_labeled = labeled is not None and len(labeled) > 0
+        if has_labeled and 0 < num_candidates < self.num_unlabeled:
+            self.candidates = torch.topk(self.min_dist, num_candidates).indices.sort().values
+            self.unlabeled = self.unlabeled[self.candidates].contiguous()
+            self.min_dist = self.min_dist[self.candidates].contiguous()
+
+        self.sq_norms = (self.unlabeled * self.unlabeled).sum(dim=1)
+        self.buffer = torch.empty_like(self.min_dist)
+
+    @torch.no_grad()
+    def add_labeled(self, labeled):
+        """Folds labeled points into the min-distance vector, one GEMM tile at a time."""
+        if labeled is None or len(labeled) == 0:
+            return
+        labeled = to_tensor(labeled, self.device)
+        u_sq_norms = (self.unlabeled * self.unlabeled).sum(dim=1)
+        for i in tqdm(range(0, labeled.shape[0], self.tile_size), desc="Labeled min distances"):
+            dist = sq_dists(labeled[i:i + self.tile_size], self.unlabeled, c_sq_norms=u_sq_norms)
+            torch.minimum(self.min_dist, dist.min(dim=0).values, out=self.min_dist)
+
+    @torch.no_grad()
+    def update(self, index):
+        """min_dist = min(min_dist, |u - u_index|^2) without allocating."""
+        point = self.unlabeled[index]
+        torch.mv(self.unlabeled, point, out=self.buffer)
+        self.buffer.mul_(-2.0).add_(self.sq_norms).add_(self.sq_norms[index])
+        self.buffer.clamp_(min=0)
+        torch.minimum(self.min_dist, self.buffer, out=self.min_dist)
+
+    @torch.no_grad()
+    def select(self, budgetSize, deadline=None):
+        """
+        Returns the greedy indices (into unlabeled) and the remaining indices.
+        If a SelectionDeadline expires, the remaining picks are the farthest points
+        w.r.t. the last refreshed min-distance vector; exact_picks records which
+        picks were made greedily.
+        """
+        selected = torch.empty(budgetSize, dtype=torch.long, device=self.device)
+        self.exact_picks = np.zeros(budgetSize, dtype=bool)
+        for i in tqdm(range(budgetSize), desc="Constructing Active set"):
+            if i > 0 and deadline is not None and deadline.expired():
+                selected[i:] = fill_from_scores(self.min_dist, budgetSize - i, selected[:i]).to(self.device)
+                break
+            selected[i] = torch.argmax(self.min_dist)
+            self.exact_picks[i] = True
+            self.update(selected[i])
+
+        if self.candidates is not None:
+            selected = self.candidates[selected]
+        greedy_indices = selected.cpu().numpy().tolist()
+        remainSet = remaining(np.arange(self.num_unlabeled), greedy_indices)
+        return greedy_indices, remainSet
+
+    def max_min_dist(self):
+        return self.min_dist.max().item()
+
+
+def min_dist_to_labeled(labeled, unlabeled, device=None, tile_size=1024):
+    """Squared l2 distance from every unlabeled point to its nearest labeled point."""
+    engine = KCenterGreedy(labeled, unlabeled, device=device, tile_size=tile_size)
+    return engine.min_dist.cpu().numpy()
@@ -7,14 +7,81 @@
 ####################################################################################
 
 import numpy as np
-import pandas as pd
-import torch
 import time
 import pycls.datasets.utils as ds_utils
+from pycls.al.anytime import SelectionDeadline, fill_from_scores
+from pycls.al.radius_graph import cached_radius_graph
+from pycls.utils.io import get_cache_dir
+from pycls.datasets.pool_state import remaining
+
+def gather_rows(indptr, indices, rows):
+    """
+    Concatenates indices[indptr[r]:indptr[r+1]] for every r in rows without a python loop.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    return indices[offsets]
+
+
+class CoverGraph:
+    """
+    Delta-graph used by the greedy ProbCover selection.
+
+    out-edges are stored in CSR form (x -> y) and in-edges in CSC form (y <- x).
+    out_degrees is a live counter of the edges that point to uncovered samples,
+    so covering a sample only decrements the counters of its in-neighbours and
+    each step costs time proportional to the number of removed edges.
+    """
+
+    def __init__(self, xs, ys, num_nodes):
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        self.num_nodes = num_nodes
+
+        out_counts = np.bincount(xs, minlength=num_nodes)
+        in_counts = np.bincount(ys, minlength=num_nodes)
+        self.out_indptr = np.concatenate([[0], np.cumsum(out_counts)])
+        self.in_indptr = np.concatenate([[0], np.cumsum(in_counts)])
+        self.out_indices = ys[np.argsort(xs, kind='stable')]
+        self.in_indices = xs[np.argsort(ys, kind='stable')]
+
+        self.out_degrees = out_counts.astype(np.int64)
+        self.covered = np.zeros(num_nodes, dtype=bool)
+        self.num_covered = 0
+        self.num_edges = len(xs)
+
+    def out_neighbours(self, node):
+        return self.out_indices[self.out_indptr[node]:self.out_indptr[node + 1]]
+
+    def cover(self, nodes):
+        """
+        Marks nodes as covered and removes their incoming edges.
+        Returns the nodes that were not covered before.
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        nodes = nodes[~self.covered[nodes]]
+        self.covered[nodes] = True
+        self.num_covered += len(nodes)
+
+        in_neighbours = gather_rows(self.in_indptr, self.in_indices, nodes)
+        np.subtract.at(self.out_degrees, in_neighbours, 1)
+        self.num_edges -= len(in_neighbours)
+        return nodes
+
+    def cover_from(self, node):
+        return self.cover(self.out_neighbours(node))
+
 
 class ProbCover:
-    def __init__(self, cfg, lSet, uSet, budgetSize, delta, dataset):
+    def __init__(self, cfg, lSet, uSet, budgetSize, delta, dataset, time_budget=None):
         self.cfg = cfg
+        if time_budget is None:
+            time_budget = self.cfg.ACTIVE_LEARNING.TIME_BUDGET
+        self.deadline = SelectionDeadline(time_budget)
         self.ds_name = self.cfg['DATASET']['NAME']
         self.seed = self.cfg['RNG_SEED']
 
@@ -27,56 +94,31 @@ class ProbCover:
         print(f'feature_type: {feature_type}')
 
         all_features = ds_utils.load_features(self.ds_name, self.seed, is_diffusion=False,
-                                              feature_type=feature_type, dataset=dataset)
+                                              feature_type=feature_type, dataset=dataset,
+                                              precision=self.cfg.ACTIVE_LEARNING.FEATURE_PRECISION)
         self.lSet = lSet
         self.uSet = uSet
         self.budgetSize = budgetSize
         self.delta = delta
         self.relevant_indices = np.concatenate([self.lSet, self.uSet]).astype(int)
-        self.rel_features = all_features[self.relevant_indices]
-        self.graph_df = self.construct_graph(batch_size=1536)
+        self.all_features = all_features
+        self.graph = self.construct_graph(batch_size=1536)
 
-    def construct_graph(self, batch_size=500):
+    def construct_graph(self, batch_size=1536):
         """
         creates a directed graph where:
         x->y iff l2(x,y) < delta.
 
-        represented by a list of edges (a sparse matrix).
-        stored in a dataframe
+        represented by a list of edges (a sparse matrix) which is cached on disk,
+        and stored as a CoverGraph over the relevant indices.
         """
-        xs, ys, ds = [], [], []
         print(f'Start constructing graph using delta={self.delta}')
-        # distance computations are done in GPU
-        num_edges = 0
-        cuda_feats = torch.tensor(self.rel_features).cuda()
-        for i in range(len(self.rel_features) // batch_size):
-            # distance comparisons are done in batches to reduce memory consumption
-            cur_feats = cuda_feats[i * batch_size: (i + 1) * batch_size]
-            dist = torch.cdist(cur_feats, cuda_feats)
-            mask = dist < self.delta
-            # saving edges using indices list - saves memory.
-            x, y = mask.nonzero().T
-            xs.append(x.cpu() + batch_size * i)
-            ys.append(y.cpu())
-            ds.append(dist[mask].cpu())
-
-            num_edges += x.shape[0]
-            if i % 100 == 0:
-                print(f'{i}/{len(self.rel_features) // batch_size} - {num_edges}')
-
-            del cur_feats
-            del mask
-            del x
-            del y
-
-        xs = torch.cat(xs).numpy()
-        ys = torch.cat(ys).numpy()
-        ds = torch.cat(ds).numpy()
-
-        df = pd.DataFrame({'x': xs, 'y': ys, 'd': ds})
+        xs, ys, ds = cached_radius_graph(
+            self.all_features, self.relevant_indices, self.delta, cache_dir=get_cache_dir(self.cfg),
+            backend=self.cfg.ACTIVE_LEARNING.GRAPH_BACKEND, batch_size=batch_size)
         print(f'Finished constructing graph using delta={self.delta}')
-        print(f'Graph contains {len(df)} edges.')
-        return df
+        print(f'Graph contains {len(xs)} edges.')
+        return CoverGraph(xs, ys, len(self.relevant_indices))
 
     def select_samples(self):
         """
@@ -85,32 +127,37 @@ class ProbCover:
         - removes incoming edges to all covered samples
         - selects the sample high the highest out degree (covers most new samples)
 
+        if the selection deadline expires, the remaining samples are the ones with
+        the highest out degree in the last refreshed graph.
         """
         start_time = time.time()
         print(f'Start selecting {self.budgetSize} samples.')
         selected = []
+        graph = self.graph
         # removing incoming edges to all covered samples from the existing labeled set
-        edge_from_seen = np.isin(self.graph_df.x, np.arange(len(self.lSet)))
-        covered_samples = self.graph_df.y[edge_from_seen].unique()
-        cur_df = self.graph_df[(~np.isin(self.graph_df.y, covered_samples))]
+        graph.cover(gather_rows(graph.out_indptr, graph.out_indices, np.arange(len(self.lSet))))
+        self.exact_picks = np.zeros(self.budgetSize, dtype=bool)
         for i in range(self.budgetSize):
-            coverage = len(covered_samples) / len(self.relevant_indices)
+            if i > 0 and self.deadline.expired():
+                excluded = np.concatenate([np.arange(len(self.lSet)), selected]).astype(int)
+                selected.extend(fill_from_scores(graph.out_degrees, self.budgetSize - i, excluded).numpy().tolist())
+                break
+
+            coverage = graph.num_covered / len(self.relevant_indices)
             # selecting the sample with the highest degree
-            degrees = np.bincount(cur_df.x, minlength=len(self.relevant_indices))
-            print(f'Iteration is {i}.\tGraph has {len(cur_df)} edges.\tMax degree is {degrees.max()}.\tCoverage is {coverage:.3f}')
+            degrees = graph.out_degrees
+            print(f'Iteration is {i}.\tGraph has {graph.num_edges} edges.\tMax degree is {degrees.max()}.\tCoverage is {coverage:.3f}')
             cur = degrees.argmax()
 
             # removing incoming edges to newly covered samples
-            new_covered_samples = cur_df.y[(cur_df.x == cur)].values
-            assert len(np.intersect1d(covered_samples, new_covered_samples)) == 0, 'all samples should be new'
-            cur_df = cur_df[(~np.isin(cur_df.y, new_covered_samples))]
-
-            covered_samples = np.concatenate([covered_samples, new_covered_samples])
+            graph.cover_from(cur)
             selected.append(cur)
+            self.exact_picks[i] = True
 
         assert len(selected) == self.budgetSize, 'added a different number of samples'
+        self.deadline.report(self.exact_picks)
         activeSet = self.relevant_indices[selected]
-        remainSet = np.array(sorted(list(set(self.uSet) - set(activeSet))))
+        remainSet = remaining(self.uSet, activeSet)
 
         print(f'Finished the selection of {len(activeSet)} samples.')
         print(f'Active set is {activeSet}')
@@ -0,0 +1,121 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import time
+import numpy as np
+import torch
+
+from pycls.datasets.utils.feature_store import get_feature_store
+from pycls.datasets.utils.quantized import QuantizedFeatures, feature_tile, features_to_device
+from pycls.utils.io import hash_array, save_npz_atomic
+
+
+def torch_radius_graph(features, delta, batch_size=1536, device=None):
+    """
+    Directed delta-graph x->y iff l2(x,y) < delta, computed with blocked cdist.
+    Every row is covered, including the last partial block.
+    QuantizedFeatures stay fp16/int8 on the device and are dequantized one tile at a time.
+    Returns the edges as (xs, ys, ds) numpy arrays.
+    """
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    feats = features_to_device(features, device)
+    n = feats.shape[0]
+    num_batches = (n + batch_size - 1) // batch_size
+    # quantized columns are dequantized in tiles too, plain float32 columns are used whole
+    col_size = 16 * batch_size if isinstance(features, QuantizedFeatures) else n
+
+    xs, ys, ds = [], [], []
+    num_edges = 0
+    for i in range(num_batches):
+        # distance comparisons are done in batches to reduce memory consumption
+        cur_feats = feature_tile(feats, i * batch_size, (i + 1) * batch_size)
+        for j in range(0, n, col_size):
+            dist = torch.cdist(cur_feats, feature_tile(feats, j, j + col_size))
+            mask = dist < delta
+            # saving edges using indices list - saves memory.
+            x, y = mask.nonzero().T
+            xs.append((x + batch_size * i).int().cpu())
+            ys.append((y + j).int().cpu())
+            ds.append(dist[mask].cpu())
+            num_edges += x.shape[0]
+            del dist, mask, x, y
+
+        if i % 100 == 0:
+            print(f'{i}/{num_batches} - {num_edges}')
+
+    xs = torch.cat(xs).numpy()
+    ys = torch.cat(ys).numpy()
+    ds = torch.cat(ds).numpy()
+    return xs, ys, ds
+
+
+def faiss_radius_graph(features, delta):
+    """
+    Same graph as torch_radius_graph computed with a faiss range search.
+    faiss works with squared l2 distances, hence the radius delta ** 2.
+    """
+    import faiss
+
+    feats = np.ascontiguousarray(np.asarray(features), dtype=np.float32)
+    index = faiss.IndexFlatL2(feats.shape[1])
+    index.add(feats)
+    lims, sq_dists, ys = index.range_search(feats, float(delta) ** 2)
+
+    xs = np.repeat(np.arange(len(feats)), np.diff(lims)).astype(np.int32)
+    ys = ys.astype(np.int32)
+    ds = np.sqrt(np.maximum(sq_dists, 0)).astype(np.float32)
+    return xs, ys, ds
+
+
+def build_radius_graph(features, delta, backend='torch', batch_size=1536, device=None):
+    if backend == 'torch':
+        return torch_radius_graph(features, delta, batch_size=batch_size, device=device)
+    elif backend == 'faiss':
+        return faiss_radius_graph(features, delta)
+    else:
+        raise NotImplementedError(f'Graph backend {backend} not implemented')
+
+
+def cached_radius_graph(all_features, indices, delta, cache_dir=None, backend='torch',
+                        batch_size=1536, device=None):
+    """
+    Delta-graph over all_features[indices], with node i standing for indices[i].
+
+    The graph only depends on the features, delta and the set of indices, so it is
+    built over the sorted index set and stored as a compressed npz keyed by
+    (feature hash, delta, index set hash, backend). Later episodes and seeds that see the
+    same pool load it and only remap the nodes to the order of indices.
+    """
+    indices = np.asarray(indices).astype(np.int64)
+    order = np.argsort(indices, kind='stable')
+    sorted_indices = indices[order]
+
+    cache_path = None
+    if cache_dir is not None:
+        # the backends can differ at the delta boundary, so each keeps its own graph
+        key = f'{get_feature_store().hash(all_features)[:16]}_{hash_array(sorted_indices)[:16]}_delta_{float(delta):.6g}_{backend}'
+        cache_path = os.path.join(cache_dir, f'radius_graph_{key}.npz')
+
+    if cache_path is not None and os.path.exists(cache_path):
+        with np.load(cache_path) as graph:
+            xs, ys, ds = graph['xs'], graph['ys'], graph['ds']
+        print(f'Loaded graph from {cache_path}')
+    else:
+        start_time = time.time()
+        # QuantizedFeatures keep the gathered subset quantized
+        subset = all_features.take(sorted_indices) if isinstance(all_features, QuantizedFeatures) \
+            else all_features[sorted_indices]
+        xs, ys, ds = build_radius_graph(subset, delta, backend=backend,
+                                        batch_size=batch_size, device=device)
+        print(f'Built graph in {np.round(time.time() - start_time, 4)}sec')
+        if cache_path is not None:
+            save_npz_atomic(cache_path, xs=xs, ys=ys, ds=ds)
+            print(f'Saved graph to {cache_path}')
+
+    # sorted position p is position order[p] of the given indices
+    return order[xs], order[ys], ds
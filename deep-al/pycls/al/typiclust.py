@@ -9,72 +9,19 @@
 import numpy as np
 import time
 import copy
+import heapq
+import os
+import glob
+import hashlib
+import json
 import pandas as pd
 import faiss
-from sklearn.cluster import MiniBatchKMeans, KMeans
 import pycls.datasets.utils as ds_utils
-from sklearn.metrics import pairwise_distances
-from sklearn_extra.cluster import KMedoids
-
-
-class MiniBatchKMedoids:
-    def __init__(self, n_clusters=3, max_iter=100, batch_size=100, random_state=None):
-        self.n_clusters = n_clusters
-        self.max_iter = max_iter
-        self.batch_size = batch_size
-        self.random_state = random_state
-
-    def fit(self, X):
-        np.random.seed(self.random_state)
-        n_samples = X.shape[0]
-
-        # Step 1: Initialize medoids randomly
-        initial_medoids_idx = np.random.choice(n_samples, self.n_clusters, replace=False)
-        self.medoids_ = X[initial_medoids_idx]
-
-        for i in range(self.max_iter):
-            # Step 2: Randomly sample a minibatch from the data
-            minibatch_idx = np.random.choice(n_samples, self.batch_size, replace=False)
-            minibatch = X[minibatch_idx]
-
-            # Step 3: Compute distances between minibatch points and current medoids
-            distances = pairwise_distances(minibatch, self.medoids_)
-
-            # Step 4: Assign points in minibatch to closest medoid
-            labels = np.argmin(distances, axis=1)
-
-            # Step 5: Update medoids using minibatch data
-            for medoid_idx in range(self.n_clusters):
-                # Points assigned to the current medoid
-                cluster_points = minibatch[labels == medoid_idx]
-
-                if len(cluster_points) == 0:
-                    continue  # No points assigned to this medoid in this minibatch
-
-                # Compute distances within the cluster
-                intra_cluster_distances = pairwise_distances(cluster_points)
-
-                # Find the point with the minimum total distance to other points in the cluster
-                new_medoid_idx = np.argmin(intra_cluster_distances.sum(axis=1))
-                new_medoid = cluster_points[new_medoid_idx]
-
-                # Update the medoid
-                self.medoids_[medoid_idx] = new_medoid
-
-        return self
-
-    def predict(self, X):
-        # Compute distances between points and medoids
-        distances = pairwise_distances(X, self.medoids_)
-        # Assign each point to the closest medoid
-        return np.argmin(distances, axis=1)
-
-    def fit_predict(self, X):
-        # Perform fit and return the predicted labels
-        self.fit(X)
-        labels = self.predict(X)
-        self.labels_ = labels
-        return labels
+from pycls.utils.io import get_cache_dir, save_npz_atomic
+from pycls.datasets.utils.feature_store import get_feature_store
+from pycls.datasets.pool_state import remaining
+from pycls.al.clustering import KMeans, engine_kwargs, get_device, kmeans_pp, \
+    make_generator, to_tensor
 
 
 def get_nn(features, num_neighbors):
@@ -103,20 +50,172 @@ def calculate_typicality(features, num_neighbors):
     typicality = 1 / (mean_distance + 1e-5)
     return typicality
 
-def kmeans(features, num_clusters):
-    if num_clusters <= 50:
-        km = KMeans(n_clusters=num_clusters)
-        km.fit_predict(features)
+class ClusterTypicality:
+    """
+    Typicality of the remaining members of a single cluster.
+
+    The kNN graph inside the cluster is computed once with a few extra neighbours,
+    typicality is derived from the stored squared distances and the best member is
+    kept in a lazy max-heap. Removing a member only updates its reverse neighbours;
+    the cluster is recomputed exactly only when a kNN list runs out of members.
+    """
+
+    def __init__(self, features, members, num_neighbors, num_extra):
+        self.features = features
+        self.members = members
+        self.num_neighbors = num_neighbors
+        self.num_extra = num_extra
+        self.alive = np.ones(len(members), dtype=bool)
+        self.num_alive = len(members)
+        self.build()
+
+    def current_k(self):
+        # in case we have too small cluster, calculate density among half of the cluster
+        return min(self.num_neighbors, self.num_alive // 2)
+
+    def build(self):
+        alive_rows = self.alive.nonzero()[0]
+        num_nn = max(min(self.num_neighbors + self.num_extra, len(alive_rows) - 1), 0)
+        self.nbrs = np.zeros((len(self.members), num_nn), dtype=np.int64)
+        self.sq_dists = np.zeros((len(self.members), num_nn), dtype=np.float32)
+        if num_nn > 0:
+            distances, indices = get_nn(self.features[alive_rows], num_nn)
+            self.nbrs[alive_rows] = alive_rows[indices]
+            self.sq_dists[alive_rows] = distances
+
+        # reverse neighbours in CSR form
+        rows = np.repeat(alive_rows, num_nn)
+        cols = self.nbrs[alive_rows].reshape(-1)
+        order = np.argsort(cols, kind='stable')
+        self.rev_indptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=len(self.members)))])
+        self.rev_indices = rows[order]
+
+        self.typicality = np.zeros(len(self.members), dtype=np.float64)
+        self.k = self.current_k()
+        self.refresh(alive_rows, rebuild_heap=True)
+
+    def compute_typicality(self, rows):
+        if self.k == 0:
+            return np.zeros(len(rows))
+        valid = self.alive[self.nbrs[rows]]
+        take = valid & (np.cumsum(valid, axis=1) <= self.k)
+        if np.any(take.sum(axis=1) < self.k):
+            return None
+        mean_distance = (self.sq_dists[rows] * take).sum(axis=1) / self.k
+        # low distance to NN is high density
+        return 1 / (mean_distance + 1e-5)
+
+    def refresh(self, rows, rebuild_heap=False):
+        typicality = self.compute_typicality(rows)
+        if typicality is None:
+            # a kNN list ran out of members, recompute the cluster exactly
+            self.build()
+            return
+        self.typicality[rows] = typicality
+        entries = list(zip((-typicality).tolist(), rows.tolist()))
+        if rebuild_heap:
+            self.heap = entries
+            heapq.heapify(self.heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+
+    def best(self):
+        while self.heap:
+            neg_typicality, row = self.heap[0]
+            if self.alive[row] and -neg_typicality == self.typicality[row]:
+                return self.members[row]
+            heapq.heappop(self.heap)
+        return None
+
+    def remove(self, idx):
+        row = np.searchsorted(self.members, idx)
+        assert self.members[row] == idx and self.alive[row]
+        self.alive[row] = False
+        self.num_alive -= 1
+
+        if self.num_alive == 0:
+            self.heap = []
+        elif self.current_k() != self.k:
+            self.k = self.current_k()
+            self.refresh(self.alive.nonzero()[0], rebuild_heap=True)
+        else:
+            rev = self.rev_indices[self.rev_indptr[row]:self.rev_indptr[row + 1]]
+            self.refresh(rev[self.alive[rev]])
+
+
+# full Lloyd iterations for few clusters, mini-batches of 5000 otherwise
+KMEANS_OPTIONS = dict(max_iter=100, tol=1e-4, batch_size=5000, max_no_improvement=10, reassignment_ratio=0.01)
+MINIBATCH_MIN_CLUSTERS = 51
+
+
+def kmeans(features, num_clusters, init='k-means||', **engine_options):
+    km = KMeans(n_clusters=num_clusters, init=init, minibatch=num_clusters >= MINIBATCH_MIN_CLUSTERS,
+                **KMEANS_OPTIONS, **engine_options)
+    km.fit_predict(features)
+    return km.labels_, km.cluster_centers_
+
+
+def kmeans_pp_extend(features, centers, num_clusters, device=None, seed=None, **engine_options):
+    """
+    Adds k-means++ centers to the given centers until there are num_clusters of them.
+    """
+    device = get_device(device)
+    generator = make_generator(device, seed)
+    centers = kmeans_pp(to_tensor(features, device), num_clusters, generator, centers=centers)
+    return centers.cpu().numpy()
+
+
+def kmeans_options_hash(run_seed, engine_options):
+    """Digest of everything besides features and k that determines a clustering."""
+    options = dict(KMEANS_OPTIONS, minibatch_min_clusters=MINIBATCH_MIN_CLUSTERS, run_seed=run_seed,
+                   seed=engine_options.get('seed'), deterministic=engine_options.get('deterministic', False))
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cached_kmeans(features, num_clusters, cache_dir, run_seed=None, **engine_options):
+    """
+    k-means with a cache keyed by the feature hash, the clustering options (run seed, engine
+    seed, determinism, iteration settings) and k. Clustering always runs on the full feature
+    array, so no subset is part of the key; different seeds get their own clusterings.
+
+    If a clustering with the same key and k exists, its assignments are reused. Otherwise the
+    largest cached clustering with the same key and fewer clusters is used to warm-start
+    Lloyd iterations from its centroids plus k-means++ additions.
+    """
+    prefix = (f'kmeans_{get_feature_store().hash(features)[:16]}_seed{run_seed}'
+              f'_{kmeans_options_hash(run_seed, engine_options)}')
+    cache_path = os.path.join(cache_dir, f'{prefix}_k{num_clusters}.npz')
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            print(f'Loaded clustering from {cache_path}')
+            return cached['labels']
+
+    prev_ks = []
+    for path in glob.glob(os.path.join(cache_dir, f'{prefix}_k*.npz')):
+        k = int(os.path.basename(path)[:-len('.npz')].split('_k')[-1])
+        if k < num_clusters:
+            prev_ks.append(k)
+
+    if len(prev_ks) > 0:
+        prev_path = os.path.join(cache_dir, f'{prefix}_k{max(prev_ks)}.npz')
+        with np.load(prev_path) as cached:
+            prev_centers = cached['centers']
+        print(f'Warm-starting clustering from {prev_path}')
+        init = kmeans_pp_extend(features, prev_centers, num_clusters, **engine_options)
+        labels, centers = kmeans(features, num_clusters=num_clusters, init=init, **engine_options)
     else:
-        km = MiniBatchKMeans(n_clusters=num_clusters, batch_size=5000)
-        km.fit_predict(features)
-    return km.labels_
+        labels, centers = kmeans(features, num_clusters=num_clusters, **engine_options)
+
+    save_npz_atomic(cache_path, labels=labels, centers=centers)
+    return labels
 
 
 class TypiClust:
     MIN_CLUSTER_SIZE = 5
     MAX_NUM_CLUSTERS = 500
     K_NN = 20
+    K_NN_EXTRA = 20
 
     def __init__(self, cfg, lSet, uSet, budgetSize, dataset, is_scan=False, permute=True, remove_rate=0.0):
         self.cfg = cfg
@@ -166,9 +265,11 @@ class TypiClust:
         self.init_features_and_clusters(is_scan, is_diffusion)
         self.rel_features = self.features[self.relevant_indices]
 
-        self.true_labels = np.array([self.dataset[idx][1] for idx in self.uSet])
+        # indexed by position in relevant_indices, like self.labels
+        self.true_labels = ds_utils.get_targets(self.dataset)[self.relevant_indices]
 
         self.clusters_df, self.labels, self.existing_indices = self.preprocess()
+        self.cluster_states = {}
         print(f'MIN_CLUSTER_SIZE: {self.MIN_CLUSTER_SIZE}')
 
 
@@ -194,7 +295,9 @@ class TypiClust:
             self.features = ds_utils.load_features(self.ds_name, self.seed,
                                                    is_diffusion=is_diffusion, dataset=self.dataset,
                                                    feature_type=feature_type)
-            self.clusters = kmeans(self.features, num_clusters=num_clusters)
+            self.clusters = cached_kmeans(self.features, num_clusters=num_clusters,
+                                          cache_dir=get_cache_dir(self.cfg), run_seed=self.cfg.RNG_SEED,
+                                          **engine_kwargs(self.cfg))
         print(f'Finished clustering into {num_clusters} clusters.')
         self.num_clusters = num_clusters
 
@@ -224,24 +327,29 @@ class TypiClust:
         labels[existing_indices] = -1
         return clusters_df, labels, existing_indices
 
+    def get_cluster_state(self, cluster):
+        if cluster not in self.cluster_states:
+            indices = (self.labels == cluster).nonzero()[0]
+            self.cluster_states[cluster] = ClusterTypicality(
+                self.rel_features[indices], indices, self.K_NN, self.K_NN_EXTRA)
+        return self.cluster_states[cluster]
+
     def select_samples(self):
         selected = []
         i = 0
         while len(selected) < self.budgetSize:
             # labels may run out of members. In that case, we move to the next index
             row_idx = i % len(self.clusters_df)
-            indices = np.array([])
+            state = None
 
-            while len(indices) <= 0:
+            while state is None:
                 cluster = self.clusters_df.iloc[row_idx].cluster_id
-                indices = (self.labels == cluster).nonzero()[0]
-                if len(indices) <= 0:
+                state = self.get_cluster_state(cluster)
+                if state.num_alive <= 0:
+                    state = None
                     row_idx = (row_idx + 1) % len(self.clusters_df)
 
-            rel_feats = self.rel_features[indices]
-            # in case we have too small cluster, calculate density among half of the cluster
-            typicality = calculate_typicality(rel_feats, min(self.K_NN, len(indices) // 2))
-            idx = indices[typicality.argmax()]
+            idx = state.best()
 
             is_valid = True
             if self.remove_rate > 0:
@@ -250,11 +358,10 @@ class TypiClust:
 
             if is_valid:
                 selected.append(idx)
-                self.labels[idx] = -1
                 if self.remove_rate > 0:
                     self.budget_per_class_list[true_label] -= 1
-            else:
-                self.labels[idx] = -1
+            self.labels[idx] = -1
+            state.remove(idx)
             i += 1
 
 
@@ -262,7 +369,7 @@ class TypiClust:
         assert len(selected) == self.budgetSize, 'added a different number of samples'
         assert len(np.intersect1d(selected, self.existing_indices)) == 0, 'should be new samples'
         activeSet = self.relevant_indices[selected]
-        remainSet = np.array(sorted(list(set(self.total_uSet) - set(activeSet))))
+        remainSet = remaining(self.total_uSet, activeSet)
 
         print(f'Finished the selection of {len(activeSet)} samples.')
         print(f'Active set is {activeSet}')
@@ -8,11 +8,14 @@ import numpy as np
 import torch
 import copy
 import time
-import pickle
 from tqdm import tqdm
 import pycls.datasets.utils as ds_utils
 import os
 from pycls.utils.io import compute_cand_size
+from pycls.al.anytime import SelectionDeadline, fill_from_scores
+from pycls.datasets.pool_state import remaining
+from pycls.utils.artifacts import ArtifactStore
+from pycls.al.uncertainty import UNCERTAINTY_MEASURES, uncertainty_scores
 
 class KernelDataset(torch.utils.data.Dataset):
     def __init__(self, save_dir, batch_round, device='cuda'):
@@ -137,8 +140,11 @@ class UHerding:
     def __init__(self, cfg, lSet, uSet, budgetSize, delta, clf_model, weighted=False,
                  dataObj=None, dataset=None, kernel="rbf", device="cuda",
                  batch_size=128, permute=True, val_dataloader=None,
-                 train_dataloader=None):
+                 train_dataloader=None, time_budget=None):
         self.cfg = cfg
+        if time_budget is None:
+            time_budget = self.cfg.ACTIVE_LEARNING.TIME_BUDGET
+        self.deadline = SelectionDeadline(time_budget)
         self.ds_name = self.cfg['DATASET']['NAME']
         self.seed = self.cfg['RNG_SEED']
         self.weighted = weighted
@@ -162,6 +168,7 @@ class UHerding:
             self.all_features = self.get_representation(
                 clf_model, np.arange(len(dataset)), dataset)
             print(f'Obtained features from a classifier')
+            self.all_features = self.all_features / np.linalg.norm(self.all_features, axis=-1, keepdims=True)
         else:
             feature_type = self.cfg.ACTIVE_LEARNING.UNC_FEATURE
             print('==================================')
@@ -170,11 +177,9 @@ class UHerding:
             self.all_features = ds_utils.load_features(
                 self.ds_name, self.seed, train=True, is_diffusion=False, feature_type=feature_type,
                 dataset=dataset)
+            # load_features returns l2-normalized features
             print(f'Obtained features from {feature_type}')
 
-        # normalize features
-        self.all_features = self.all_features / np.linalg.norm(self.all_features, axis=-1, keepdims=True)
-
         self.batch_size = batch_size
         self.save_dir = self.cfg.EXP_DIR
         self.lSet = lSet
@@ -222,10 +227,8 @@ class UHerding:
 
         torch.cuda.empty_cache()
 
-        self.coverage_path = self.cfg.COVERAGE_PATH  
-        self.uncertainty_path = self.cfg.UNCERTAINTY_PATH 
-        self.indices_path = self.cfg.INDICES_PATH 
-        self.logit_path = self.cfg.LOGIT_PATH 
+        self.artifacts = ArtifactStore(self.cfg.ARTIFACT_DIR, fp16_logits=self.cfg.ARTIFACT_FP16_LOGITS) \
+            if self.cfg.ARTIFACT_DIR else None
 
 
     @torch.no_grad()
@@ -247,16 +250,9 @@ class UHerding:
         features = np.concatenate(features, axis=0)
         return features
 
-    def save_results(self, path, arr):
-        if os.path.exists(path):
-            with open(path, "rb") as f:
-                existing_list = pickle.load(f)
-        else:
-            existing_list = []
-        existing_list.append(arr)
-
-        with open(path, "wb") as f:
-            pickle.dump(existing_list, f)
+    def save_results(self, name, arr):
+        if self.artifacts is not None:
+            self.artifacts.append(name, self.cfg.EPISODE, arr)
 
     def construct_kernel_fn(self, kernel_name):
         if kernel_name == "rbf":
@@ -313,6 +309,8 @@ class UHerding:
             print(f'Init lSet = 0 so init uncertainty with ones')
         else:
             best_temp = self.cfg.ACTIVE_LEARNING.TEMP
+            if self.unc_measure not in UNCERTAINTY_MEASURES:
+                raise NotImplementedError(f'Uncertainty measure {self.unc_measure} was not specified')
 
             orig_uncertainties = []
             logit_total = []
@@ -325,23 +323,7 @@ class UHerding:
                     logits = self.clf_model(x_a, y_a)['preds'] # (B, k)
                     logits = logits / best_temp
 
-                    temp_u_rank = torch.nn.functional.softmax(logits, dim=1)
-
-                    if self.unc_measure == 'entropy':
-                        uncertainty = -1.0 * torch.sum(temp_u_rank * torch.log(temp_u_rank + 1e-8), dim=1)
-                    elif self.unc_measure == 'margin':
-                        batch_size = temp_u_rank.shape[0]
-                        topk_indices = torch.topk(temp_u_rank, k=2, dim=-1, largest=True).indices
-                        top1_probs = temp_u_rank[torch.arange(batch_size), topk_indices[:,0]]
-                        top2_probs = temp_u_rank[torch.arange(batch_size), topk_indices[:,1]]
-                        uncertainty = 1.0 - (top1_probs - top2_probs)
-                    elif self.unc_measure == 'conf':
-                        batch_size = temp_u_rank.shape[0]
-                        topk_indices = torch.topk(temp_u_rank, k=2, dim=-1, largest=True).indices
-                        top1_probs = temp_u_rank[torch.arange(batch_size), topk_indices[:,0]]
-                        uncertainty = 1.0 - top1_probs
-                    else:
-                        raise NotImplementedError(f'Uncertainty measure {self.unc_measure} was not specified')
+                    uncertainty = uncertainty_scores(logits)[self.unc_measure]
 
                     orig_uncertainties.append(uncertainty)
                     logit_total.append(logits)
@@ -352,9 +334,9 @@ class UHerding:
 
             logit_total = torch.cat(logit_total, dim=0)
 
-            self.save_results(self.uncertainty_path, orig_uncertainties.reshape(-1).detach().cpu().numpy())
-            self.save_results(self.indices_path, self.relevant_indices.reshape(-1))
-            self.save_results(self.logit_path, logit_total.detach().cpu().numpy())
+            self.save_results('uncertainty', orig_uncertainties.reshape(-1).detach().cpu().numpy())
+            self.save_results('indices', self.relevant_indices.reshape(-1))
+            self.save_results('logits', logit_total.detach().cpu().numpy())
 
         aSetLoader.dataset.no_aug = False
 
@@ -369,7 +351,16 @@ class UHerding:
             max_embedding = torch.zeros(1, len(inner_lSet) + len(fixed_inner_uSet)).to(self.device) # 1 x N
 
         selected = []
+        self.exact_picks = np.zeros(self.budgetSize, dtype=bool)
+        # residual gains of the last refresh, used as fallback scores when the deadline expires
+        mean_max_embedding = None
         for i in range(self.budgetSize):
+            if mean_max_embedding is not None and self.deadline.expired():
+                # out of time: fill the remaining picks with the top residual gains of the last refresh
+                fallback = fill_from_scores(mean_max_embedding, self.budgetSize - i, inner_lSet).to(self.device)
+                inner_lSet = torch.cat((inner_lSet, fallback.view(-1)))
+                break
+
             num_lSet = len(inner_lSet)
             num_uSet = len(inner_uSet)
 
@@ -390,6 +381,7 @@ class UHerding:
             inner_uSet = fixed_inner_uSet[inner_uSet_bool]
 
             max_embedding = updated_max_embedding[selected_index].unsqueeze(0) + max_embedding
+            self.exact_picks[i] = True
 
             if len(set(inner_lSet.cpu().numpy())) != num_lSet + 1:
                 print(f'inner_lSet: {len(set(inner_lSet.numpy()))} is not equal to {num_lSet+1}'); exit()
@@ -400,8 +392,9 @@ class UHerding:
         selected = inner_lSet[len(self.lSet):].cpu()
 
         assert len(selected) == self.budgetSize, 'added a different number of samples'
+        self.deadline.report(self.exact_picks)
         activeSet = self.relevant_indices[selected].reshape(-1)
-        remainSet = np.array(sorted(list(set(self.total_uSet) - set(activeSet))))
+        remainSet = remaining(self.total_uSet, activeSet)
 
         print(f'Finished the selection of {len(activeSet)} samples.')
         print(f'Active set is {activeSet}')
@@ -0,0 +1,102 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Streaming uncertainty scoring (confidence, entropy, margin) over the unlabeled pool."""
+
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+
+UNCERTAINTY_MEASURES = ('conf', 'entropy', 'margin')
+
+
+def uncertainty_scores(logits, temp=1.0):
+    """
+    All uncertainty measures of a batch of logits from one softmax and one topk(2),
+    higher is more uncertain:
+        conf = 1 - p_1, margin = 1 - (p_1 - p_2), entropy = -sum_c p_c log p_c.
+    """
+    probs = F.softmax(logits / temp, dim=1)
+    top2 = torch.topk(probs, k=min(2, probs.shape[1]), dim=1).values
+    second = top2[:, 1] if top2.shape[1] > 1 else torch.zeros_like(top2[:, 0])
+    return {
+        'conf': 1.0 - top2[:, 0],
+        'entropy': -torch.sum(probs * torch.log(probs + 1e-8), dim=1),
+        'margin': 1.0 - (top2[:, 0] - second),
+    }
+
+
+class StreamingTopK:
+    """Running top-k of (score, index) pairs, kept on the scoring device in O(k) memory."""
+
+    def __init__(self, k, device):
+        self.k = k
+        self.values = torch.empty(0, device=device)
+        self.indices = torch.empty(0, dtype=torch.long, device=device)
+
+    def update(self, scores, indices):
+        values = torch.cat([self.values, scores.float()])
+        indices = torch.cat([self.indices, indices])
+        if values.shape[0] > self.k:
+            values, order = torch.topk(values, self.k)
+            indices = indices[order]
+        self.values, self.indices = values, indices
+
+    def result(self):
+        """Indices of the top-k scores, highest first."""
+        order = torch.argsort(self.values, descending=True)
+        return self.indices[order]
+
+
+class UncertaintyScorer:
+    """
+    Scores a pool with a classifier in a single pass and keeps the budgetSize most uncertain
+    points per measure, so memory does not grow with the pool size.
+
+    Transductive classifiers (e.g. NNNet), which take the labeled set as input, are supported
+    through lSet_fn: it is called once, only if the plain forward fails.
+    """
+
+    def __init__(self, model, budgetSize, measures=UNCERTAINTY_MEASURES, temp=1.0, device='cuda', lSet_fn=None):
+        for measure in measures:
+            assert measure in UNCERTAINTY_MEASURES, f'Uncertainty measure {measure} is not implemented'
+        self.model = model
+        self.budgetSize = budgetSize
+        self.measures = list(measures)
+        self.temp = temp
+        self.device = device
+        self.lSet_fn = lSet_fn
+        self.lSet_data = None
+
+    def logits(self, x, y):
+        if self.lSet_data is None:
+            try:
+                return self.model(x, y)['preds']
+            except TypeError:
+                if self.lSet_fn is None:
+                    raise
+                x_ls, y_ls = self.lSet_fn()
+                self.lSet_data = (x_ls.to(self.device), y_ls.to(self.device))
+        x_ls, y_ls = self.lSet_data
+        return self.model(x_ls, y_ls, x, return_logits=True)['preds']
+
+    @torch.no_grad()
+    def select(self, dataLoader):
+        """
+        dataLoader iterates sequentially over the pool. Returns, per measure, the positions
+        (into the pool) of the budgetSize highest scores, most uncertain first.
+        """
+        heaps = {m: StreamingTopK(self.budgetSize, self.device) for m in self.measures}
+        offset = 0
+        for x, y in tqdm(dataLoader, desc="uSet Activations"):
+            x = x.to(self.device, non_blocking=True)
+            y = y.to(self.device, non_blocking=True)
+            scores = uncertainty_scores(self.logits(x, y), self.temp)
+            positions = torch.arange(offset, offset + x.shape[0], device=self.device)
+            for m in self.measures:
+                heaps[m].update(scores[m], positions)
+            offset += x.shape[0]
+        return {m: heaps[m].result().cpu().numpy() for m in self.measures}
@@ -182,6 +182,11 @@ def train_vae_disc(cfg, lSet, uSet, trainDataset, dataObj, debug=False):
         vae_model, disc_model, optim_vae, optim_disc, curr_vae_disc_iter = train_vae_disc_epoch(cfg, vae_model, disc_model, optim_vae, \
             optim_disc, lSetLoader, uSetLoader, epoch, n_lu_points, curr_vae_disc_iter, max_vae_disc_iters, change_lr_iter)
 
+    save_vae_disc(cfg, vae_model, disc_model, optim_vae, optim_disc, debug)
+
+    return vae_model, disc_model
+
+def save_vae_disc(cfg, vae_model, disc_model, optim_vae, optim_disc, debug=False):
     #Save vae and disc models
     vae_sd = vae_model.module.state_dict() if cfg.NUM_GPUS > 1 else vae_model.state_dict()
     disc_sd = disc_model.module.state_dict() if cfg.NUM_GPUS > 1 else disc_model.state_dict()
@@ -208,4 +213,75 @@ def train_vae_disc(cfg, lSet, uSet, trainDataset, dataObj, debug=False):
     if debug: print("Saved VAE model at {}".format(vae_checkpoint_file))
     if debug: print("Saved DISC model at {}".format(disc_checkpoint_file))
 
+def train_vae_disc_features(cfg, l_features, u_features, debug=False):
+    """
+    VAAL over fixed features: an MLP VAE and the discriminator are trained from in-memory
+    feature tensors (on the training device) with batches of cfg.VAAL.FEATURE_BS points, so no
+    images are read, decoded or augmented. Labeled and unlabeled batches share one VAE forward.
+    """
+    device = l_features.device
+    n_l, n_u = l_features.shape[0], u_features.shape[0]
+    vae_model = vm.FeatureVAE(l_features.shape[1], z_dim=cfg.VAAL.Z_DIM,
+                              hidden_dim=cfg.VAAL.FEATURE_HIDDEN_DIM).to(device)
+    disc_model = vm.Discriminator(z_dim=cfg.VAAL.Z_DIM).to(device)
+
+    optim_vae = torch.optim.Adam(vae_model.parameters(), lr=cfg.VAAL.VAE_LR)
+    optim_disc = torch.optim.Adam(disc_model.parameters(), lr=cfg.VAAL.DISC_LR)
+    logger.info(f"VAE Optimizer ==> {optim_vae}")
+    logger.info(f"Disc Optimizer ==> {optim_disc}")
+
+    l_bs = min(int(cfg.VAAL.FEATURE_BS), n_l)
+    u_bs = min(int(cfg.VAAL.FEATURE_BS), n_u)
+    train_iterations = max(int((n_l + n_u) / cfg.VAAL.FEATURE_BS), 1)
+    max_vae_disc_iters = train_iterations * cfg.VAAL.VAE_EPOCHS
+    change_lr_iter = max(max_vae_disc_iters // 25, 1)
+    curr_vae_disc_iter = 0
+
+    lab_real_preds = torch.ones(l_bs, 1, device=device)
+    unlab_real_preds = torch.ones(u_bs, 1, device=device)
+    unlab_fake_preds = torch.zeros(u_bs, 1, device=device)
+
+    for epoch in range(cfg.VAAL.VAE_EPOCHS):
+        for temp_iter in range(train_iterations):
+            if curr_vae_disc_iter != 0 and curr_vae_disc_iter % change_lr_iter == 0:
+                for param in optim_vae.param_groups:
+                    param['lr'] = param['lr'] * 0.9
+                for param in optim_disc.param_groups:
+                    param['lr'] = param['lr'] * 0.9
+            curr_vae_disc_iter += 1
+
+            x = torch.cat([l_features[torch.randint(n_l, (l_bs,), device=device)],
+                           u_features[torch.randint(n_u, (u_bs,), device=device)]])
+
+            ## VAE Step
+            disc_model.eval()
+            vae_model.train()
+            recon, _, mu, logvar = vae_model(x)
+            unsup_loss = vae_loss(x[:l_bs], recon[:l_bs], mu[:l_bs], logvar[:l_bs], cfg.VAAL.BETA)
+            transductive_loss = vae_loss(x[l_bs:], recon[l_bs:], mu[l_bs:], logvar[l_bs:], cfg.VAAL.BETA)
+            preds = disc_model(mu)
+            dsc_loss = bce_loss(preds[:l_bs], lab_real_preds) + bce_loss(preds[l_bs:], unlab_real_preds)
+            total_vae_loss = unsup_loss + transductive_loss + cfg.VAAL.ADVERSARY_PARAM * dsc_loss
+
+            optim_vae.zero_grad()
+            total_vae_loss.backward()
+            optim_vae.step()
+
+            ##DISC STEP
+            vae_model.eval()
+            disc_model.train()
+            with torch.no_grad():
+                _, _, mu, _ = vae_model(x)
+            preds = disc_model(mu)
+            dsc_loss = bce_loss(preds[:l_bs], lab_real_preds) + bce_loss(preds[l_bs:], unlab_fake_preds)
+
+            optim_disc.zero_grad()
+            dsc_loss.backward()
+            optim_disc.step()
+
+        if epoch % 10 == 0 or epoch == cfg.VAAL.VAE_EPOCHS - 1:
+            print("Epoch[{}], VAE Loss: {:.3f}, Disc Loss: {:.4f}".format(epoch, total_vae_loss.item(), dsc_loss.item()))
+
+    save_vae_disc(cfg, vae_model, disc_model, optim_vae, optim_disc, debug)
+
     return vae_model, disc_model
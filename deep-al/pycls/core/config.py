@@ -31,6 +31,12 @@ _C.OUT_DIR = 'output'
 _C.EXP_DIR = ''
 # Episode directory
 _C.EPISODE_DIR = ''
+# Current AL episode
+_C.EPISODE = 0
+# Append-only per-episode artifact store (pycls.utils.artifacts), empty disables it
+_C.ARTIFACT_DIR = ''
+# Store logits in the artifact store as fp16
+_C.ARTIFACT_FP16_LOGITS = True
 # Config destination (in OUT_DIR)
 _C.CFG_DEST = 'config.yaml'
 # Note that non-determinism may still be present due to non-deterministic
@@ -59,6 +65,9 @@ _C.VAAL.DISC_LR = 5e-4
 _C.VAAL.BETA = 1.0
 _C.VAAL.ADVERSARY_PARAM = 1.0
 _C.VAAL.IM_SIZE = 32
+# Feature-space VAAL (vaal_feat): batch size and hidden width of the MLP VAE
+_C.VAAL.FEATURE_BS = 1024
+_C.VAAL.FEATURE_HIDDEN_DIM = 512
 
 #------------------------------------------------------------------------------#
 # Ensemble Options
@@ -67,6 +76,8 @@ _C.ENSEMBLE = CN()
 _C.ENSEMBLE.NUM_MODELS = 3
 _C.ENSEMBLE.SAME_MODEL = True
 _C.ENSEMBLE.MODEL_TYPE = ['resnet18']
+# Train all members at once as one stacked (vmapped) model that shares the data pipeline
+_C.ENSEMBLE.BATCHED = False
 
 # ---------------------------------------------------------------------------- #
 # Model options
@@ -195,9 +206,29 @@ _C.ACTIVE_LEARNING.DATA_SPLIT = 0
 _C.ACTIVE_LEARNING.BUDGET_SIZE = 5000 # 10% of initial lSet
 _C.ACTIVE_LEARNING.N_BINS = 500 # Used by UC_uniform
 _C.ACTIVE_LEARNING.DROPOUT_ITERATIONS = 25 # Used by DBAL and BALD
+_C.ACTIVE_LEARNING.BALD_HEAD_ONLY = True # BALD reuses penultimate features when dropout only precedes the fc layer
 _C.ACTIVE_LEARNING.INIT_L_RATIO = 0.1 # Initial labeled pool ration
 _C.ACTIVE_LEARNING.MAX_ITER = 5 # Max AL iterations
 _C.ACTIVE_LEARNING.FINE_TUNE = True # continue after AL from existing model or from scratch
+_C.ACTIVE_LEARNING.TIME_BUDGET = 0.0 # Wall-clock budget (sec) for greedy selection, <= 0 disables it
+_C.ACTIVE_LEARNING.CACHE_DIR = '' # Cache for graphs/clusterings reused across episodes, defaults to OUT_DIR/al_cache
+_C.ACTIVE_LEARNING.ACTIVEFT_CHECK_EVERY = 10 # ActiveFT checks its loss for convergence every N iterations
+_C.ACTIVE_LEARNING.ACTIVEFT_TOL = 0.0 # Relative loss change that stops ActiveFT early (e.g. 1e-4), <= 0 runs all iterations
+_C.ACTIVE_LEARNING.KCENTER_CANDIDATES = 0 # k-center only picks among the N points farthest from the lSet (no pruning while the lSet is empty), 0 uses all points
+_C.ACTIVE_LEARNING.GRAPH_BACKEND = 'torch' # 'torch' (blocked cdist on GPU/CPU) or 'faiss' (range search)
+_C.ACTIVE_LEARNING.UNC_POOL_SIZE = 0 # conf/entropy/margin score a random subset of this size, 0 scores the whole uSet
+_C.ACTIVE_LEARNING.FEATURE_PRECISION = 'fp32' # Precision of normalized ProbCover features: 'fp32', 'fp16' or 'int8' (per-row scale); other samplers use fp32
+
+# ---------------------------------------------------------------------------- #
+# Clustering engine options (pycls.al.clustering)
+# ---------------------------------------------------------------------------- #
+_C.CLUSTERING = CN()
+# Device used for clustering, empty string selects cuda when available
+_C.CLUSTERING.DEVICE = ''
+# Number of CPU threads used for clustering (0 keeps the torch default)
+_C.CLUSTERING.NUM_THREADS = 0
+# Fixed-seed mode: seeds the engine with RNG_SEED and avoids non-deterministic reductions
+_C.CLUSTERING.DETERMINISTIC = False
 
 # ---------------------------------------------------------------------------- #
 # Common train/test data loader options
@@ -207,6 +238,14 @@ _C.DATA_LOADER = CN()
 _C.DATA_LOADER.NUM_WORKERS = 4
 # Load data to pinned host memory
 _C.DATA_LOADER.PIN_MEMORY = True
+# Reuse persistent worker pools (one per dataset) across all loaders of a run
+_C.DATA_LOADER.PERSISTENT = True
+# Max worker pools kept per dataset, i.e. loaders of one dataset iterated at the same time
+_C.DATA_LOADER.MAX_POOLS = 2
+# Train on small labeled sets from a decoded uint8 cache with batched augmentation (LabeledSetCache)
+_C.DATA_LOADER.LSET_CACHE = False
+# Largest labeled set served from the cache; larger sets use the regular loaders
+_C.DATA_LOADER.LSET_CACHE_MAX = 10000
 
 # ---------------------------------------------------------------------------- #
 # CUDNN options
@@ -228,6 +267,11 @@ _C.DATASET.ROOT_DIR = None
 _C.DATASET.VAL_RATIO = 0.1
 # Data augmentation methods - 'simclr', 'randaug', 'hflip'
 _C.DATASET.AUG_METHOD = 'hflip'
+# Image storage of IMAGENET, IMAGENET100, TINYIMAGENET and DOMAINNET: 'native' (LMDB / image files) or
+# 'shards' (pre-resized uint8 shards written by tools/convert_shards.py)
+_C.DATASET.BACKEND = 'native'
+# Directory of the shards; empty means <ROOT_DIR>/shards
+_C.DATASET.SHARD_DIR = ''
 # Accepted Datasets
 _C.DATASET.ACCEPTED = ['MNIST','SVHN','CIFAR10', 'CIFAR10-00', 'CIFAR10-01', 'CIFAR10-02', 'CIFAR10-05', 'CIFAR100','TINYIMAGENET', 'IMBALANCED_TINYIMAGENET',
                        'IMBALANCED_CIFAR10', 'IMBALANCED_CIFAR100',
@@ -0,0 +1,133 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Trains all members of an ensemble at once as one stacked, vmapped model."""
+
+import os
+import torch
+
+import pycls.core.losses as losses
+import pycls.core.optimizer as optim
+import pycls.utils.checkpoint as cu
+import pycls.utils.logging as lu
+from pycls.models.ensemble import StackedEnsemble
+
+logger = lu.get_logger(__name__)
+
+
+def construct_stacked_optimizer(cfg, ensemble, model):
+    """The optimizer of construct_optimizer(cfg, model), over the stacked parameters."""
+    member_optimizer = optim.construct_optimizer(cfg, model)
+    param_groups = ensemble.stack_param_groups(model, member_optimizer.param_groups)
+    return type(member_optimizer)(param_groups, **member_optimizer.defaults)
+
+
+def train_stacked_epoch(train_loader, ensemble, loss_fun, optimizer, cur_epoch, cfg, member_inputs, device):
+    """
+    One epoch over the shared loader. With member_inputs the batches are B x T x ...
+    (one augmentation per member) and every member sees its own views.
+    Returns the mean training loss of every member.
+    """
+    lr = optim.get_epoch_lr(cfg, cur_epoch)
+    if cfg.OPTIM.TYPE == "sgd":
+        optim.set_lr(optimizer, lr)
+
+    ensemble.train()
+    loss_sum = torch.zeros(ensemble.num_members, device=device)
+    for cur_iter, (inputs, labels) in enumerate(train_loader):
+        inputs = inputs.to(device, non_blocking=True).float()
+        labels = labels.to(device, non_blocking=True)
+        if member_inputs:
+            inputs = inputs.transpose(0, 1)
+        preds = ensemble(inputs, randomness='different', member_inputs=member_inputs)
+        # the members do not share parameters, so the gradient of the sum is the per-member gradient
+        member_losses = torch.stack([loss_fun(member_preds, labels) for member_preds in preds])
+        optimizer.zero_grad()
+        member_losses.sum().backward()
+        optimizer.step()
+        loss_sum += member_losses.detach()
+    return (loss_sum / max(len(train_loader), 1)).tolist()
+
+
+@torch.no_grad()
+def stacked_val_accs(val_loader, ensemble, device):
+    """Accuracy of every member on val_loader, computed in one pass."""
+    ensemble.eval()
+    correct = torch.zeros(ensemble.num_members, device=device)
+    total = 0
+    for inputs, labels in val_loader:
+        inputs = inputs.to(device, non_blocking=True).float()
+        labels = labels.to(device, non_blocking=True)
+        preds = ensemble(inputs)
+        correct += (preds.argmax(dim=-1) == labels).sum(dim=1)
+        total += labels.shape[0]
+    return (100. * correct / max(total, 1)).tolist()
+
+
+def train_stacked_ensemble(train_loader, val_loader, models, cfg, is_eval_epoch):
+    """
+    Trains models (same architecture) together and saves the best validation checkpoint of
+    every member to EPISODE_DIR/model_{i+1}.
+
+    All members share train_loader and hence the batch order. Parameters, optimizer state,
+    dropout draws and, when train_loader yields B x T x ... batches built with
+    Data.getMultiViewDataset, data augmentations stay independent per member.
+
+    Returns lists of the best validation accuracy, best epoch and checkpoint file per member.
+    """
+    assert not cfg.BN.USE_PRECISE_STATS, 'Precise BN statistics are not supported for batched ensembles'
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    member_inputs = not cfg.MODEL.LINEAR_FROM_FEATURES
+
+    num_members = len(models)
+    ensemble = StackedEnsemble(models).to(device)
+    optimizer = construct_stacked_optimizer(cfg, ensemble, models[0])
+    print("optimizer: {}\n".format(optimizer))
+    logger.info("optimizer: {}\n".format(optimizer))
+    loss_fun = losses.get_loss_fun(cfg)
+
+    best_val_accs = [0.] * num_members
+    best_val_epochs = [0] * num_members
+    best_model_states = [None] * num_members
+    val_accs = [0.] * num_members
+
+    for cur_epoch in range(cfg.OPTIM.MAX_EPOCH):
+        train_losses = train_stacked_epoch(train_loader, ensemble, loss_fun, optimizer, cur_epoch, cfg,
+                                           member_inputs, device)
+
+        if is_eval_epoch(cur_epoch):
+            val_loader.dataset.no_aug = True
+            val_accs = stacked_val_accs(val_loader, ensemble, device)
+            val_loader.dataset.no_aug = False
+            for i in range(num_members):
+                if best_val_accs[i] < val_accs[i]:
+                    best_val_accs[i] = val_accs[i]
+                    best_val_epochs[i] = cur_epoch + 1
+                    best_model_states[i] = ensemble.member_state_dict(i)
+
+        print('Training Epoch: {}/{}\tTrain Losses: {}\tVal Accuracies: {}'.format(cur_epoch+1, cfg.OPTIM.MAX_EPOCH,
+              [round(l, 4) for l in train_losses], [round(a, 4) for a in val_accs]))
+        logger.info('Epoch {}: train losses {}, val accuracies {}'.format(cur_epoch+1, train_losses, val_accs))
+
+    # Like sequential training, the models continue from their last weights in the next episode
+    for i, model in enumerate(models):
+        model.load_state_dict(ensemble.member_state_dict(i))
+
+    # Save the best checkpoint of every member in its own directory (Episode level)
+    episode_dir = cfg.EPISODE_DIR
+    checkpoint_files = []
+    for i in range(num_members):
+        if best_model_states[i] is None:
+            best_model_states[i] = ensemble.member_state_dict(i)
+        cfg.EPISODE_DIR = os.path.join(episode_dir, 'model_{}'.format(i+1))
+        # the stacked optimizer state cannot be split per member, it is not needed to load the models
+        checkpoint_file = cu.save_checkpoint(info="vlBest_acc_"+str(int(best_val_accs[i])), \
+            model_state=best_model_states[i], optimizer_state=None, epoch=best_val_epochs[i], cfg=cfg)
+        checkpoint_files.append(checkpoint_file)
+        logger.info('Wrote Best Model Checkpoint of Model {} to: {}\n'.format(i+1, checkpoint_file))
+    cfg.EPISODE_DIR = episode_dir
+
+    return best_val_accs, best_val_epochs, checkpoint_files
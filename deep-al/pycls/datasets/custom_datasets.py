@@ -32,12 +32,12 @@ class CIFAR10(torchvision.datasets.CIFAR10):
         """
         img, target = self.data[index], self.targets[index]
 
-        # doing this so that it is consistent with all other datasets
-        # to return a PIL Image
-        img = Image.fromarray(img)
         if self.only_features:
             img = self.features[index]
         else:
+            # doing this so that it is consistent with all other datasets
+            # to return a PIL Image
+            img = Image.fromarray(img)
             if self.no_aug:
                 if self.test_transform is not None:
                     img = self.test_transform(img)
@@ -69,12 +69,12 @@ class CIFAR100(torchvision.datasets.CIFAR100):
         """
         img, target = self.data[index], self.targets[index]
 
-        # doing this so that it is consistent with all other datasets
-        # to return a PIL Image
-        img = Image.fromarray(img)
         if self.only_features:
             img = self.features[index]
         else:
+            # doing this so that it is consistent with all other datasets
+            # to return a PIL Image
+            img = Image.fromarray(img)
             if self.no_aug:
                 if self.test_transform is not None:
                     img = self.test_transform(img)
@@ -104,12 +104,12 @@ class STL10(torchvision.datasets.STL10):
         """
         img, target = self.data[index], int(self.targets[index])
 
-        # doing this so that it is consistent with all other datasets
-        # to return a PIL Image
-        img = Image.fromarray(img.transpose(1,2,0))
         if self.only_features:
             img = self.features[index]
         else:
+            # doing this so that it is consistent with all other datasets
+            # to return a PIL Image
+            img = Image.fromarray(img.transpose(1,2,0))
             if self.no_aug:
                 if self.test_transform is not None:
                     img = self.test_transform(img)
@@ -156,6 +156,7 @@ class SVHN(torchvision.datasets.SVHN):
         super(SVHN, self).__init__(root, train, transform=transform, download=download)
         self.test_transform = test_transform
         self.no_aug = False
+        self.targets = self.labels
 
     def __getitem__(self, index: int):
         """
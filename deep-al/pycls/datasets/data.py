@@ -7,6 +7,8 @@
 #
 ####################################################################################
 
+import os
+import copy
 import torch
 import numpy as np
 
@@ -20,6 +22,12 @@ from pycls.datasets.sampler import IndexedSequentialSampler
 from pycls.datasets.tiny_imagenet import TinyImageNet
 from pycls.datasets.imagenet import ImageNet
 from pycls.datasets.domainnet import DomainNet
+from pycls.datasets.shards import ShardDataset
+from pycls.datasets.feature_loader import FeatureBatchLoader
+from pycls.datasets.loader_manager import LoaderManager
+from pycls.datasets.labeled_cache import BatchAugment, LabeledSetCache
+from pycls.datasets.pool_state import PoolState, as_indices
+import pycls.datasets.utils as ds_utils
 
 logger = lu.get_logger(__name__)
 
@@ -54,6 +62,22 @@ class MultiEpochsDataLoader(torch.utils.data.DataLoader):
             yield next(self.iterator)
 
 
+class MultiViewTransform(object):
+    """ Applies a random transform num_views times to the same decoded image.
+    Returns the views stacked along a new leading dimension.
+    """
+
+    def __init__(self, transform, num_views):
+        self.transform = transform
+        self.num_views = num_views
+
+    def __call__(self, img):
+        return torch.stack([self.transform(img) for _ in range(self.num_views)])
+
+    def __repr__(self):
+        return '{}(num_views={}, transform={})'.format(self.__class__.__name__, self.num_views, self.transform)
+
+
 class Data:
     """
     Contains all data related functions. For working with new dataset
@@ -72,6 +96,9 @@ class Data:
         """
         self.cfg = cfg
         self.num_workers = cfg.DATA_LOADER.NUM_WORKERS
+        self.loaders = LoaderManager(self.num_workers, pin_memory=cfg.DATA_LOADER.PIN_MEMORY,
+                                     max_pools=cfg.DATA_LOADER.MAX_POOLS) if cfg.DATA_LOADER.PERSISTENT else None
+        self.lset_cache = None
         self.dataset = cfg.DATASET.NAME
         self.data_dir = cfg.DATASET.ROOT_DIR
         self.datasets_accepted = cfg.DATASET.ACCEPTED
@@ -112,7 +139,7 @@ class Data:
                 norm_mean = [0.485, 0.456, 0.406]
                 norm_std = [0.229, 0.224, 0.225]
             elif self.dataset in ["DOMAINNET"]:
-                ops = [transforms.Resized((224, 224)),
+                ops = [transforms.Resize((224, 224)),
                        transforms.RandomHorizontalFlip()]
                 # Using ImageNet values
                 norm_mean = [0.485, 0.456, 0.406]
@@ -168,6 +195,31 @@ class Data:
             raise NotImplementedError
 
 
+    def getBatchedAugmentation(self):
+        """
+        Batched equivalent of the training ops of getPreprocessOps, used by the labeled-set cache.
+
+        OUTPUT:
+        Tuple of the decoded (cached) image size, the resize mode of decoding and a BatchAugment
+        instance; None when the ops have no batched equivalent (RandAugment, DeiT models).
+        """
+        if self.cfg.MODEL.TYPE.startswith('deit_') or self.aug_method == 'randaug':
+            return None
+        hflip = self.aug_method == 'hflip'
+        imagenet_mean, imagenet_std = [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]
+
+        if self.dataset in ["CIFAR10", "CIFAR100"]:
+            return 32, 'crop', BatchAugment(32, [0.4914, 0.4822, 0.4465], [0.2023, 0.1994, 0.201], padding=4, hflip=hflip)
+        elif self.dataset in ["TINYIMAGENET"]:
+            return 64, 'crop', BatchAugment(64, imagenet_mean, imagenet_std, scale=(0.5, 1.), hflip=hflip)
+        elif self.dataset in ["DOMAINNET"]:
+            return 224, 'stretch', BatchAugment(224, imagenet_mean, imagenet_std, hflip=True)
+        elif self.dataset in ["IMAGENET", 'IMAGENET50', 'IMAGENET100', 'IMAGENET200']:
+            # random resized crops are taken from the image resized to 256
+            return 256, 'crop', BatchAugment(224, imagenet_mean, imagenet_std, scale=(0.5, 1.), hflip=hflip)
+        return None
+
+
     def getDataset(self, save_dir, isTrain=True, isDownload=False):
         """
         This function returns the dataset instance and number of data points in it.
@@ -201,6 +253,13 @@ class Data:
         print(f'============ preprocess steps: {preprocess_steps} ===========')
         print(f'============ test_preprocess_steps: {test_preprocess_steps} ===========')
 
+        if self.cfg.DATASET.BACKEND == 'shards' and self.dataset in ['TINYIMAGENET', 'DOMAINNET', 'IMAGENET', 'IMAGENET100']:
+            shard_dir = self.cfg.DATASET.SHARD_DIR or os.path.join(save_dir, 'shards')
+            shards = ShardDataset(shard_dir, split='train' if isTrain else 'test', transform=preprocess_steps,
+                                  test_transform=test_preprocess_steps, only_features=only_features)
+            assert shards.dataset_name == self.dataset, \
+                "Shards at {} were written for {}, not {}".format(shard_dir, shards.dataset_name, self.dataset)
+            return shards, len(shards)
 
         if self.dataset in ["CIFAR10"]:
             cifar10 = CIFAR10(save_dir, self.cfg, train=isTrain, transform=preprocess_steps,
@@ -281,7 +340,7 @@ class Data:
         valSet = []
 
         n_dataPoints = len(data)
-        all_idx = [i for i in range(n_dataPoints)]
+        all_idx = np.arange(n_dataPoints)
         np.random.shuffle(all_idx)
         train_splitIdx = int(train_split_ratio*n_dataPoints)
         #To get the validation index from end we multiply n_datapoints with 1-val_ratio
@@ -295,9 +354,9 @@ class Data:
         uSet = all_idx[train_splitIdx:val_splitIdx]
         valSet = all_idx[val_splitIdx:]
 
-        lSet = np.array(lSet, dtype=np.ndarray)
-        uSet = np.array(uSet, dtype=np.ndarray)
-        valSet = np.array(valSet, dtype=np.ndarray)
+        lSet = as_indices(lSet)
+        uSet = as_indices(uSet)
+        valSet = as_indices(valSet)
 
         np.save(f'{save_dir}/lSet.npy', lSet)
         np.save(f'{save_dir}/uSet.npy', uSet)
@@ -334,7 +393,7 @@ class Data:
         valSet = []
 
         n_dataPoints = len(data)
-        all_idx = [i for i in range(n_dataPoints)]
+        all_idx = np.arange(n_dataPoints)
         np.random.shuffle(all_idx)
 
         # To get the validation index from end we multiply n_datapoints with 1-val_ratio
@@ -343,8 +402,8 @@ class Data:
         trainSet = all_idx[:val_splitIdx]
         valSet = all_idx[val_splitIdx:]
 
-        trainSet = np.array(trainSet, dtype=np.ndarray)
-        valSet = np.array(valSet, dtype=np.ndarray)
+        trainSet = as_indices(trainSet)
+        valSet = as_indices(valSet)
 
         np.save(f'{save_dir}/trainSet.npy', trainSet)
         np.save(f'{save_dir}/valSet.npy', valSet)
@@ -387,8 +446,8 @@ class Data:
         uSet = data[:val_splitIdx]
         valSet = data[val_splitIdx:]
 
-        uSet = np.array(uSet, dtype=np.ndarray)
-        valSet = np.array(valSet, dtype=np.ndarray)
+        uSet = as_indices(uSet)
+        valSet = as_indices(valSet)
 
         np.save(f'{save_dir}/uSet.npy', uSet)
         np.save(f'{save_dir}/valSet.npy', valSet)
@@ -421,14 +480,66 @@ class Data:
             orig_indexes = indexes
             indexes = np.concatenate((indexes, orig_indexes))
 
-        subsetSampler = SubsetRandomSampler(indexes)
+        if getattr(data, 'only_features', False):
+            return FeatureBatchLoader(data, indexes, min(batch_size, len(indexes)), shuffle=True, drop_last=True)
+
         batch_size = min(batch_size, len(indexes))
+        if self.loaders is not None:
+            return self.loaders.loader(data, indexes, batch_size, shuffle=True, drop_last=True)
 
-        loader = MultiEpochsDataLoader(dataset=data, num_workers=8, batch_size=batch_size,
+        subsetSampler = SubsetRandomSampler(indexes)
+        loader = MultiEpochsDataLoader(dataset=data, num_workers=self.num_workers, batch_size=batch_size,
                                        sampler=subsetSampler, pin_memory=True, drop_last=True)
         return loader
 
 
+    def getLabeledSetLoader(self, indexes, batch_size, data):
+        """
+        Training loader of the labeled set. With DATA_LOADER.LSET_CACHE on and at most
+        DATA_LOADER.LSET_CACHE_MAX indexes, batches come from a LabeledSetCache of data, kept
+        across calls and grown with the new labels, and are augmented by getBatchedAugmentation.
+        Otherwise, and for feature-only datasets, this is getIndexesDataLoader.
+
+        ARGS
+        -----
+
+        indexes: np.ndarray, dtype: int, Array of labeled indexes.
+
+        batch_size: int, Specifies the batchsize used by data loader.
+
+        data: reference to dataset instance. This can be obtained by calling getDataset function of Data class.
+
+        OUTPUT
+        ------
+
+        Returns a reference to dataloader
+        """
+        augmentation = self.getBatchedAugmentation()
+        if (not self.cfg.DATA_LOADER.LSET_CACHE or augmentation is None or getattr(data, 'only_features', False)
+                or len(indexes) > self.cfg.DATA_LOADER.LSET_CACHE_MAX):
+            return self.getIndexesDataLoader(indexes, batch_size, data)
+
+        # same batches as getIndexesDataLoader for labeled sets smaller than a batch
+        while len(indexes) < batch_size:
+            indexes = np.concatenate((indexes, indexes))
+
+        if self.lset_cache is None or self.lset_cache.dataset is not data:
+            size, resize, augment = augmentation
+            self.lset_cache = LabeledSetCache(data, size, augment, resize=resize, num_workers=self.num_workers)
+        return self.lset_cache.loader(indexes, batch_size, shuffle=True, drop_last=True)
+
+
+    def getMultiViewDataset(self, data, num_views):
+        """
+        Returns a shallow copy of data whose training transform yields num_views independent
+        augmentations of every image, stacked as num_views x C x H x W. Images are read and
+        decoded once per sample; the test transform (no_aug) is left untouched.
+        """
+        multi_view_data = copy.copy(data)
+        multi_view_data.transform = MultiViewTransform(data.transform, num_views)
+        return multi_view_data
+
+
     def getSequentialDataLoader(self, indexes, batch_size, data):
         """
         Gets reference to the data loader which provides batches of <batch_size> sequentially
@@ -452,6 +563,11 @@ class Data:
         assert isinstance(indexes, np.ndarray), "Indexes has dtype: {} whereas expected is nd.array.".format(type(indexes))
         assert isinstance(batch_size, int), "Batchsize is expected to be of int type whereas currently it has dtype: {}".format(type(batch_size))
 
+        if getattr(data, 'only_features', False):
+            return FeatureBatchLoader(data, indexes, batch_size)
+        if self.loaders is not None:
+            return self.loaders.loader(data, indexes, batch_size)
+
         subsetSampler = IndexedSequentialSampler(indexes)
 
         loader = MultiEpochsDataLoader(dataset=data, num_workers=self.num_workers, batch_size=batch_size, sampler=subsetSampler, shuffle=False, pin_memory=True)
@@ -479,6 +595,10 @@ class Data:
 
         if self.dataset in self.datasets_accepted:
             n_datapts = len(data)
+            if getattr(data, 'only_features', False):
+                return FeatureBatchLoader(data, np.arange(n_datapts), test_batch_size, shuffle=True)
+            if self.loaders is not None:
+                return self.loaders.loader(data, np.arange(n_datapts), test_batch_size, shuffle=True)
             idx = [i for i in range(n_datapts)]
 
             test_sampler = SubsetRandomSampler(idx)
@@ -495,14 +615,14 @@ class Data:
         assert isinstance(uSetPath, str), "Expected uSetPath to be a string."
         assert isinstance(valSetPath, str), "Expected valSetPath to be a string."
 
-        lSet = np.load(lSetPath, allow_pickle=True)
-        uSet = np.load(uSetPath, allow_pickle=True)
-        valSet = np.load(valSetPath, allow_pickle=True)
+        # allow_pickle only for object-dtype partitions saved by older runs
+        lSet = as_indices(np.load(lSetPath, allow_pickle=True))
+        uSet = as_indices(np.load(uSetPath, allow_pickle=True))
+        valSet = as_indices(np.load(valSetPath, allow_pickle=True))
 
         #Checking no overlap
-        assert len(set(valSet) & set(uSet)) == 0,"Intersection is not allowed between validationset and uset"
-        assert len(set(valSet) & set(lSet)) == 0,"Intersection is not allowed between validationset and lSet"
-        assert len(set(uSet) & set(lSet)) == 0,"Intersection is not allowed between uSet and lSet"
+        num_points = int(max(s.max(initial=-1) for s in (lSet, uSet, valSet))) + 1
+        PoolState(num_points, lSet, uSet, valSet)
 
         return lSet, uSet, valSet
 
@@ -511,11 +631,12 @@ class Data:
         assert isinstance(trainSetPath, str), "Expected trainSetPath to be a string."
         assert isinstance(valSetPath, str), "Expected valSetPath to be a string."
 
-        trainSet = np.load(trainSetPath, allow_pickle=True)
-        valSet = np.load(valSetPath, allow_pickle=True)
+        trainSet = as_indices(np.load(trainSetPath, allow_pickle=True))
+        valSet = as_indices(np.load(valSetPath, allow_pickle=True))
 
         #Checking no overlap
-        assert len(set(valSet) & set(trainSet)) == 0,"Intersection is not allowed between validationset and trainSet"
+        num_points = int(max(trainSet.max(initial=-1), valSet.max(initial=-1))) + 1
+        PoolState(num_points, [], trainSet, valSet)
 
         return trainSet, valSet
 
@@ -524,30 +645,26 @@ class Data:
 
         assert isinstance(setPath, str), "Expected setPath to be a string."
 
-        setArray = np.load(setPath, allow_pickle=True)
+        setArray = as_indices(np.load(setPath, allow_pickle=True))
         return setArray
 
 
     def saveSets(self, lSet, uSet, activeSet, save_dir):
 
-        lSet = np.array(lSet, dtype=np.ndarray)
-        uSet = np.array(uSet, dtype=np.ndarray)
-        valSet = np.array(activeSet, dtype=np.ndarray)
-
-        np.save(f'{save_dir}/lSet.npy', lSet)
-        np.save(f'{save_dir}/uSet.npy', uSet)
-        np.save(f'{save_dir}/activeSet.npy', activeSet)
+        np.save(f'{save_dir}/lSet.npy', as_indices(lSet))
+        np.save(f'{save_dir}/uSet.npy', as_indices(uSet))
+        np.save(f'{save_dir}/activeSet.npy', as_indices(activeSet))
 
     def saveSet(self, setArray, setName, save_dir):
 
-        setArray = np.array(setArray, dtype=np.ndarray)
-        np.save(f'{save_dir}/{setName}.npy', setArray)
+        np.save(f'{save_dir}/{setName}.npy', as_indices(setArray))
         return f'{save_dir}/{setName}.npy'
 
 
     def getClassWeightsFromDataset(self, dataset, index_set, bs):
-        temp_loader = self.getIndexesDataLoader(indexes=index_set, batch_size=bs, data=dataset)
-        return self.getClassWeights(temp_loader)
+        """Class weights of dataset[index_set], read from the label array of the dataset."""
+        all_labels = ds_utils.get_targets(dataset)[np.asarray(index_set).astype(int)]
+        return self.getClassWeightsFromLabels(all_labels)
 
 
     def getClassWeights(self, dataloader):
@@ -563,10 +680,11 @@ class Data:
         all_labels = []
         for _,y in dataloader:
             all_labels.append(y)
-        print("===Computing Imbalanced Weights===")
+        return self.getClassWeightsFromLabels(np.concatenate(all_labels, axis=0))
 
 
-        all_labels = np.concatenate(all_labels, axis=0)
+    def getClassWeightsFromLabels(self, all_labels):
+        print("===Computing Imbalanced Weights===")
         print(f"all_labels.shape: {all_labels.shape}")
         classes = np.unique(all_labels)
         print(f"classes: {classes.shape}")
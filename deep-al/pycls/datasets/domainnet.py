@@ -5,6 +5,7 @@
 # LICENSE file in the root directory of this source tree.
 
 import os
+import numpy as np
 from PIL import Image
 from torch.utils.data import Dataset
 import pycls.datasets.utils as ds_utils
@@ -27,6 +28,7 @@ class DomainNet(Dataset):
                 name, label = feilds.split(' ')
                 self.input_paths.append(os.path.join(self.root, name))
                 self.labels.append(int(label))
+        self.targets = np.asarray(self.labels, dtype=np.int64)
 
         self.test_transform = test_transform
         self.only_features = only_features
@@ -42,11 +44,10 @@ class DomainNet(Dataset):
         """
         img_path, label = self.input_paths[index], self.labels[index]
 
-        sample = Image.open(img_path)
-
         if self.only_features:
             sample = self.features[index]
         else:
+            sample = Image.open(img_path)
             if self.no_aug:
                 if self.test_transform is not None:
                     sample = self.test_transform(sample)
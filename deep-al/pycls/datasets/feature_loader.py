@@ -0,0 +1,49 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Batches of precomputed features for models that never look at images (LINEAR_FROM_FEATURES)."""
+
+import numpy as np
+import torch
+
+import pycls.datasets.utils as ds_utils
+
+
+def feature_tensors(data):
+    """(features, targets) of a dataset as CPU tensors, built once and cached on the dataset."""
+    if getattr(data, 'feature_tensors', None) is None:
+        features = torch.from_numpy(np.ascontiguousarray(data.features, dtype=np.float32))
+        targets = torch.from_numpy(ds_utils.get_targets(data))
+        data.feature_tensors = (features, targets)
+    return data.feature_tensors
+
+
+class FeatureBatchLoader:
+    """
+    Drop-in replacement of the index-based DataLoaders of Data for feature-only datasets:
+    every batch is one index_select on an in-memory feature tensor, with no worker
+    processes and no image decoding. shuffle=True draws a new permutation of indexes
+    every epoch, like SubsetRandomSampler.
+    """
+
+    def __init__(self, data, indexes, batch_size, shuffle=False, drop_last=False):
+        self.dataset = data
+        self.indexes = torch.as_tensor(np.asarray(indexes).astype(np.int64))
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.features, self.targets = feature_tensors(data)
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indexes) // self.batch_size
+        return (len(self.indexes) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        indexes = self.indexes[torch.randperm(len(self.indexes))] if self.shuffle else self.indexes
+        for i in range(len(self)):
+            batch = indexes[i * self.batch_size: (i + 1) * self.batch_size]
+            yield self.features.index_select(0, batch), self.targets.index_select(0, batch)
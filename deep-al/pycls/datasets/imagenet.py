@@ -7,10 +7,10 @@
 import os.path as osp
 import pickle
 from PIL import Image
-import lmdb
 import six
 import torch.utils.data as data
 import pycls.datasets.utils as ds_utils
+from pycls.datasets.lmdb_utils import LazyLMDB, record_keys
 
 
 def loads_data(buf):
@@ -25,12 +25,12 @@ class ImageNet(data.Dataset):
     def __init__(self, data_dir, split, transform=None, test_transform=None, num_classes=1000, only_features=False):
         dataset_name = data_dir.split('/')[-1]
         self.db_path = osp.join(data_dir, 'imagenet_train.lmdb' if split == 'train' else 'imagenet_val.lmdb')
-        self.env = lmdb.open(self.db_path, subdir=osp.isdir(self.db_path),
-                             readonly=True, lock=False,
-                             readahead=False, meminit=False)
-        with self.env.begin(write=False) as txn:
+        # opened lazily in every DataLoader worker
+        self.db = LazyLMDB(self.db_path)
+        with self.db.begin() as txn:
             self.length = loads_data(txn.get(b'__len__'))
-            self.keys = loads_data(txn.get(b'__keys__'))
+        self.keys = record_keys(self.db)
+        self.db.close()
 
         self.transform = transform
         self.test_transform = test_transform
@@ -39,14 +39,22 @@ class ImageNet(data.Dataset):
         self.features = ds_utils.load_features(
             dataset_name.upper(), train=True if split=='train' else False, normalized=False)
         self.no_aug = False
+        self._targets = None
 
+    @property
+    def targets(self):
+        """Labels of all images, read once from the LMDB into a persisted sidecar."""
+        if self._targets is None:
+            with self.db.begin() as txn:
+                self._targets = ds_utils.lmdb_targets(
+                    self.db_path, self.length, lambda i: loads_data(txn.get(self.key(i)))[1])
+        return self._targets
 
-    def __getitem__(self, index):
-        env = self.env
-        with env.begin(write=False) as txn:
-            byteflow = txn.get(self.keys[index])
+    def key(self, index):
+        return str(index).encode('ascii') if self.keys is None else self.keys[index]
 
-        unpacked = loads_data(byteflow)
+    def load(self, txn, index):
+        unpacked = loads_data(txn.get(self.key(index)))
 
         # load img
         imgbuf = unpacked[0]
@@ -55,20 +63,30 @@ class ImageNet(data.Dataset):
         buf.seek(0)
         img = Image.open(buf).convert('RGB')
 
+        if self.no_aug:
+            if self.test_transform is not None:
+                img = self.test_transform(img)
+        else:
+            if self.transform is not None:
+                img = self.transform(img)
+
         # load label
-        target = unpacked[1]
+        return img, unpacked[1]
 
+    def __getitem__(self, index):
         if self.only_features:
-            img = self.features[index]
-        else:
-            if self.no_aug:
-                if self.test_transform is not None:
-                    img = self.test_transform(img)
-            else:
-                if self.transform is not None:
-                    img = self.transform(img)
-
-        return img, target
+            return self.features[index], self.targets[index]
+
+        with self.db.begin() as txn:
+            return self.load(txn, index)
+
+    def __getitems__(self, indices):
+        """Batched fetch used by DataLoader: one read transaction for the whole batch."""
+        if self.only_features:
+            return [(self.features[i], self.targets[i]) for i in indices]
+
+        with self.db.begin() as txn:
+            return [self.load(txn, i) for i in indices]
 
     def __len__(self):
         return self.length
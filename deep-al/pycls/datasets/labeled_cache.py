@@ -0,0 +1,171 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Decoded labeled-set cache with batched augmentation, for training on small labeled sets."""
+
+import copy
+import math
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+
+from pycls.datasets.shards import ShardEncoder
+
+
+def stack_records(batch):
+    images = torch.from_numpy(np.stack([image for image, _ in batch])).permute(0, 3, 1, 2)
+    return images.contiguous(), torch.as_tensor([int(label) for _, label in batch], dtype=torch.long)
+
+
+class BatchAugment:
+    """
+    Training augmentation of a uint8 N x 3 x H x W batch as tensor ops: a random resized crop
+    (scale and log-uniform ratio, as transforms.RandomResizedCrop) or, when scale is None, a
+    crop of the input size from the image zero-padded by padding pixels (transforms.RandomCrop),
+    then a random horizontal flip and normalization. Crop and flip of the whole batch are one
+    affine_grid / grid_sample call on the device of the batch.
+    """
+
+    def __init__(self, out_size, mean, std, scale=None, ratio=(3. / 4., 4. / 3.), padding=0, hflip=True):
+        self.out_size = out_size
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1)
+        self.std = torch.tensor(std).view(1, 3, 1, 1)
+        self.scale = scale
+        self.log_ratio = (math.log(ratio[0]), math.log(ratio[1]))
+        self.padding = padding
+        self.hflip = hflip
+
+    def __call__(self, images):
+        n, _, height, width = images.shape
+        device = images.device
+        x = images.float().div_(255.)
+
+        theta = torch.zeros(n, 2, 3, device=device)
+        if self.scale is not None:
+            area = torch.empty(n, device=device).uniform_(*self.scale)
+            aspect = torch.empty(n, device=device).uniform_(*self.log_ratio).exp_()
+            scale_x = (area * aspect).sqrt_().clamp_(max=1.)
+            scale_y = (area / aspect).sqrt_().clamp_(max=1.)
+            shift_x = (1. - scale_x) * torch.empty(n, device=device).uniform_(-1., 1.)
+            shift_y = (1. - scale_y) * torch.empty(n, device=device).uniform_(-1., 1.)
+        else:
+            # whole-pixel shifts, so an unflipped crop copies pixels exactly
+            scale_x = torch.full((n,), self.out_size / width, device=device)
+            scale_y = torch.full((n,), self.out_size / height, device=device)
+            shift_x = torch.randint(-self.padding, self.padding + 1, (n,), device=device) * (2. / width)
+            shift_y = torch.randint(-self.padding, self.padding + 1, (n,), device=device) * (2. / height)
+        if self.hflip:
+            scale_x = scale_x * (torch.randint(0, 2, (n,), device=device) * 2 - 1)
+        theta[:, 0, 0] = scale_x
+        theta[:, 0, 2] = shift_x
+        theta[:, 1, 1] = scale_y
+        theta[:, 1, 2] = shift_y
+
+        grid = F.affine_grid(theta, (n, 3, self.out_size, self.out_size), align_corners=False)
+        x = F.grid_sample(x, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+        return (x - self.mean.to(device)) / self.std.to(device)
+
+    def __repr__(self):
+        return '{}(out_size={}, scale={}, padding={}, hflip={})'.format(
+            self.__class__.__name__, self.out_size, self.scale, self.padding, self.hflip)
+
+
+class LabeledSetCache:
+    """
+    Labeled images of one dataset, decoded and resized once to size x size and kept as a uint8
+    N x 3 x size x size tensor in shared memory. update(indexes) decodes only the indexes not
+    cached yet, so the cache grows with the labeled set across episodes; loader() serves
+    batches from it, augmented by BatchAugment, with no worker processes and no decoding per
+    epoch.
+    """
+
+    def __init__(self, dataset, size, augment, resize='crop', num_workers=0, decode_batch_size=256):
+        self.dataset = dataset
+        self.size = size
+        self.augment = augment
+        self.num_workers = num_workers
+        self.decode_batch_size = decode_batch_size
+
+        # copy of the dataset whose items are resized uint8 pixels
+        self.decoder = copy.copy(dataset)
+        self.decoder.transform = ShardEncoder(size, fmt='raw', resize=resize)
+        self.decoder.test_transform = self.decoder.transform
+        self.decoder.no_aug = True
+        self.decoder.only_features = False
+
+        self.slots = np.full(len(dataset), -1, dtype=np.int64)
+        self.count = 0
+        self.images = torch.empty((0, 3, size, size), dtype=torch.uint8).share_memory_()
+        self.labels = torch.empty(0, dtype=torch.long)
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, capacity):
+        """Grows the storage to hold capacity images, at least doubling it to amortize copies."""
+        if capacity <= len(self.images):
+            return
+        capacity = max(capacity, 2 * len(self.images))
+        images = torch.empty((capacity, 3, self.size, self.size), dtype=torch.uint8).share_memory_()
+        labels = torch.empty(capacity, dtype=torch.long)
+        images[:self.count] = self.images[:self.count]
+        labels[:self.count] = self.labels[:self.count]
+        self.images, self.labels = images, labels
+
+    def update(self, indexes):
+        indexes = np.asarray(indexes, dtype=np.int64)
+        new = np.unique(indexes[self.slots[indexes] < 0])
+        if len(new) == 0:
+            return
+        self.reserve(self.count + len(new))
+
+        batches = [new[i: i + self.decode_batch_size].tolist() for i in range(0, len(new), self.decode_batch_size)]
+        loader = DataLoader(self.decoder, batch_sampler=batches, num_workers=min(self.num_workers, len(batches)),
+                            collate_fn=stack_records)
+        position = self.count
+        for images, labels in loader:
+            self.images[position: position + len(labels)] = images
+            self.labels[position: position + len(labels)] = labels
+            position += len(labels)
+        self.slots[new] = np.arange(self.count, position)
+        self.count = position
+
+    def loader(self, indexes, batch_size, shuffle=True, drop_last=True):
+        self.update(indexes)
+        return CachedBatchLoader(self, self.slots[np.asarray(indexes, dtype=np.int64)], batch_size,
+                                 shuffle=shuffle, drop_last=drop_last)
+
+
+class CachedBatchLoader:
+    """
+    Drop-in replacement of the training DataLoader of the labeled set: every batch is an
+    index_select on the cache, moved to the GPU (when available) and augmented there.
+    shuffle=True draws a new permutation every epoch, like SubsetRandomSampler.
+    """
+
+    def __init__(self, cache, slots, batch_size, shuffle=True, drop_last=True):
+        self.cache = cache
+        self.dataset = cache.dataset
+        self.slots = torch.from_numpy(slots)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.slots) // self.batch_size
+        return (len(self.slots) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        slots = self.slots[torch.randperm(len(self.slots))] if self.shuffle else self.slots
+        for i in range(len(self)):
+            batch = slots[i * self.batch_size: (i + 1) * self.batch_size]
+            images = self.cache.images.index_select(0, batch).to(self.device, non_blocking=True)
+            labels = self.cache.labels.index_select(0, batch).to(self.device, non_blocking=True)
+            yield self.cache.augment(images), labels
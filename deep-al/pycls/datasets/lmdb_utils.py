@@ -0,0 +1,76 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Fork-safe, read-only LMDB access shared by the LMDB-backed datasets."""
+
+import os
+import os.path as osp
+import pickle
+
+import lmdb
+import numpy as np
+
+from pycls.datasets.utils.feature_store import file_lock, is_fresh, sidecar_path, write_npy_atomic
+
+
+class LazyLMDB:
+    """
+    Read-only LMDB environment that is opened on first use in every process, so DataLoader
+    workers never share an environment opened before the fork. Pickling drops the handle.
+
+    readahead is off by default: training reads records in random order, where OS readahead
+    only pollutes the page cache; sequential scans (e.g. building a sidecar) may turn it on.
+    """
+
+    def __init__(self, path, readahead=False):
+        self.path = path
+        self.readahead = readahead
+        self._env = None
+        self._pid = None
+
+    def env(self):
+        if self._env is None or self._pid != os.getpid():
+            self._env = lmdb.open(self.path, subdir=osp.isdir(self.path), readonly=True, lock=False,
+                                  readahead=self.readahead, meminit=False)
+            self._pid = os.getpid()
+        return self._env
+
+    def begin(self):
+        return self.env().begin(write=False)
+
+    def close(self):
+        if self._env is not None and self._pid == os.getpid():
+            self._env.close()
+        self._env = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_env'] = None
+        state['_pid'] = None
+        return state
+
+
+def record_keys(db, keys_name=b'__keys__'):
+    """
+    Keys of the records of db. Returns None when record i is stored under str(i), so keys are
+    computed from the index; otherwise a fixed-width bytes array persisted as a sidecar, which
+    avoids unpickling a list of Python byte strings in every process.
+    """
+    keys_path = sidecar_path(db.path, 'keys')
+    if not is_fresh(keys_path, db.path):
+        with db.begin() as txn:
+            keys = pickle.loads(txn.get(keys_name))
+        keys = np.array(keys, dtype=bytes)
+        is_integer = all(key == str(i).encode('ascii') for i, key in enumerate(keys))
+        with file_lock(keys_path):
+            if not is_fresh(keys_path, db.path):
+                stored = np.empty(0, dtype=keys.dtype) if is_integer else keys
+
+                def fill(out):
+                    out[:] = stored
+                write_npy_atomic(keys_path, stored.shape, stored.dtype, fill)
+    keys = np.load(keys_path)
+    return None if len(keys) == 0 else keys
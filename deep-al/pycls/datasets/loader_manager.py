@@ -0,0 +1,166 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Persistent DataLoader worker pools shared by every loader of a dataset."""
+
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+
+class BatchRequest(tuple):
+    """(no_aug, indices) of one batch, sent to the workers as a single sampler item."""
+
+
+class IndexBatchSampler:
+    """
+    Batch sampler whose index set is swapped per request. Batches carry the no_aug flag the
+    dataset had when the request started iterating, because persistent workers hold their own
+    copy of the dataset and would not see later changes to it.
+    """
+
+    def __init__(self):
+        self.set(torch.empty(0, dtype=torch.long), 1)
+
+    def set(self, indexes, batch_size, shuffle=False, drop_last=False, no_aug=False):
+        self.indexes = indexes
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.no_aug = no_aug
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indexes) // self.batch_size
+        return (len(self.indexes) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        indexes = self.indexes[torch.randperm(len(self.indexes))] if self.shuffle else self.indexes
+        for i in range(len(self)):
+            yield BatchRequest((self.no_aug, indexes[i * self.batch_size: (i + 1) * self.batch_size].tolist()))
+
+
+class WorkerDataset:
+    """Worker-side view of a dataset that applies the no_aug flag of every BatchRequest."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitems__(self, request):
+        no_aug, indices = request
+        self.dataset.no_aug = no_aug
+        if hasattr(self.dataset, '__getitems__'):
+            return self.dataset.__getitems__(indices)
+        return [self.dataset[i] for i in indices]
+
+
+class WorkerPool:
+    """One persistent DataLoader; serves one request at a time."""
+
+    def __init__(self, dataset, num_workers, pin_memory):
+        self.batch_sampler = IndexBatchSampler()
+        self.loader = DataLoader(WorkerDataset(dataset), batch_sampler=self.batch_sampler,
+                                 num_workers=num_workers, pin_memory=pin_memory,
+                                 persistent_workers=num_workers > 0)
+        self.busy = False
+        self.transient = False
+
+    def shutdown(self):
+        iterator = getattr(self.loader, '_iterator', None)
+        if iterator is not None and hasattr(iterator, '_shutdown_workers'):
+            iterator._shutdown_workers()
+        self.loader._iterator = None
+
+
+class ManagedLoader:
+    """
+    What Data.get*Loader returns when DATA_LOADER.PERSISTENT is on: a description of the
+    batches (indexes, batch size, order) that borrows a free WorkerPool of its dataset for
+    the duration of each pass.
+    """
+
+    def __init__(self, manager, dataset, indexes, batch_size, shuffle=False, drop_last=False):
+        self.manager = manager
+        self.dataset = dataset
+        self.indexes = torch.from_numpy(np.asarray(indexes).astype(np.int64))
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indexes) // self.batch_size
+        return (len(self.indexes) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        pool = self.manager.acquire(self.dataset)
+        try:
+            pool.batch_sampler.set(self.indexes, self.batch_size, self.shuffle, self.drop_last,
+                                   no_aug=getattr(self.dataset, 'no_aug', False))
+            yield from pool.loader
+        finally:
+            self.manager.release(pool)
+
+
+class LoaderManager:
+    """
+    Owns the DataLoader workers of a run. Every dataset object gets persistent worker pools,
+    created on first use and reused by all later loaders of that dataset (lSet, val, test,
+    sampler scoring passes, across episodes), so workers are started once per dataset instead
+    of once per loader.
+
+    Worker-count policy: each pool runs num_workers workers (DATA_LOADER.NUM_WORKERS, capped
+    by the CPU count) and a dataset keeps at most max_pools pools, one per loader iterated
+    at the same time (e.g. VAAL's interleaved lSet/uSet loaders); a request beyond that gets a
+    transient pool that is stopped when its pass ends. Pools of datasets that are no longer
+    used are stopped with release_dataset(), all pools with shutdown().
+    """
+
+    def __init__(self, num_workers, pin_memory=True, max_pools=2):
+        self.num_workers = max(0, min(num_workers, os.cpu_count() or 1))
+        self.pin_memory = pin_memory
+        self.max_pools = max_pools
+        self.pools = {}
+
+    def loader(self, dataset, indexes, batch_size, shuffle=False, drop_last=False):
+        return ManagedLoader(self, dataset, indexes, batch_size, shuffle=shuffle, drop_last=drop_last)
+
+    def acquire(self, dataset):
+        pools = self.pools.setdefault(id(dataset), (dataset, []))[1]
+        for pool in pools:
+            if not pool.busy:
+                break
+        else:
+            pool = WorkerPool(dataset, self.num_workers, self.pin_memory)
+            if len(pools) < self.max_pools:
+                pools.append(pool)
+            else:
+                pool.transient = True
+        pool.busy = True
+        return pool
+
+    def release(self, pool):
+        pool.busy = False
+        if pool.transient:
+            pool.shutdown()
+
+    def release_dataset(self, dataset):
+        """Stops the worker pools of dataset."""
+        _, pools = self.pools.pop(id(dataset), (None, []))
+        for pool in pools:
+            pool.shutdown()
+
+    def shutdown(self):
+        for dataset, _ in list(self.pools.values()):
+            self.release_dataset(dataset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,87 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Labeled / unlabeled / validation partition of a training set."""
+
+import numpy as np
+
+INDEX_DTYPE = np.int32
+
+
+def as_indices(indices):
+    """Index array as int32, also for object-dtype partitions saved by older runs."""
+    return np.asarray(indices).astype(INDEX_DTYPE).reshape(-1)
+
+
+def remaining(total, selected):
+    """
+    Sorted indices of total that are not in selected, i.e.
+    np.array(sorted(set(total) - set(selected))) with one boolean mask instead of Python sets.
+    """
+    total = np.asarray(total)
+    selected = np.asarray(selected).astype(np.int64).reshape(-1)
+    if len(total) == 0:
+        return total
+    size = int(max(total.max(), selected.max() if len(selected) else 0)) + 1
+    mask = np.zeros(size, dtype=bool)
+    mask[selected] = True
+    return np.unique(total[~mask[total.astype(np.int64)]])
+
+
+class PoolState:
+    """
+    lSet, uSet and valSet as int32 index arrays (in their original order) plus a uint8
+    membership map over the whole training set, so that moves, overlap checks and
+    complements are single vectorized passes.
+    """
+    NONE, LABELED, UNLABELED, VAL = 0, 1, 2, 3
+
+    def __init__(self, num_points, lSet, uSet, valSet):
+        self.num_points = int(num_points)
+        self.lSet = as_indices(lSet)
+        self.uSet = as_indices(uSet)
+        self.valSet = as_indices(valSet)
+        self.membership = np.zeros(self.num_points, dtype=np.uint8)
+        self.check_disjoint()
+        self.membership[self.lSet] = self.LABELED
+        self.membership[self.uSet] = self.UNLABELED
+        self.membership[self.valSet] = self.VAL
+
+    def check_disjoint(self):
+        counts = np.bincount(np.concatenate([self.lSet, self.uSet, self.valSet]), minlength=self.num_points)
+        assert counts.max(initial=0) <= 1, \
+            f'Intersection is not allowed between lSet, uSet and valSet ({int((counts > 1).sum())} shared indices)'
+
+    def label(self, activeSet, new_uSet=None):
+        """
+        Moves activeSet from uSet to the end of lSet. new_uSet, the remaining set returned by a
+        sampler, is checked against the expected complement and its order is kept.
+        """
+        activeSet = as_indices(activeSet)
+        assert (self.membership[activeSet] == self.UNLABELED).all(), 'activeSet must be a subset of uSet'
+        assert len(np.unique(activeSet)) == len(activeSet), 'activeSet contains duplicates'
+        self.membership[activeSet] = self.LABELED
+        self.lSet = np.concatenate([self.lSet, activeSet])
+        if new_uSet is None:
+            self.uSet = self.uSet[self.membership[self.uSet] == self.UNLABELED]
+        else:
+            new_uSet = as_indices(new_uSet)
+            assert len(new_uSet) == len(self.uSet) - len(activeSet) \
+                and (self.membership[new_uSet] == self.UNLABELED).all(), 'new_uSet must be uSet without activeSet'
+            self.uSet = new_uSet
+        return self
+
+    def mask(self, part):
+        """Boolean membership mask of LABELED, UNLABELED or VAL over the training set."""
+        return self.membership == part
+
+    def save(self, path):
+        np.savez_compressed(path, num_points=self.num_points, lSet=self.lSet, uSet=self.uSet, valSet=self.valSet)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as state:
+            return cls(int(state['num_points']), state['lSet'], state['uSet'], state['valSet'])
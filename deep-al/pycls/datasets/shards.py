@@ -0,0 +1,172 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Fixed-resolution, memory-mappable image shards written by tools/convert_shards.py.
+
+Layout of one split (<SHARD_DIR>/<train|test>/):
+    meta.json               format, size, num_samples, shard_size, dataset; written last
+    labels.npy              int64 labels of all samples
+    images_%05d.npy         'raw' format: (n, size, size, 3) uint8 pixels of shard k
+    jpeg_%05d.npy           'jpeg' format: concatenated JPEG bytes of shard k (uint8)
+    offsets_%05d.npy        'jpeg' format: (n + 1) int64 byte offsets into jpeg_%05d.npy
+
+Sample i is sample i of the native dataset, so saved index sets (lSet/uSet/valSet) and
+precomputed feature files stay valid when switching DATASET.BACKEND.
+"""
+
+import io
+import json
+import os
+import os.path as osp
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+import pycls.datasets.utils as ds_utils
+
+FORMATS = ['raw', 'jpeg']
+RESIZE_MODES = ['crop', 'stretch']
+
+
+def shard_file(split_dir, prefix, shard):
+    return osp.join(split_dir, f'{prefix}_{shard:05d}.npy')
+
+
+def load_image(record, fmt):
+    """PIL image of one stored record: a (size, size, 3) pixel array or JPEG bytes."""
+    if fmt == 'raw':
+        return Image.fromarray(np.asarray(record))
+    return Image.open(io.BytesIO(record.tobytes())).convert('RGB')
+
+
+class ShardEncoder:
+    """
+    Transform used by the converter: resizes a decoded PIL image to size x size and returns
+    its pixels (uint8 array) or, in 'jpeg' format, its JPEG bytes. 'crop' resizes the shorter
+    side and center-crops, 'stretch' resizes both sides (changes the aspect ratio).
+    """
+
+    def __init__(self, size, fmt='raw', quality=90, resize='crop'):
+        assert fmt in FORMATS, f'Unknown shard format {fmt}; expected one of {FORMATS}'
+        assert resize in RESIZE_MODES, f'Unknown resize mode {resize}; expected one of {RESIZE_MODES}'
+        self.size = size
+        self.fmt = fmt
+        self.quality = quality
+        self.resize = resize
+
+    def __call__(self, img):
+        img = img.convert('RGB')
+        if self.resize == 'stretch':
+            img = img.resize((self.size, self.size), Image.BILINEAR)
+        else:
+            width, height = img.size
+            scale = self.size / min(width, height)
+            width, height = max(self.size, round(width * scale)), max(self.size, round(height * scale))
+            img = img.resize((width, height), Image.BILINEAR)
+            left, top = (width - self.size) // 2, (height - self.size) // 2
+            img = img.crop((left, top, left + self.size, top + self.size))
+
+        if self.fmt == 'raw':
+            return np.asarray(img, dtype=np.uint8)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=self.quality)
+        return np.frombuffer(buf.getvalue(), dtype=np.uint8)
+
+    def __repr__(self):
+        return '{}(size={}, fmt={}, quality={}, resize={})'.format(
+            self.__class__.__name__, self.size, self.fmt, self.quality, self.resize)
+
+
+class ShardDataset(Dataset):
+    """
+    Dataset over the shards of one split. Shards are memory-mapped read-only on first use in
+    every process; pickling (e.g. for spawned DataLoader workers) drops the mappings instead
+    of copying the pixels.
+    """
+
+    def __init__(self, root, split='train', transform=None, test_transform=None, only_features=False):
+        self.root = root
+        self.split = split
+        self.split_dir = osp.join(root, split)
+        meta_path = osp.join(self.split_dir, 'meta.json')
+        if not osp.exists(meta_path):
+            raise FileNotFoundError(f'No shards at {self.split_dir}; write them with tools/convert_shards.py')
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.fmt = self.meta['format']
+        self.size = self.meta['size']
+        self.length = self.meta['num_samples']
+        self.shard_size = self.meta['shard_size']
+        self.dataset_name = self.meta['dataset']
+
+        self.targets = np.load(osp.join(self.split_dir, 'labels.npy'))
+        assert len(self.targets) == self.length, f'{self.split_dir}: {len(self.targets)} labels for {self.length} samples'
+
+        self.transform = transform
+        self.test_transform = test_transform
+        self.no_aug = False
+        self.only_features = only_features
+        self.features = ds_utils.load_features(self.dataset_name, train=split == 'train', normalized=False)
+        self._shards = {}
+
+    def shard(self, k):
+        if k not in self._shards:
+            if self.fmt == 'raw':
+                self._shards[k] = np.load(shard_file(self.split_dir, 'images', k), mmap_mode='r')
+            else:
+                self._shards[k] = (np.load(shard_file(self.split_dir, 'jpeg', k), mmap_mode='r'),
+                                   np.load(shard_file(self.split_dir, 'offsets', k)))
+        return self._shards[k]
+
+    def record(self, index):
+        k, i = divmod(int(index), self.shard_size)
+        if self.fmt == 'raw':
+            return self.shard(k)[i]
+        data, offsets = self.shard(k)
+        return data[offsets[i]:offsets[i + 1]]
+
+    def load(self, index):
+        img = load_image(self.record(index), self.fmt)
+
+        if self.no_aug:
+            if self.test_transform is not None:
+                img = self.test_transform(img)
+        else:
+            if self.transform is not None:
+                img = self.transform(img)
+
+        return img, self.targets[index]
+
+    def __getitem__(self, index):
+        if self.only_features:
+            return self.features[index], self.targets[index]
+        return self.load(index)
+
+    def __getitems__(self, indices):
+        if self.only_features:
+            return [(self.features[i], self.targets[i]) for i in indices]
+        return [self.load(i) for i in indices]
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def __repr__(self):
+        return '{} ({}, {} {}x{})'.format(self.__class__.__name__, self.split_dir, self.fmt, self.size, self.size)
+
+
+def write_meta(split_dir, meta):
+    """Publishes meta.json atomically; readers treat a split without it as not converted."""
+    tmp_path = osp.join(split_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, osp.join(split_dir, 'meta.json'))
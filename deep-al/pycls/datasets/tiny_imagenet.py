@@ -7,13 +7,13 @@
 import os
 import shutil
 import pickle
-import lmdb
 
 import numpy as np
 from PIL import Image
 
 import pycls.datasets.utils as ds_utils
 from torch.utils.data import Dataset
+from pycls.datasets.lmdb_utils import LazyLMDB
 
 
 def normalize_tin_val_folder_structure(path,
@@ -66,9 +66,9 @@ class TinyImageNet(Dataset):
         self.no_aug = False
         self.lmdb_path = os.path.join(root, f'{split}.lmdb')
         self.split = split
-        self.env = lmdb.open(self.lmdb_path, subdir=os.path.isdir(self.lmdb_path),
-                             readonly=True, lock=False, readahead=False, meminit=False)
-        with self.env.begin(write=False) as txn:
+        # opened lazily in every DataLoader worker
+        self.db = LazyLMDB(self.lmdb_path)
+        with self.db.begin() as txn:
             # Count the number of images in the dataset
             self.length = txn.stat()['entries'] // 2
 
@@ -77,6 +77,20 @@ class TinyImageNet(Dataset):
 
         self.only_features = only_features
         self.features = ds_utils.load_features("TINYIMAGENET", train=split == 'train', normalized=False)
+        self._targets = None
+        # labels come from the sidecar, so items only read their image record
+        self.targets
+        self.db.close()
+
+    @property
+    def targets(self):
+        """Labels of all images, read once from the label keys of the LMDB into a persisted sidecar."""
+        if self._targets is None:
+            with self.db.begin() as txn:
+                self._targets = ds_utils.lmdb_targets(
+                    self.lmdb_path, self.length,
+                    lambda i: pickle.loads(txn.get(f'{self.split}_label_{i:08d}'.encode('ascii'))).reshape(-1)[0])
+        return self._targets
 
     def __len__(self):
         return self.length
@@ -88,26 +102,29 @@ class TinyImageNet(Dataset):
         Returns:
             tuple: (sample, target) where target is class_index of the target class.
         """
-        with self.env.begin(write=False) as txn:
-            image_key = f'{self.split}_image_{index:08d}'.encode('ascii')
-            label_key = f'{self.split}_label_{index:08d}'.encode('ascii')
+        if self.only_features:
+            return self.features[index], self.targets[index]
 
-            image_bytes = txn.get(image_key)
-            label_bytes = txn.get(label_key)
+        with self.db.begin() as txn:
+            return self.load(txn, index)
 
-            sample = pickle.loads(image_bytes)
-            target = pickle.loads(label_bytes).squeeze(0)
+    def __getitems__(self, indices):
+        """Batched fetch used by DataLoader: one read transaction for the whole batch."""
+        if self.only_features:
+            return [(self.features[i], self.targets[i]) for i in indices]
 
-            sample = Image.fromarray(sample.astype(np.uint8))
+        with self.db.begin() as txn:
+            return [self.load(txn, i) for i in indices]
 
-        if self.only_features:
-            sample = self.features[index]
+    def load(self, txn, index):
+        image_key = f'{self.split}_image_{index:08d}'.encode('ascii')
+        sample = Image.fromarray(pickle.loads(txn.get(image_key)).astype(np.uint8))
+
+        if self.no_aug:
+            if self.test_transform is not None:
+                sample = self.test_transform(sample)
         else:
-            if self.no_aug:
-                if self.test_transform is not None:
-                    sample = self.test_transform(sample)
-            else:
-                if self.transform is not None:
-                    sample = self.transform(sample)
-
-        return sample, target
+            if self.transform is not None:
+                sample = self.transform(sample)
+
+        return sample, self.targets[index]
@@ -7,3 +7,6 @@
 ####################################################################################
 
 from .features import load_features, load_targets
+from .feature_store import FeatureStore, get_feature_store
+from .quantized import PRECISIONS, QuantizedFeatures
+from .targets import get_targets, lmdb_targets
@@ -0,0 +1,232 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Process-wide, memory-mapped store of precomputed feature files."""
+
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+from .quantized import PRECISIONS, QuantizedFeatures, feature_hash, quantize_rows
+
+_FALLBACK_SIDECAR_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycls', 'features')
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock shared by all processes on the host."""
+    with open(path + '.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def sidecar_path(path, suffix):
+    """
+    Derived file stored next to path, or in a per-user cache directory if the directory of
+    path is not writable.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    if not os.access(directory, os.W_OK):
+        digest = hashlib.sha1(directory.encode()).hexdigest()[:16]
+        directory = os.path.join(_FALLBACK_SIDECAR_DIR, digest)
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{os.path.splitext(name)[0]}.{suffix}.npy')
+
+
+def is_fresh(path, source):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def write_npy_atomic(path, shape, dtype, fill):
+    """
+    Creates a .npy file of the given shape through a temporary memmap filled by fill(out),
+    then moves it into place, so concurrent readers never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+    os.close(fd)
+    try:
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+        fill(out)
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class FeatureStore:
+    """
+    Opens every feature file once per process with np.load(mmap_mode='c') and hands out the
+    same memory-mapped array to every caller. The pages live in the OS page cache and are
+    shared by all processes and DataLoader workers on the host; writes to a view stay private
+    to the process (copy-on-write).
+
+    Derived float32 files are persisted next to the raw file, built once under a file lock and
+    published with os.replace:
+        <name>.raw_f32.npy      raw features of .pth files, which cannot be memory-mapped
+        <name>.normalized.npy   l2-normalized rows
+        <name>.norms.npy        row norms
+        <name>.normalized_fp16.npy, <name>.normalized_int8[_scale].npy
+                                quantized normalized rows, see QuantizedFeatures
+
+    precision ('fp32', 'fp16' or 'int8') is the default precision of normalized features.
+
+    Content hashes of the arrays handed out (cache keys of k-means and radius graphs) are
+    computed once per (file, variant, mtime) and reused by every later episode.
+    """
+
+    def __init__(self, chunk_size=65536, precision='fp32'):
+        self.chunk_size = chunk_size
+        self.precision = precision
+        self.arrays = {}
+        self.paths = {}
+        self.keys = {}
+        self.hashes = {}
+
+    def register(self, key, array):
+        self.arrays[key] = array
+        self.paths[id(array)] = key[0]
+        self.keys[id(array)] = key
+
+    def open(self, key, path):
+        if key not in self.arrays:
+            self.register(key, np.load(path, mmap_mode='c'))
+        return self.arrays[key]
+
+    def build(self, path, source, shape, dtype, fill):
+        if is_fresh(path, source):
+            return
+        with file_lock(path):
+            if not is_fresh(path, source):
+                write_npy_atomic(path, shape, dtype, fill)
+
+    def raw(self, path):
+        """Raw features of path as a float32-or-native memory-mapped array."""
+        if path.endswith('.npy'):
+            return self.open((path, 'raw'), path)
+        elif path.endswith('.pth'):
+            raw_path = sidecar_path(path, 'raw_f32')
+            if not is_fresh(raw_path, path):
+                features = torch.load(path, map_location='cpu')
+                features = features.detach().float().numpy()
+
+                def fill(out):
+                    out[:] = features
+                self.build(raw_path, path, features.shape, np.float32, fill)
+            return self.open((path, 'raw'), raw_path)
+        else:
+            raise NotImplementedError(f'Unsupported feature file type: {path}')
+
+    def normalized(self, path):
+        """l2-normalized float32 features of path; the row norms sidecar is written in the same pass."""
+        normalized_path = sidecar_path(path, 'normalized')
+        if not is_fresh(normalized_path, path):
+            raw = self.raw(path)
+            norms = np.empty(raw.shape[0], dtype=np.float32)
+            built = []
+
+            def fill(out):
+                for i in range(0, raw.shape[0], self.chunk_size):
+                    chunk = np.asarray(raw[i:i + self.chunk_size], dtype=np.float32)
+                    norms[i:i + self.chunk_size] = np.linalg.norm(chunk, axis=1)
+                    out[i:i + self.chunk_size] = chunk / norms[i:i + self.chunk_size, None]
+                built.append(True)
+            self.build(normalized_path, path, raw.shape, np.float32, fill)
+
+            # only the process that built the normalized rows has the norms at hand
+            if built:
+                def fill_norms(out):
+                    out[:] = norms
+                self.build(sidecar_path(path, 'norms'), path, norms.shape, np.float32, fill_norms)
+        return self.open((path, 'normalized'), normalized_path)
+
+    def norms(self, path):
+        """Row norms of the raw features of path."""
+        norms_path = sidecar_path(path, 'norms')
+        if not is_fresh(norms_path, path):
+            raw = self.raw(path)
+
+            def fill(out):
+                for i in range(0, raw.shape[0], self.chunk_size):
+                    out[i:i + self.chunk_size] = np.linalg.norm(np.asarray(raw[i:i + self.chunk_size], dtype=np.float32), axis=1)
+            self.build(norms_path, path, (raw.shape[0],), np.float32, fill)
+        return self.open((path, 'norms'), norms_path)
+
+    def quantized(self, path, precision):
+        """Normalized features of path as fp16 or per-row scaled int8 QuantizedFeatures."""
+        key = (path, f'normalized_{precision}')
+        if key in self.arrays:
+            return self.arrays[key]
+        normalized = self.normalized(path)
+        data_path = sidecar_path(path, f'normalized_{precision}')
+        scale_path = sidecar_path(path, f'normalized_{precision}_scale') if precision == 'int8' else None
+
+        def chunks():
+            for i in range(0, normalized.shape[0], self.chunk_size):
+                yield i, quantize_rows(normalized[i:i + self.chunk_size], precision)
+
+        # rows are quantized independently, so data and scale can be built chunk by chunk
+        if scale_path is not None:
+            def fill_scale(out):
+                for i, (_, scale) in chunks():
+                    out[i:i + self.chunk_size] = scale
+            self.build(scale_path, path, (normalized.shape[0],), np.float32, fill_scale)
+
+        def fill_data(out):
+            for i, (data, _) in chunks():
+                out[i:i + self.chunk_size] = data
+        dtype = np.float16 if precision == 'fp16' else np.int8
+        self.build(data_path, path, normalized.shape, dtype, fill_data)
+
+        data = np.load(data_path, mmap_mode='c')
+        scale = None if scale_path is None else np.load(scale_path, mmap_mode='c')
+        features = QuantizedFeatures(data, scale)
+        self.register(key, features)
+        return features
+
+    def get(self, path, normalized=True, precision=None):
+        """Raw features, or normalized features in the given (default: store) precision."""
+        if not normalized:
+            return self.raw(path)
+        precision = precision or self.precision
+        assert precision in PRECISIONS, f'Feature precision {precision} is not implemented'
+        if precision == 'fp32':
+            return self.normalized(path)
+        return self.quantized(path, precision)
+
+    def path_of(self, array):
+        """Feature file an array handed out by this store was read from, None for other arrays."""
+        return self.paths.get(id(array))
+
+    def hash(self, array):
+        """feature_hash of array, memoized for arrays handed out by this store."""
+        key = self.keys.get(id(array))
+        if key is None:
+            return feature_hash(array)
+        memo_key = key + (os.path.getmtime(key[0]),)
+        if memo_key not in self.hashes:
+            self.hashes[memo_key] = feature_hash(array)
+        return self.hashes[memo_key]
+
+
+_store = None
+
+
+def get_feature_store():
+    """The FeatureStore of this process, shared by datasets and samplers."""
+    global _store
+    if _store is None:
+        _store = FeatureStore()
+    return _store
@@ -6,9 +6,12 @@
 #
 ####################################################################################
 
+import os
 import torch
 import numpy as np
 
+from .feature_store import get_feature_store
+
 NUM_CLASSESS = {
     'CIFAR10': 10,
     'CIFAR10_scan': 10,
@@ -83,9 +86,25 @@ DATASET_FEATURES_DICT = {
         }
 }
 
+def resolve_path(path_dict, split, ds_name, seed):
+    """Path of the seed-specific file, falling back to the seed 1 file when it does not exist."""
+    fname = path_dict[split][ds_name].format(seed=seed)
+    if not os.path.exists(fname):
+        fname = path_dict[split][ds_name].format(seed=1)
+    return fname
+
+
 def load_features(ds_name, seed=1, train=True, normalized=True, is_diffusion=False,
-                  feature_type='simclr', dataset=None):
+                  feature_type='simclr', dataset=None, precision='fp32'):
+    """
+    Features of a dataset as a (copy-on-write) memory-mapped array from the process-wide
+    FeatureStore; normalized features are precomputed once and persisted next to the file.
+    Normalized features come in the given precision; fp16 and int8 are returned as
+    QuantizedFeatures, which only the tiled radius graph of ProbCover consumes without
+    converting them back to a float32 matrix.
+    """
     split = "train" if train else "test"
+    store = get_feature_store()
 
     num_classes = NUM_CLASSESS[ds_name]
     if ds_name.lower() in ['cifar10', 'cifar100'] and feature_type not in  ['simclr', 'classifier']:
@@ -94,63 +113,30 @@ def load_features(ds_name, seed=1, train=True, normalized=True, is_diffusion=Fal
 
     if dataset is not None:
         features = dataset.features
+        print(f'Loaded features from dataset: {ds_name}')
+        path = store.path_of(features)
+        if path is not None:
+            return store.get(path, normalized=True, precision=precision)
 
         if isinstance(features, torch.Tensor):
             features = features.cpu().detach().numpy()
         features = features / np.linalg.norm(features, axis=1, keepdims=True)
-        print(f'Loaded features from dataset: {ds_name}')
         return features
 
-    try:
-        fname = DATASET_FEATURES_DICT[split][ds_name].format(seed=seed)
-
-        if fname.endswith('.npy'):
-            features = np.load(fname)
-        elif fname.endswith('.pth'):
-            features = torch.load(fname)
-        else:
-            raise Exception("Unsupported filetype")
-
-    except:
-        fname = DATASET_FEATURES_DICT[split][ds_name].format(seed=1)
-
-        if fname.endswith('.npy'):
-            features = np.load(fname)
-        elif fname.endswith('.pth'):
-            features = torch.load(fname)
-        else:
-            raise Exception("Unsupported filetype")
-
-    if isinstance(features, torch.Tensor):
-        features = features.cpu().detach().numpy()
-
-    if normalized:
-        features = features / np.linalg.norm(features, axis=1, keepdims=True)
-    return features
+    fname = resolve_path(DATASET_FEATURES_DICT, split, ds_name, seed)
+    return store.get(fname, normalized=normalized, precision=precision)
 
 
 def load_targets(ds_name, seed=1, train=True):
     " load pretrained features for a dataset "
     split = "train" if train else "test"
 
-    try:
-        fname = DATASET_TARGETS_DICT[split][ds_name].format(seed=seed)
-
-        if fname.endswith('.npy'):
-            targets = np.load(fname)
-        elif fname.endswith('.pth'):
-            targets = torch.load(fname)
-        else:
-            raise Exception("Unsupported filetype")
-
-    except:
-        fname = DATASET_TARGETS_DICT[split][ds_name].format(seed=1)
-
-        if fname.endswith('.npy'):
-            targets = np.load(fname)
-        elif fname.endswith('.pth'):
-            targets = torch.load(fname)
-        else:
-            raise Exception("Unsupported filetype")
+    fname = resolve_path(DATASET_TARGETS_DICT, split, ds_name, seed)
+    if fname.endswith('.npy'):
+        targets = np.load(fname)
+    elif fname.endswith('.pth'):
+        targets = torch.load(fname)
+    else:
+        raise Exception("Unsupported filetype")
 
     return targets
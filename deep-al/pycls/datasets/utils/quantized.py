@@ -0,0 +1,121 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""fp16 and per-row scaled int8 feature matrices that are dequantized tile by tile."""
+
+import numpy as np
+import torch
+
+from pycls.utils.io import hash_array
+
+PRECISIONS = ('fp32', 'fp16', 'int8')
+
+
+def quantize_rows(features, precision):
+    """Returns (data, scale): x ~= data * scale[:, None], scale is None for fp16."""
+    features = np.asarray(features, dtype=np.float32)
+    if precision == 'fp16':
+        return features.astype(np.float16), None
+    elif precision == 'int8':
+        scale = np.abs(features).max(axis=1) / 127.0
+        safe_scale = np.where(scale > 0, scale, 1.0)
+        data = np.clip(np.rint(features / safe_scale[:, None]), -127, 127).astype(np.int8)
+        return data, scale.astype(np.float32)
+    else:
+        raise NotImplementedError(f'Feature precision {precision} is not implemented')
+
+
+class QuantizedFeatures:
+    """
+    N x D feature matrix stored as fp16 or as int8 with a float32 scale per row.
+
+    Indexing returns dequantized float32 rows, so code written for float32 arrays keeps
+    working on the subsets it gathers; take() keeps a subset quantized and to_device() moves
+    the quantized matrix to torch for tiled distance computations.
+    """
+
+    def __init__(self, data, scale=None):
+        self.data = data
+        self.scale = scale
+        self.precision = 'fp16' if scale is None else 'int8'
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (0 if self.scale is None else self.scale.nbytes)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        data = np.asarray(self.data[index], dtype=np.float32)
+        if self.scale is not None:
+            scale = np.asarray(self.scale[index], dtype=np.float32)
+            data = data * (scale[..., None] if data.ndim > scale.ndim else scale)
+        return data
+
+    def __array__(self, dtype=None, copy=None):
+        # materializes the full float32 matrix, only used by code that needs a plain array
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def take(self, indices):
+        """Rows at indices, still quantized."""
+        return QuantizedFeatures(self.data[indices], None if self.scale is None else self.scale[indices])
+
+    def hash(self):
+        digest = hash_array(self.data)
+        if self.scale is not None:
+            digest = digest + hash_array(self.scale)
+        return digest
+
+    def to_device(self, device):
+        data = torch.from_numpy(np.ascontiguousarray(self.data)).to(device)
+        scale = None if self.scale is None else torch.from_numpy(np.ascontiguousarray(self.scale)).to(device)
+        return QuantizedTensor(data, scale)
+
+
+class QuantizedTensor:
+    """Device-side QuantizedFeatures; tile() returns float32 rows [start, end)."""
+
+    def __init__(self, data, scale=None):
+        self.data = data
+        self.scale = scale
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def tile(self, start, end):
+        rows = self.data[start:end].float()
+        if self.scale is not None:
+            rows = rows * self.scale[start:end, None]
+        return rows
+
+
+def feature_tile(features, start, end):
+    """float32 rows [start, end) of a float tensor or a QuantizedTensor."""
+    if isinstance(features, QuantizedTensor):
+        return features.tile(start, end)
+    return features[start:end]
+
+
+def features_to_device(features, device):
+    """QuantizedFeatures stay quantized on device, everything else becomes a float32 tensor."""
+    if isinstance(features, QuantizedFeatures):
+        return features.to_device(device)
+    return torch.as_tensor(np.asarray(features, dtype=np.float32)).to(device)
+
+
+def feature_hash(features):
+    return features.hash() if isinstance(features, QuantizedFeatures) else hash_array(features)
@@ -0,0 +1,39 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Label arrays of datasets, read without decoding or transforming images."""
+
+import numpy as np
+
+from .feature_store import file_lock, is_fresh, sidecar_path, write_npy_atomic
+
+
+def lmdb_targets(db_path, length, read_label):
+    """
+    Labels of an LMDB dataset as an int64 array, persisted as <name>.targets.npy next to the
+    database. read_label(index) is only called the first time, when the sidecar is built.
+    """
+    targets_path = sidecar_path(db_path, 'targets')
+    if not is_fresh(targets_path, db_path):
+        with file_lock(targets_path):
+            if not is_fresh(targets_path, db_path):
+                def fill(out):
+                    for i in range(length):
+                        out[i] = read_label(i)
+                write_npy_atomic(targets_path, (length,), np.int64, fill)
+    return np.load(targets_path)
+
+
+def get_targets(dataset):
+    """
+    Labels of every sample of dataset as an int64 array. Uses the dataset's targets when it
+    exposes them and falls back to a (slow) pass over the dataset otherwise.
+    """
+    targets = getattr(dataset, 'targets', None)
+    if targets is None:
+        print(f'{dataset.__class__.__name__} has no targets, reading labels through __getitem__')
+        targets = [dataset[i][1] for i in range(len(dataset))]
+    return np.asarray(targets, dtype=np.int64)
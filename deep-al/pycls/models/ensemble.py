@@ -0,0 +1,84 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Committee of identical architectures evaluated as one vmapped model."""
+
+import copy
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.func import functional_call, stack_module_state, vmap
+
+
+class StackedEnsemble(nn.Module):
+    """
+    Stacks the parameters and buffers of T models with the same architecture
+    (torch.func.stack_module_state) and runs all members in one vmapped forward,
+    so every batch is decoded and transferred once for the whole committee.
+    """
+
+    def __init__(self, models):
+        super(StackedEnsemble, self).__init__()
+        self.num_members = len(models)
+        params, buffers = stack_module_state(list(models))
+        self.params = nn.ParameterDict({k.replace('.', '/'): nn.Parameter(v) for k, v in params.items()})
+        for k, v in buffers.items():
+            self.register_buffer(k.replace('.', '/'), v)
+        self.buffer_names = list(buffers.keys())
+
+        # stateless copy of the architecture used by functional_call
+        base = copy.deepcopy(models[0]).to('meta')
+        self.base = [base]  # kept out of the module tree
+
+    def stacked_state(self):
+        params = {k.replace('/', '.'): v for k, v in self.params.items()}
+        buffers = {k: getattr(self, k.replace('.', '/')) for k in self.buffer_names}
+        return params, buffers
+
+    def member_forward(self, params, buffers, x):
+        return functional_call(self.base[0], (params, buffers), (x,))['preds']
+
+    def forward(self, x, randomness='error', member_inputs=False):
+        """
+        Returns the stacked logits of all members, T x B x C.
+        x is shared by all members, or T x B x ... with one batch per member if member_inputs.
+        randomness='different' gives every member its own dropout draws.
+        """
+        self.base[0].train(self.training)
+        params, buffers = self.stacked_state()
+        x_dim = 0 if member_inputs else None
+        return vmap(self.member_forward, in_dims=(0, 0, x_dim), randomness=randomness)(params, buffers, x)
+
+    def stack_param_groups(self, model, param_groups):
+        """
+        Rewrites the optimizer param groups of one member (model) to the stacked parameters.
+        SGD and Adam update every entry independently, so one optimizer over the stacked
+        parameters takes exactly the steps of T per-member optimizers.
+        """
+        names = {id(p): n for n, p in model.named_parameters()}
+        stacked_groups = []
+        for group in param_groups:
+            group = dict(group)
+            group['params'] = [self.params[names[id(p)].replace('.', '/')] for p in group['params']]
+            stacked_groups.append(group)
+        return stacked_groups
+
+    def member_state_dict(self, i):
+        """State dict of member i, loadable into the original architecture."""
+        params, buffers = self.stacked_state()
+        state = {k: v[i].detach().clone() for k, v in params.items()}
+        state.update({k: v[i].detach().clone() for k, v in buffers.items()})
+        return state
+
+
+def variation_ratio(logits):
+    """
+    var_r = 1 - f_m / T, where f_m is the number of members voting for the mode class.
+    logits: T x B x C stacked member outputs. Computed on-device.
+    """
+    T, _, num_classes = logits.shape
+    votes = F.one_hot(logits.argmax(dim=-1), num_classes).sum(dim=0)  # B x C
+    mode_cnt = votes.max(dim=-1).values
+    return 1.0 - mode_cnt.float() / T
@@ -108,6 +108,52 @@ class VAE(nn.Module):
     def _decode(self, z):
         return self.decoder(z)
 
+class FeatureVAE(nn.Module):
+    """MLP VAE over fixed (e.g. self-supervised) feature vectors instead of images."""
+    def __init__(self, in_dim, z_dim=32, hidden_dim=512):
+        super(FeatureVAE, self).__init__()
+        print(f"Constructing feature VAE MODEL with in_dim: {in_dim}, z_dim: {z_dim}")
+        logger.info(f"Constructing feature VAE MODEL with in_dim: {in_dim}, z_dim: {z_dim}")
+        self.in_dim = in_dim
+        self.z_dim = z_dim
+        self.encoder = nn.Sequential(
+            nn.Linear(in_dim, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(True),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(True),
+        )
+        self.fc_mu = nn.Linear(hidden_dim, z_dim)
+        self.fc_logvar = nn.Linear(hidden_dim, z_dim)
+        self.decoder = nn.Sequential(
+            nn.Linear(z_dim, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(True),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(True),
+            nn.Linear(hidden_dim, in_dim),
+        )
+        self.weight_init()
+
+    def weight_init(self):
+        for m in self.modules():
+            kaiming_init(m)
+
+    def forward(self, x):
+        z = self.encoder(x)
+        mu, logvar = self.fc_mu(z), self.fc_logvar(z)
+        z = self.reparameterize(mu, logvar)
+        x_recon = self.decoder(z)
+
+        return x_recon, z, mu, logvar
+
+    def reparameterize(self, mu, logvar):
+        stds = (0.5 * logvar).exp()
+        return torch.randn_like(mu) * stds + mu
+
+
 class clf_Discriminator(nn.Module):
     """
     Model to circumvent the need of learning a separate task learner by
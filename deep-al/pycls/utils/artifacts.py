@@ -0,0 +1,131 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Append-only store of per-episode AL artifacts (scores, logits, metrics, labeled-set journal)."""
+
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from pycls.datasets.pool_state import PoolState, as_indices
+
+_EPISODE_FILE = re.compile(r'episode_(\d+)\.npy$')
+
+
+def save_npy_atomic(path, array):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class ArtifactStore:
+    """
+    Every array is written once, as root/<name>/episode_<k>.npy, so the cost of an episode
+    only depends on its own data and earlier episodes are never read back or rewritten.
+
+        root/<name>/episode_<k>.npy   per-episode arrays (logits optionally in fp16)
+        root/metrics.jsonl            one line of scalar metrics per episode
+        root/pool/initial.npz         initial PoolState
+        root/pool/episode_<k>.npy     indices labeled in episode k (labeled-set journal)
+    """
+
+    def __init__(self, root, fp16_logits=True):
+        self.root = root
+        self.fp16_logits = fp16_logits
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name, episode):
+        return os.path.join(self.root, name, f'episode_{episode:04d}.npy')
+
+    # ------------------------------------------------------------------ writers
+
+    def append(self, name, episode, array):
+        """Stores array as artifact name of episode; logits are stored as fp16 if enabled."""
+        array = np.asarray(array)
+        if self.fp16_logits and name == 'logits' and array.dtype == np.float32:
+            array = array.astype(np.float16)
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        save_npy_atomic(self.path(name, episode), array)
+
+    def append_metrics(self, episode, **metrics):
+        """Appends one json line of scalar metrics of episode."""
+        with open(os.path.join(self.root, 'metrics.jsonl'), 'a') as f:
+            f.write(json.dumps({'episode': episode, **metrics}) + '\n')
+
+    def start_pool(self, pool):
+        """
+        Starts a run: removes the episode artifacts and metrics of an earlier run in the same
+        root (a reused EXP_DIR), whose journal would otherwise be replayed on top of pool, and
+        stores the initial PoolState that the labeled-set journal starts from.
+        """
+        self.clear()
+        os.makedirs(os.path.join(self.root, 'pool'), exist_ok=True)
+        pool.save(os.path.join(self.root, 'pool', 'initial.npz'))
+
+    def clear(self):
+        """Removes every root/<name>/episode_<k>.npy and root/metrics.jsonl."""
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            for f in os.listdir(directory):
+                if _EPISODE_FILE.match(f):
+                    os.remove(os.path.join(directory, f))
+        metrics_path = os.path.join(self.root, 'metrics.jsonl')
+        if os.path.exists(metrics_path):
+            os.remove(metrics_path)
+
+    def append_labeled(self, episode, activeSet):
+        """Journals the indices labeled in episode (only the delta, never the full sets)."""
+        self.append('pool', episode, as_indices(activeSet))
+
+    # ------------------------------------------------------------------ readers
+
+    def episodes(self, name):
+        """Sorted episodes for which artifact name exists."""
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return []
+        matches = (_EPISODE_FILE.match(f) for f in os.listdir(directory))
+        return sorted(int(m.group(1)) for m in matches if m is not None)
+
+    def load(self, name, episode, mmap_mode=None):
+        """Artifact name of episode, in its stored dtype."""
+        return np.load(self.path(name, episode), mmap_mode=mmap_mode)
+
+    def load_all(self, name):
+        """{episode: array} of artifact name."""
+        return {episode: self.load(name, episode) for episode in self.episodes(name)}
+
+    def metrics(self):
+        """Per-episode metric dicts sorted by episode; a rerun episode keeps its last line."""
+        path = os.path.join(self.root, 'metrics.jsonl')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        by_episode = {m['episode']: m for m in lines}
+        return [by_episode[k] for k in sorted(by_episode)]
+
+    def metric(self, key):
+        """Values of one metric over the episodes that recorded it."""
+        return np.array([m[key] for m in self.metrics() if key in m])
+
+    def pool_state(self, episode=None):
+        """
+        PoolState after the labels of episode (all journaled episodes if None) were added,
+        replayed from the initial pool. uSet is returned in initial pool order.
+        """
+        pool = PoolState.load(os.path.join(self.root, 'pool', 'initial.npz'))
+        for k in self.episodes('pool'):
+            if episode is not None and k > episode:
+                break
+            pool.label(self.load('pool', k))
+        return pool
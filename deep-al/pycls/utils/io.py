@@ -10,12 +10,16 @@
 
 """IO utilities (adapted from Detectron)"""
 
+import hashlib
 import logging
 import os
 import re
 import sys
+import tempfile
 from urllib import request as urlrequest
 
+import numpy as np
+
 
 logger = logging.getLogger(__name__)
 
@@ -82,3 +86,29 @@ def compute_cand_size(l, budget, max_size=35000):
     ub = 45000 * (35000 + 10000)
     cand_size = int((ub + (l + budget) ** 2 / 4) ** 0.5 - 1.5 * (l + budget))
     return max(min(max_size, cand_size), budget)
+
+
+def hash_array(arr):
+    """Returns a hex digest identifying the content, shape and dtype of a numpy array."""
+    arr = np.ascontiguousarray(arr)
+    h = hashlib.sha1()
+    h.update(str((arr.shape, arr.dtype.str)).encode())
+    h.update(memoryview(arr).cast('B'))
+    return h.hexdigest()
+
+
+def get_cache_dir(cfg):
+    """Returns (and creates) the directory used to cache AL artifacts shared across episodes and seeds."""
+    cache_dir = cfg.ACTIVE_LEARNING.CACHE_DIR
+    if not cache_dir:
+        cache_dir = os.path.join(cfg.OUT_DIR, 'al_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def save_npz_atomic(path, **arrays):
+    """Writes a compressed npz through a temporary file so that readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.npz.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
@@ -14,9 +14,9 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from sklearn.cluster import MiniBatchKMeans
 
 from pycls.core.config import cfg
+from pycls.al.clustering import KMeans, engine_kwargs
 
 # Number of bytes in a megabyte
 _B_IN_MB = 1024 * 1024
@@ -109,16 +109,29 @@ def compute_norm(x1, x2, device='cuda', batch_size=512, operation=None, save_dir
     return dist_matrix
 
 
-def blob_purity(dists, center_idx, radius, assignments):
-    label = assignments[center_idx]
-    dist = dists[center_idx] # n x n -> n
-    total_count = torch.sum(dist < radius)
-    cond = torch.logical_and(dist < radius, assignments == label)
-    pure_count = torch.sum(cond)
-    if total_count == pure_count:
-        return 1
-    else:
-        return 0
+def min_dist_to_other_cluster(features, assignments, batch_size=1024):
+    """
+    For every point, the distance to its nearest point of a different cluster, computed in
+    row tiles of batch_size so the N x N distance matrix is never materialized.
+    """
+    assignments = assignments.to(features.device)
+    min_dists = torch.empty(features.shape[0], device=features.device)
+    for i in range(0, features.shape[0], batch_size):
+        dist = torch.cdist(features[i:i + batch_size], features, p=2.0)
+        dist.masked_fill_(assignments[i:i + batch_size, None] == assignments[None, :], float('inf'))
+        min_dists[i:i + batch_size] = dist.min(dim=1).values
+    return min_dists
+
+def purity_curve(features, assignments, radiuses, batch_size=1024):
+    """
+    Fraction of points whose ball of each radius only contains points of their own cluster.
+    The ball of radius r around x is pure iff r <= min distance from x to another cluster,
+    so all radii are answered from one distance pass with a searchsorted.
+    """
+    min_dists = torch.sort(min_dist_to_other_cluster(features, assignments, batch_size)).values
+    radiuses = torch.as_tensor(radiuses, dtype=min_dists.dtype, device=min_dists.device)
+    num_impure = torch.searchsorted(min_dists, radiuses, side='left')
+    return (1.0 - num_impure.double() / min_dists.shape[0]).cpu().numpy()
 
 def compute_purity(feature_path, num_classes, ratio=1.0, device="cuda", normalize=True,
                    purity_threshold=0.95):
@@ -137,26 +150,20 @@ def compute_purity(feature_path, num_classes, ratio=1.0, device="cuda", normaliz
 
     indices = np.random.choice(num_samples, size=num_subset, replace=False)
     subset_features = features[indices]
-    num_subset_samples = subset_features.shape[0]
     if normalize:
         subset_features= F.normalize(subset_features, dim=1)
 
-    km = MiniBatchKMeans(n_clusters=num_classes, batch_size=5000)
-    km.fit_predict(subset_features.cpu().numpy())
+    engine_options = engine_kwargs(cfg)
+    engine_options['device'] = subset_features.device
+    km = KMeans(n_clusters=num_classes, minibatch=True, batch_size=5000, **engine_options)
+    km.fit_predict(subset_features)
     assignments = torch.from_numpy(km.labels_)
 
-    dists = compute_norm(subset_features, subset_features)
-
     is_first = True
     best_purity_radius = 0
-    purity_rates = []
     radiuses = np.linspace(0.05, 1.0, 20)
-    for r, radius in enumerate(radiuses):
-        purity_count = 0
-        for i in range(num_subset_samples):
-            purity_count += blob_purity(dists, i, radius, assignments)
-        purity_rate = purity_count / num_subset_samples
-        purity_rates.append(purity_rate)
+    purity_rates = purity_curve(subset_features, assignments, radiuses)
+    for r, (radius, purity_rate) in enumerate(zip(radiuses, purity_rates)):
         print(np.around(radius, 2), purity_rate)
 
         if is_first and purity_rate < purity_threshold:
@@ -0,0 +1,89 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Selection parity of fp16 / int8 feature storage against float32 on a synthetic pool
+(tools/feature_parity.py reports the same on real features).
+"""
+
+import numpy as np
+import pytest
+
+from pycls.al.prob_cover import CoverGraph
+from pycls.al.radius_graph import torch_radius_graph
+from pycls.datasets.utils.quantized import QuantizedFeatures, feature_hash, quantize_rows
+
+DELTA = 0.6
+
+
+@pytest.fixture(scope='module')
+def features():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    x = centers[rng.integers(20, size=800)] + 0.15 * rng.normal(size=(800, 32))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def quantized(features, precision):
+    return QuantizedFeatures(*quantize_rows(features, precision))
+
+
+def edge_set(features):
+    # small tiles, so the last partial row and column tiles are exercised
+    xs, ys, _ = torch_radius_graph(features, DELTA, batch_size=96, device='cpu')
+    return set(zip(xs.tolist(), ys.tolist()))
+
+
+def greedy_cover(xs, ys, num_nodes, budget):
+    graph = CoverGraph(xs, ys, num_nodes)
+    picks = []
+    for _ in range(budget):
+        cur = graph.out_degrees.argmax()
+        graph.cover_from(cur)
+        picks.append(cur)
+    return picks
+
+
+def coverage(edges, picks, num_nodes):
+    covered = np.zeros(num_nodes, dtype=bool)
+    picks = set(picks)
+    for x, y in edges:
+        if x in picks:
+            covered[y] = True
+    return covered.mean()
+
+
+@pytest.mark.parametrize('precision, max_error', [('fp16', 1e-3), ('int8', 1e-2)])
+def test_dequantization_error(features, precision, max_error):
+    q = quantized(features, precision)
+    assert np.abs(q[:] - features).max() < max_error
+    np.testing.assert_array_equal(q.take(np.arange(10, 20))[:], q[10:20])
+
+
+@pytest.mark.parametrize('precision, min_jaccard', [('fp16', 0.999), ('int8', 0.99)])
+def test_radius_graph_parity(features, precision, min_jaccard):
+    ref_edges = edge_set(features)
+    edges = edge_set(quantized(features, precision))
+    assert len(edges & ref_edges) / len(edges | ref_edges) >= min_jaccard
+
+
+@pytest.mark.parametrize('precision', ['fp16', 'int8'])
+def test_prob_cover_selection_parity(features, precision):
+    n, budget = len(features), 20
+    xs, ys, _ = torch_radius_graph(features, DELTA, device='cpu')
+    ref_picks = greedy_cover(xs, ys, n, budget)
+    q_xs, q_ys, _ = torch_radius_graph(quantized(features, precision), DELTA, device='cpu')
+    picks = greedy_cover(q_xs, q_ys, n, budget)
+
+    # picks on quantized features cover (almost) as much of the float32 graph
+    ref_edges = list(zip(xs.tolist(), ys.tolist()))
+    assert coverage(ref_edges, picks, n) >= 0.99 * coverage(ref_edges, ref_picks, n)
+
+
+def test_feature_hash_depends_on_precision(features):
+    hashes = {feature_hash(features), feature_hash(quantized(features, 'fp16')),
+              feature_hash(quantized(features, 'int8'))}
+    assert len(hashes) == 3
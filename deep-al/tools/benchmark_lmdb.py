@@ -0,0 +1,84 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Fetch throughput (images/sec) of an LMDB-backed dataset (IMAGENET, IMAGENET100, TINYIMAGENET).
+
+Compares, on the same random batches, per-item reads (one transaction per image) with the
+batched __getitems__ (one transaction per batch), in process and through the training
+DataLoader. Results are written to <OUT_DIR>/<DATASET>/benchmark_lmdb/results.json.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+add_path(os.path.abspath('..'))
+
+from pycls.core.config import cfg
+from pycls.datasets.data import Data
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='LMDB fetch benchmark')
+    parser.add_argument('--cfg', dest='cfg_file', help='Config file', required=True, type=str)
+    parser.add_argument('--batches', help='Number of random batches', default=20, type=int)
+    parser.add_argument('--batch_size', help='Batch size', default=256, type=int)
+    parser.add_argument('--seed', help='Random seed', default=1, type=int)
+    return parser
+
+
+def throughput(fetch, batches):
+    start_time = time.time()
+    for batch in batches:
+        fetch(batch)
+    return sum(len(b) for b in batches) / (time.time() - start_time)
+
+
+def main(args):
+    cfg.merge_from_file(args.cfg_file)
+    cfg.OUT_DIR = os.path.join(os.path.abspath('..'), cfg.OUT_DIR)
+    out_dir = os.path.join(cfg.OUT_DIR, cfg.DATASET.NAME, 'benchmark_lmdb')
+    os.makedirs(out_dir, exist_ok=True)
+    cfg.DATASET.ROOT_DIR = os.path.join(os.path.abspath('..'), cfg.DATASET.ROOT_DIR)
+
+    data_obj = Data(cfg)
+    train_data, train_size = data_obj.getDataset(save_dir=cfg.DATASET.ROOT_DIR, isTrain=True, isDownload=False)
+    assert hasattr(train_data, '__getitems__'), f'{cfg.DATASET.NAME} has no batched fetch'
+
+    rng = np.random.default_rng(args.seed)
+    batches = [rng.choice(train_size, args.batch_size, replace=False).tolist() for _ in range(args.batches)]
+
+    results = {
+        'per_item': throughput(lambda batch: [train_data[i] for i in batch], batches),
+        'batched': throughput(train_data.__getitems__, batches),
+    }
+
+    indexes = np.concatenate(batches)
+    loader = data_obj.getIndexesDataLoader(indexes=indexes, batch_size=args.batch_size, data=train_data)
+    start_time = time.time()
+    num_images = sum(len(y) for _, y in loader)
+    results['loader'] = num_images / (time.time() - start_time)
+    results['loader_workers'] = data_obj.num_workers
+    if data_obj.loaders is not None:
+        data_obj.loaders.shutdown()
+
+    for name, value in results.items():
+        print(f'{name}: {value:.1f}')
+    with open(os.path.join(out_dir, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(argparser().parse_args())
@@ -0,0 +1,110 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Per-episode DataLoader cost with and without the persistent LoaderManager.
+
+Every simulated episode creates the loaders train_al.py creates (lSet, val, test and a
+sequential uSet scoring loader) and reads a few batches from each. Reports the loader startup
+time (creation to first batch) per episode and the peak number of live worker processes.
+Results are written to <OUT_DIR>/<DATASET>/benchmark_loaders/results.json.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+add_path(os.path.abspath('..'))
+
+from pycls.core.config import cfg
+from pycls.datasets.data import Data
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='DataLoader startup benchmark')
+    parser.add_argument('--cfg', dest='cfg_file', help='Config file', required=True, type=str)
+    parser.add_argument('--episodes', help='Number of simulated episodes', default=5, type=int)
+    parser.add_argument('--lset_size', help='Initial labeled set size', default=1000, type=int)
+    parser.add_argument('--budget', help='Labeled points added per episode', default=1000, type=int)
+    parser.add_argument('--batches', help='Batches read from every loader', default=5, type=int)
+    return parser
+
+
+def num_workers_alive():
+    return len(multiprocessing.active_children())
+
+
+def run(data_obj, train_data, test_data, args, seed=0):
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(len(train_data))
+    valSet = perm[:len(perm) // 10]
+    pool = perm[len(perm) // 10:]
+
+    startup_times, peak_workers = [], 0
+    for episode in range(args.episodes):
+        num_labeled = args.lset_size + episode * args.budget
+        lSet, uSet = pool[:num_labeled], pool[num_labeled:]
+
+        startup = 0.0
+        loaders = [
+            lambda: data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data),
+            lambda: data_obj.getIndexesDataLoader(indexes=valSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data),
+            lambda: data_obj.getTestLoader(data=test_data, test_batch_size=cfg.TEST.BATCH_SIZE, seed_id=seed),
+            lambda: data_obj.getSequentialDataLoader(indexes=uSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data),
+        ]
+        for make_loader in loaders:
+            start_time = time.time()
+            loader = make_loader()
+            for i, _ in enumerate(loader):
+                if i == 0:
+                    startup += time.time() - start_time
+                peak_workers = max(peak_workers, num_workers_alive())
+                if i + 1 >= args.batches:
+                    break
+            del loader
+        startup_times.append(startup)
+        print(f'episode {episode}: loader startup {startup:.3f}sec, live workers {num_workers_alive()}')
+
+    return {'startup_sec': startup_times, 'mean_startup_sec': float(np.mean(startup_times)),
+            'peak_workers': peak_workers, 'workers_at_end': num_workers_alive()}
+
+
+def main(args):
+    cfg.merge_from_file(args.cfg_file)
+    cfg.OUT_DIR = os.path.join(os.path.abspath('..'), cfg.OUT_DIR)
+    out_dir = os.path.join(cfg.OUT_DIR, cfg.DATASET.NAME, 'benchmark_loaders')
+    os.makedirs(out_dir, exist_ok=True)
+    cfg.DATASET.ROOT_DIR = os.path.join(os.path.abspath('..'), cfg.DATASET.ROOT_DIR)
+
+    results = {}
+    for persistent in [False, True]:
+        cfg.DATA_LOADER.PERSISTENT = persistent
+        data_obj = Data(cfg)
+        train_data, _ = data_obj.getDataset(save_dir=cfg.DATASET.ROOT_DIR, isTrain=True, isDownload=True)
+        test_data, _ = data_obj.getDataset(save_dir=cfg.DATASET.ROOT_DIR, isTrain=False, isDownload=True)
+        name = 'persistent' if persistent else 'per_loader'
+        print(f'======== {name} ========')
+        results[name] = run(data_obj, train_data, test_data, args)
+        if data_obj.loaders is not None:
+            data_obj.loaders.shutdown()
+        results[name]['workers_after_shutdown'] = num_workers_alive()
+        print(f'{name}: {results[name]}')
+
+    with open(os.path.join(out_dir, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(argparser().parse_args())
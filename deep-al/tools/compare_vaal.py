@@ -0,0 +1,118 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Benchmarks feature-space VAAL (vaal_feat) against pixel VAAL on the same labeled pool.
+
+For both methods, reports the selection wall-clock time, the overlap of the two active sets,
+class coverage of the selection and its coverage of the pool in feature space (distance of
+unlabeled points to the nearest labeled-or-selected point). Results are written to
+<OUT_DIR>/<DATASET>/compare_vaal/seed_<seed>/results.json.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import torch
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+add_path(os.path.abspath('..'))
+
+from pycls.al.Sampling import AdversarySampler
+from pycls.al.kcenter import min_dist_to_labeled
+from pycls.core.config import cfg
+from pycls.datasets.data import Data
+import pycls.datasets.utils as ds_utils
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='Feature-space VAAL vs pixel VAAL')
+    parser.add_argument('--cfg', dest='cfg_file', help='Config file', required=True, type=str)
+    parser.add_argument('--budget', help='Number of points to select', required=True, type=int)
+    parser.add_argument('--initial_size', help='Size of the initial random labeled set', default=0, type=int)
+    parser.add_argument('--seed', help='Random seed', default=1, type=int)
+    parser.add_argument('--vae_epochs', help='Overrides VAAL.VAE_EPOCHS for both methods', default=0, type=int)
+    return parser
+
+
+def selection_stats(activeSet, lSet, uSet, all_features, targets):
+    stats = {}
+    if targets is not None:
+        counts = np.bincount(targets[activeSet], minlength=targets.max() + 1)
+        probs = counts[counts > 0] / counts.sum()
+        stats['classes_covered'] = int((counts > 0).sum())
+        stats['class_entropy'] = float(-(probs * np.log(probs)).sum())
+
+    remain = np.setdiff1d(uSet, activeSet)
+    covered = np.concatenate([lSet, activeSet]).astype(int)
+    dists = np.sqrt(min_dist_to_labeled(all_features[covered], all_features[remain.astype(int)]))
+    stats['mean_coverage_dist'] = float(dists.mean())
+    stats['max_coverage_dist'] = float(dists.max())
+    return stats
+
+
+def main(args):
+    cfg.merge_from_file(args.cfg_file)
+    cfg.RNG_SEED = args.seed
+    if args.vae_epochs > 0:
+        cfg.VAAL.VAE_EPOCHS = args.vae_epochs
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+
+    cfg.OUT_DIR = os.path.join(os.path.abspath('..'), cfg.OUT_DIR)
+    cfg.EXP_DIR = os.path.join(cfg.OUT_DIR, cfg.DATASET.NAME, 'compare_vaal', f'seed_{cfg.RNG_SEED}')
+    os.makedirs(cfg.EXP_DIR, exist_ok=True)
+
+    cfg.DATASET.ROOT_DIR = os.path.join(os.path.abspath('..'), cfg.DATASET.ROOT_DIR)
+    data_obj = Data(cfg)
+    train_data, train_size = data_obj.getDataset(save_dir=cfg.DATASET.ROOT_DIR, isTrain=True, isDownload=True)
+    initial_size = args.initial_size if args.initial_size > 0 else args.budget
+    lSet_path, uSet_path, valSet_path = data_obj.makeLUVSets(train_split_ratio=initial_size / train_size, \
+        val_split_ratio=cfg.DATASET.VAL_RATIO, data=train_data, seed_id=cfg.RNG_SEED, save_dir=cfg.EXP_DIR)
+    lSet, uSet, _ = data_obj.loadPartitions(lSetPath=lSet_path, uSetPath=uSet_path, valSetPath=valSet_path)
+    print(f'Labeled Set: {len(lSet)}, Unlabeled Set: {len(uSet)}, Budget: {args.budget}')
+
+    all_features = ds_utils.load_features(cfg.DATASET.NAME, cfg.RNG_SEED, train=True, is_diffusion=False,
+                                          feature_type=cfg.ACTIVE_LEARNING.UNC_FEATURE, dataset=train_data)
+    targets = ds_utils.get_targets(train_data)
+
+    results = {}
+    active_sets = {}
+    for method in ['vaal_feat', 'vaal']:
+        cfg.EPISODE_DIR = os.path.join(cfg.EXP_DIR, method)
+        sampler = AdversarySampler(dataObj=data_obj, cfg=cfg, budgetSize=args.budget)
+        torch.cuda.synchronize()
+        start_time = time.time()
+        if method == 'vaal_feat':
+            activeSet, _ = sampler.vaal_features(lSet=lSet, uSet=uSet, dataset=train_data)
+        else:
+            vae, disc, uSet_loader = sampler.vaal_perform_training(lSet=lSet, uSet=uSet, dataset=train_data)
+            activeSet, _ = sampler.sample_for_labeling(vae=vae, discriminator=disc, unlabeled_dataloader=uSet_loader, uSet=uSet)
+        torch.cuda.synchronize()
+        elapsed = time.time() - start_time
+
+        active_sets[method] = np.asarray(activeSet).astype(int)
+        results[method] = {'time_sec': elapsed}
+        results[method].update(selection_stats(active_sets[method], lSet, uSet, all_features, targets))
+        print(f'{method}: {results[method]}')
+
+    results['overlap'] = len(np.intersect1d(active_sets['vaal_feat'], active_sets['vaal'])) / args.budget
+    results['speedup'] = results['vaal']['time_sec'] / max(results['vaal_feat']['time_sec'], 1e-12)
+    print(f"Overlap: {results['overlap']:.4f}, speedup of vaal_feat: {results['speedup']:.2f}x")
+
+    with open(os.path.join(cfg.EXP_DIR, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(argparser().parse_args())
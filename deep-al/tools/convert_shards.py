@@ -0,0 +1,133 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Converts IMAGENET, IMAGENET100, TINYIMAGENET or DOMAINNET to pre-resized uint8 shards
+(pycls/datasets/shards.py), read instead of the native storage with DATASET.BACKEND 'shards'.
+
+Every image is decoded once, resized to --size x --size and stored as raw pixels or, with
+--format jpeg, re-encoded as a JPEG at that reduced size. Shards are written to
+<SHARD_DIR>/<train|test>/ (SHARD_DIR defaults to <ROOT_DIR>/shards); meta.json is written
+last, so an interrupted conversion is never picked up by training.
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from torch.utils.data import DataLoader
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+add_path(os.path.abspath('..'))
+
+from pycls.core.config import cfg
+from pycls.datasets.data import Data
+from pycls.datasets.shards import FORMATS, RESIZE_MODES, ShardEncoder, shard_file, write_meta
+from pycls.datasets.utils.feature_store import write_npy_atomic
+import pycls.datasets.utils as ds_utils
+
+DEFAULT_SIZES = {'TINYIMAGENET': 64, 'DOMAINNET': 256, 'IMAGENET': 256, 'IMAGENET100': 256}
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='Convert a dataset to pre-resized uint8 shards')
+    parser.add_argument('--cfg', dest='cfg_file', help='Config file', required=True, type=str)
+    parser.add_argument('--size', help='Stored image side (default: 64 for TINYIMAGENET, 256 otherwise)', default=None, type=int)
+    parser.add_argument('--format', help='Stored record format', default='raw', choices=FORMATS)
+    parser.add_argument('--quality', help='JPEG quality of the jpeg format', default=90, type=int)
+    parser.add_argument('--resize', help='crop: resize shorter side and center-crop, stretch: resize both sides',
+                        default='crop', choices=RESIZE_MODES)
+    parser.add_argument('--shard_size', help='Images per shard', default=8192, type=int)
+    parser.add_argument('--batch_size', help='Images per worker batch; must divide shard_size', default=256, type=int)
+    parser.add_argument('--workers', help='Decoding workers', default=8, type=int)
+    parser.add_argument('--splits', help='Splits to convert', default=['train', 'test'], nargs='+', choices=['train', 'test'])
+    return parser
+
+
+def shard_batches(length, batch_size):
+    """Index batches in storage order; as batch_size divides shard_size, no batch crosses a shard boundary."""
+    return [list(range(start, min(start + batch_size, length))) for start in range(0, length, batch_size)]
+
+
+def collate_records(batch):
+    return [record for record, _ in batch]
+
+
+def convert(data_obj, split, split_dir, encoder, args):
+    dataset, length = data_obj.getDataset(save_dir=cfg.DATASET.ROOT_DIR, isTrain=split == 'train', isDownload=False)
+    dataset.transform = encoder
+    dataset.test_transform = encoder
+    dataset.no_aug = True
+    os.makedirs(split_dir, exist_ok=True)
+
+    labels = ds_utils.get_targets(dataset)
+
+    def fill_labels(out):
+        out[:] = labels
+    write_npy_atomic(os.path.join(split_dir, 'labels.npy'), labels.shape, np.int64, fill_labels)
+
+    loader = DataLoader(dataset, batch_sampler=shard_batches(length, args.batch_size),
+                        num_workers=args.workers, collate_fn=collate_records)
+    batches = iter(loader)
+    num_shards = (length + args.shard_size - 1) // args.shard_size
+    start_time = time.time()
+    for k in range(num_shards):
+        count = min(args.shard_size, length - k * args.shard_size)
+        records = []
+        while len(records) < count:
+            records.extend(next(batches))
+
+        if encoder.fmt == 'raw':
+            def fill_images(out):
+                for i, record in enumerate(records):
+                    out[i] = record
+            write_npy_atomic(shard_file(split_dir, 'images', k), (count, encoder.size, encoder.size, 3), np.uint8, fill_images)
+        else:
+            offsets = np.zeros(count + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(record) for record in records])
+
+            def fill_jpeg(out):
+                for i, record in enumerate(records):
+                    out[offsets[i]:offsets[i + 1]] = record
+
+            def fill_offsets(out):
+                out[:] = offsets
+            write_npy_atomic(shard_file(split_dir, 'jpeg', k), (int(offsets[-1]),), np.uint8, fill_jpeg)
+            write_npy_atomic(shard_file(split_dir, 'offsets', k), offsets.shape, np.int64, fill_offsets)
+
+        done = k * args.shard_size + count
+        print(f'{split}: shard {k + 1}/{num_shards}, {done}/{length} images, {done / (time.time() - start_time):.1f} images/sec')
+
+    write_meta(split_dir, {'format': encoder.fmt, 'size': encoder.size, 'quality': encoder.quality,
+                           'resize': encoder.resize, 'num_samples': length, 'shard_size': args.shard_size,
+                           'dataset': cfg.DATASET.NAME})
+
+
+def main(args):
+    cfg.merge_from_file(args.cfg_file)
+    cfg.DATASET.ROOT_DIR = os.path.join(os.path.abspath('..'), cfg.DATASET.ROOT_DIR)
+    assert cfg.DATASET.NAME in DEFAULT_SIZES, f'{cfg.DATASET.NAME} cannot be converted; expected one of {list(DEFAULT_SIZES)}'
+    assert args.shard_size % args.batch_size == 0, 'batch_size must divide shard_size'
+    shard_dir = cfg.DATASET.SHARD_DIR or os.path.join(cfg.DATASET.ROOT_DIR, 'shards')
+
+    # read the native storage, images only
+    cfg.DATASET.BACKEND = 'native'
+    cfg.MODEL.LINEAR_FROM_FEATURES = False
+    data_obj = Data(cfg)
+
+    size = args.size or DEFAULT_SIZES[cfg.DATASET.NAME]
+    encoder = ShardEncoder(size, fmt=args.format, quality=args.quality, resize=args.resize)
+    for split in args.splits:
+        convert(data_obj, split, os.path.join(shard_dir, split), encoder, args)
+
+
+if __name__ == "__main__":
+    main(argparser().parse_args())
@@ -23,9 +23,11 @@ add_path(os.path.abspath('../..'))
 from pycls.al.ActiveLearning import ActiveLearning
 import pycls.core.builders as model_builder
 from pycls.core.config import cfg, dump_cfg
+from pycls.core.ensemble_trainer import train_stacked_ensemble
 import pycls.core.losses as losses
 import pycls.core.optimizer as optim
 from pycls.datasets.data import Data
+from pycls.datasets.pool_state import PoolState
 import pycls.utils.checkpoint as cu
 import pycls.utils.logging as lu
 import pycls.utils.metrics as mu
@@ -146,12 +148,18 @@ def main(cfg):
 
     lSet, uSet, valSet = data_obj.loadPartitions(lSetPath=cfg.ACTIVE_LEARNING.LSET_PATH, \
             uSetPath=cfg.ACTIVE_LEARNING.USET_PATH, valSetPath = cfg.ACTIVE_LEARNING.VALSET_PATH)
+    pool = PoolState(len(train_data), lSet, uSet, valSet)
 
     print("Data Partitioning Complete. \nLabeled Set: {}, Unlabeled Set: {}, Validation Set: {}\n".format(len(lSet), len(uSet), len(valSet)))
     logger.info("Labeled Set: {}, Unlabeled Set: {}, Validation Set: {}\n".format(len(lSet), len(uSet), len(valSet)))
 
+    # Batched ensembles decode every lSet image once and augment it once per member
+    lSet_data = train_data
+    if cfg.ENSEMBLE.BATCHED and not cfg.MODEL.LINEAR_FROM_FEATURES:
+        lSet_data = data_obj.getMultiViewDataset(train_data, cfg.ENSEMBLE.NUM_MODELS)
+
     # Preparing dataloaders for initial training
-    lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+    lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=lSet_data)
     valSet_loader = data_obj.getIndexesDataLoader(indexes=valSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
     test_loader = data_obj.getTestLoader(data=test_data, test_batch_size=cfg.TRAIN.BATCH_SIZE, seed_id=cfg.RNG_SEED)
 
@@ -183,34 +191,46 @@ def main(cfg):
 
         best_model_paths = []
         test_accs = []
-        for i in range(num_ensembles):
-            print("=== Training ensemble [{}/{}] ===".format(i+1, num_ensembles))
+        if cfg.ENSEMBLE.BATCHED:
+            print("=== Training {} ensemble models at once ===".format(num_ensembles))
+            best_val_accs, best_val_epochs, best_model_paths = train_stacked_ensemble(lSet_loader, valSet_loader, models, cfg, is_eval_epoch)
+            for i in range(num_ensembles):
+                print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_accs[i], 4), best_val_epochs[i]))
+                logger.info("EPISODE {} Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(cur_episode, i+1, round(best_val_accs[i], 4), best_val_epochs[i]))
+
+                test_acc = ensemble_test_model(test_loader, best_model_paths[i], cfg, cur_episode)
+                test_accs.append(test_acc)
+                print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
+                logger.info("EPISODE {} Test Accuracy by Model {}: {}.\n".format(cur_episode, i+1, test_acc))
+        else:
+            for i in range(num_ensembles):
+                print("=== Training ensemble [{}/{}] ===".format(i+1, num_ensembles))
 
-            # Construct the optimizer
-            optimizer = optim.construct_optimizer(cfg, models[i])
-            print("optimizer: {}\n".format(optimizer))
-            logger.info("optimizer: {}\n".format(optimizer))
+                # Construct the optimizer
+                optimizer = optim.construct_optimizer(cfg, models[i])
+                print("optimizer: {}\n".format(optimizer))
+                logger.info("optimizer: {}\n".format(optimizer))
 
-            # Each ensemble gets its own output directory
-            cfg.EPISODE_DIR = os.path.join(cfg.EPISODE_DIR, 'model_{}'.format(i+1))
+                # Each ensemble gets its own output directory
+                cfg.EPISODE_DIR = os.path.join(cfg.EPISODE_DIR, 'model_{}'.format(i+1))
 
-            # Train the model
-            best_val_acc, best_val_epoch, checkpoint_file = ensemble_train_model(lSet_loader, valSet_loader, models[i], optimizer, cfg)
-            best_model_paths.append(checkpoint_file)
+                # Train the model
+                best_val_acc, best_val_epoch, checkpoint_file = ensemble_train_model(lSet_loader, valSet_loader, models[i], optimizer, cfg)
+                best_model_paths.append(checkpoint_file)
 
-            print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
-            logger.info("EPISODE {} Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(cur_episode, i+1, round(best_val_acc, 4), best_val_epoch))
+                print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
+                logger.info("EPISODE {} Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(cur_episode, i+1, round(best_val_acc, 4), best_val_epoch))
 
-            # Test the model
-            print("=== Testing ensemble [{}/{}] ===".format(i+1, num_ensembles))
-            test_acc = ensemble_test_model(test_loader, checkpoint_file, cfg, cur_episode)
-            test_accs.append(test_acc)
+                # Test the model
+                print("=== Testing ensemble [{}/{}] ===".format(i+1, num_ensembles))
+                test_acc = ensemble_test_model(test_loader, checkpoint_file, cfg, cur_episode)
+                test_accs.append(test_acc)
 
-            print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
-            logger.info("EPISODE {} Test Accuracy by Model {}: {}.\n".format(cur_episode, i+1, test_acc))
+                print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
+                logger.info("EPISODE {} Test Accuracy by Model {}: {}.\n".format(cur_episode, i+1, test_acc))
 
-            # Reset EPISODE_DIR
-            cfg.EPISODE_DIR = episode_dir
+                # Reset EPISODE_DIR
+                cfg.EPISODE_DIR = episode_dir
 
         # Test each best model checkpoint and report the average
         print("======== ENSEMBLE TESTING ========\n")
@@ -260,10 +280,10 @@ def main(cfg):
         data_obj.saveSets(lSet, uSet, activeSet, cfg.EPISODE_DIR)
 
         # Add activeSet to lSet, save new_uSet as uSet and update dataloader for the next episode
-        lSet = np.append(lSet, activeSet)
-        uSet = new_uSet
+        pool.label(activeSet, new_uSet)
+        lSet, uSet = pool.lSet, pool.uSet
 
-        lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+        lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=lSet_data)
         valSet_loader = data_obj.getIndexesDataLoader(indexes=valSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
 
         print("Ensemble Active Sampling Complete. After Episode {}:\nNew Labeled Set: {}, New Unlabeled Set: {}, Active Set: {}\n".format(cur_episode, len(lSet), len(uSet), len(activeSet)))
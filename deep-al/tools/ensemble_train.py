@@ -21,6 +21,7 @@ add_path(os.path.abspath('../..'))
 
 import pycls.core.builders as model_builder
 from pycls.core.config import cfg, dump_cfg
+from pycls.core.ensemble_trainer import train_stacked_ensemble
 import pycls.core.losses as losses
 import pycls.core.optimizer as optim
 from pycls.datasets.data import Data
@@ -144,7 +145,11 @@ def main(cfg):
     logger.info("\nTrain Set: {},  Validation Set: {}\n".format(len(trainSet), len(valSet)))
 
     # Preparing dataloaders for initial training
-    trainSet_loader = data_obj.getIndexesDataLoader(indexes=trainSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+    # Batched ensembles decode every training image once and augment it once per member
+    trainSet_data = train_data
+    if cfg.ENSEMBLE.BATCHED and not cfg.MODEL.LINEAR_FROM_FEATURES:
+        trainSet_data = data_obj.getMultiViewDataset(train_data, cfg.ENSEMBLE.NUM_MODELS)
+    trainSet_loader = data_obj.getIndexesDataLoader(indexes=trainSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=trainSet_data)
     valSet_loader = data_obj.getIndexesDataLoader(indexes=valSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
     test_loader = data_obj.getTestLoader(data=test_data, test_batch_size=cfg.TRAIN.BATCH_SIZE, seed_id=cfg.RNG_SEED)
 
@@ -165,34 +170,46 @@ def main(cfg):
 
     best_model_paths = []
     test_accs = []
-    for i in range(num_ensembles):
-        print("=== Training ensemble [{}/{}] ===".format(i+1, num_ensembles))
+    if cfg.ENSEMBLE.BATCHED:
+        print("=== Training {} ensemble models at once ===".format(num_ensembles))
+        best_val_accs, best_val_epochs, best_model_paths = train_stacked_ensemble(trainSet_loader, valSet_loader, models, cfg, is_eval_epoch)
+        for i in range(num_ensembles):
+            print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_accs[i], 4), best_val_epochs[i]))
+            logger.info("Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(i+1, round(best_val_accs[i], 4), best_val_epochs[i]))
+
+            test_acc = ensemble_test_model(test_loader, best_model_paths[i], cfg, cur_episode=0)
+            test_accs.append(test_acc)
+            print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
+            logger.info("Test Accuracy by Model {}: {}.\n".format(i+1, test_acc))
+    else:
+        for i in range(num_ensembles):
+            print("=== Training ensemble [{}/{}] ===".format(i+1, num_ensembles))
 
-        # Construct the optimizer
-        optimizer = optim.construct_optimizer(cfg, models[i])
-        print("optimizer: {}\n".format(optimizer))
-        logger.info("optimizer: {}\n".format(optimizer))
+            # Construct the optimizer
+            optimizer = optim.construct_optimizer(cfg, models[i])
+            print("optimizer: {}\n".format(optimizer))
+            logger.info("optimizer: {}\n".format(optimizer))
 
-        # Each ensemble gets its own output directory
-        cfg.EPISODE_DIR = os.path.join(cfg.EPISODE_DIR, 'model_{}   '.format(i+1))
+            # Each ensemble gets its own output directory
+            cfg.EPISODE_DIR = os.path.join(cfg.EPISODE_DIR, 'model_{}   '.format(i+1))
 
-        # Train the model
-        best_val_acc, best_val_epoch, checkpoint_file = ensemble_train_model(trainSet_loader, valSet_loader, models[i], optimizer, cfg)
-        best_model_paths.append(checkpoint_file)
+            # Train the model
+            best_val_acc, best_val_epoch, checkpoint_file = ensemble_train_model(trainSet_loader, valSet_loader, models[i], optimizer, cfg)
+            best_model_paths.append(checkpoint_file)
 
-        print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
-        logger.info("Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
+            print("Best Validation Accuracy by Model {}: {}\nBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
+            logger.info("Best Validation Accuracy by Model {}: {}\tBest Epoch: {}\n".format(i+1, round(best_val_acc, 4), best_val_epoch))
 
-        # Test the model
-        print("=== Testing ensemble [{}/{}] ===".format(i+1, num_ensembles))
-        test_acc = ensemble_test_model(test_loader, checkpoint_file, cfg, cur_episode=0)
-        test_accs.append(test_acc)
+            # Test the model
+            print("=== Testing ensemble [{}/{}] ===".format(i+1, num_ensembles))
+            test_acc = ensemble_test_model(test_loader, checkpoint_file, cfg, cur_episode=0)
+            test_accs.append(test_acc)
 
-        print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
-        logger.info("Test Accuracy by Model {}: {}.\n".format(i+1, test_acc))
+            print("Test Accuracy by Model {}: {}.\n".format(i+1, round(test_acc, 4)))
+            logger.info("Test Accuracy by Model {}: {}.\n".format(i+1, test_acc))
 
-        # Reset EPISODE_DIR
-        cfg.EPISODE_DIR = cfg.EXP_DIR
+            # Reset EPISODE_DIR
+            cfg.EPISODE_DIR = cfg.EXP_DIR
 
     # Test each best model checkpoint and report the average
     print("======== ENSEMBLE TESTING ========\n")
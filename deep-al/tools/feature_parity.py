@@ -0,0 +1,89 @@
+# Copyright (c) 2025-present, Royal Bank of Canada.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Selection parity of fp16 / int8 feature storage against float32.
+
+For every precision, reports the memory footprint of the normalized features, the
+reconstruction error of the dequantized rows, the edge Jaccard of the delta radius graph
+and the overlap of the greedy k-center selection with the float32 result, on a random pool.
+Results are written to <OUT_DIR>/<DATASET>/feature_parity/results.json.
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+add_path(os.path.abspath('..'))
+
+from pycls.al.kcenter import KCenterGreedy
+from pycls.al.radius_graph import torch_radius_graph
+from pycls.core.config import cfg
+import pycls.datasets.utils as ds_utils
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='Quantized feature parity')
+    parser.add_argument('--cfg', dest='cfg_file', help='Config file', required=True, type=str)
+    parser.add_argument('--feature', help='selection features', default='simclr', type=str)
+    parser.add_argument('--seed', help='Random seed', default=1, type=int)
+    parser.add_argument('--pool_size', help='Number of points the graph and k-center are run on', default=20000, type=int)
+    parser.add_argument('--num_labeled', help='Number of labeled points of the pool', default=100, type=int)
+    parser.add_argument('--budget', help='Number of points k-center selects', default=100, type=int)
+    parser.add_argument('--delta', help='Radius of the graph', default=0.6, type=float)
+    return parser
+
+
+def edge_set(features, delta):
+    xs, ys, _ = torch_radius_graph(features, delta)
+    return set(zip(xs.tolist(), ys.tolist()))
+
+
+def main(args):
+    cfg.merge_from_file(args.cfg_file)
+    cfg.OUT_DIR = os.path.join(os.path.abspath('..'), cfg.OUT_DIR)
+    out_dir = os.path.join(cfg.OUT_DIR, cfg.DATASET.NAME, 'feature_parity')
+    os.makedirs(out_dir, exist_ok=True)
+
+    features = {precision: ds_utils.load_features(cfg.DATASET.NAME, args.seed, train=True, feature_type=args.feature,
+                                                  precision=precision)
+                for precision in ds_utils.PRECISIONS}
+    reference = features['fp32']
+    rng = np.random.default_rng(args.seed)
+    pool = np.sort(rng.choice(len(reference), min(args.pool_size, len(reference)), replace=False))
+    labeled, unlabeled = pool[:args.num_labeled], pool[args.num_labeled:]
+
+    ref_edges = edge_set(reference[pool], args.delta)
+    ref_picks, _ = KCenterGreedy(reference[labeled], reference[unlabeled]).select(args.budget)
+
+    results = {}
+    for precision, feats in features.items():
+        stats = {'nbytes': int(feats.nbytes), 'ratio_to_fp32': feats.nbytes / reference.nbytes}
+        if precision != 'fp32':
+            err = np.abs(feats[pool] - reference[pool])
+            stats['max_abs_error'] = float(err.max())
+            stats['mean_abs_error'] = float(err.mean())
+
+            edges = edge_set(feats.take(pool), args.delta)
+            stats['edge_jaccard'] = len(edges & ref_edges) / max(len(edges | ref_edges), 1)
+            picks, _ = KCenterGreedy(feats[labeled], feats[unlabeled]).select(args.budget)
+            stats['kcenter_overlap'] = len(set(picks) & set(ref_picks)) / args.budget
+        results[precision] = stats
+        print(f'{precision}: {stats}')
+
+    with open(os.path.join(out_dir, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(argparser().parse_args())
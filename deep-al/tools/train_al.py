@@ -28,6 +28,8 @@ import pycls.core.losses as losses
 import pycls.core.optimizer as optim
 from pycls.core.builders import NNNet, FeaturesNet, KernelizedNet, LinearKernel
 from pycls.datasets.data import Data
+from pycls.datasets.pool_state import PoolState
+from pycls.utils.artifacts import ArtifactStore
 import pycls.utils.checkpoint as cu
 import pycls.utils.logging as lu
 import pycls.utils.metrics as mu
@@ -83,6 +85,12 @@ def argparser():
                         default='fc', type=str)
     parser.add_argument('--normalize', help='normalization for uherding', type=str2bool, default=False)
     parser.add_argument('--adaptive_delta', help='use adaptive_delta', type=str2bool, default=False)
+    parser.add_argument('--time_budget', help='wall-clock budget (sec) for greedy selection, <= 0 disables it',
+                        type=float, default=0.0)
+    parser.add_argument('--feature_precision', help='precision of normalized ProbCover features (fp32, fp16, int8)',
+                        default='fp32', type=str)
+    parser.add_argument('--lset_cache', help='train from a decoded labeled-set cache with batched augmentation',
+                        type=str2bool, default=False)
 
     # Calibration
     parser.add_argument('--gamma', help='gamma for focal loss', type=float, default=0)
@@ -169,6 +177,8 @@ def main(cfg):
     else:
         print("Experiment Directory Already Exists: {}. Reusing it may lead to loss of old logs in the directory.\n".format(exp_dir))
     cfg.EXP_DIR = exp_dir
+    cfg.ARTIFACT_DIR = os.path.join(exp_dir, 'artifacts')
+    artifacts = ArtifactStore(cfg.ARTIFACT_DIR, fp16_logits=cfg.ARTIFACT_FP16_LOGITS)
 
     # Save the config file in EXP_DIR
     dump_cfg(cfg)
@@ -195,6 +205,8 @@ def main(cfg):
 
     lSet, uSet, valSet = data_obj.loadPartitions(lSetPath=cfg.ACTIVE_LEARNING.LSET_PATH, \
             uSetPath=cfg.ACTIVE_LEARNING.USET_PATH, valSetPath = cfg.ACTIVE_LEARNING.VALSET_PATH)
+    pool = PoolState(len(train_data), lSet, uSet, valSet)
+    artifacts.start_pool(pool)
 
     # Initialize the model.
     model = model_builder.build_model(cfg).cuda()
@@ -239,6 +251,7 @@ def main(cfg):
     test_ents = []
     temps = []
     deltas = []
+    num_exact_picks = []
     budget_regimes = []
     for cur_episode in range(0, cfg.ACTIVE_LEARNING.MAX_ITER+1):
 
@@ -250,10 +263,8 @@ def main(cfg):
         if not os.path.exists(episode_dir):
             os.mkdir(episode_dir)
         cfg.EPISODE_DIR = episode_dir
-        cfg.COVERAGE_PATH = os.path.join(episode_dir, 'coverage.npy')
-        cfg.UNCERTAINTY_PATH = os.path.join(episode_dir, 'uncertainty.npy')
-        cfg.INDICES_PATH = os.path.join(episode_dir, 'indices.npy')
-        cfg.LOGIT_PATH = os.path.join(episode_dir, 'logits.npy')
+        cfg.EPISODE = cur_episode
+        episode_metrics = {}
 
         # Active Sample
         print("======== ACTIVE SAMPLING ========\n")
@@ -272,7 +283,7 @@ def main(cfg):
                 num_temp_vSet = int(len(lSet) * 0.3)
 
                 temp_lSet, temp_valSet = lSet[:-num_temp_vSet], lSet[-num_temp_vSet:]
-                temp_lSet_loader = data_obj.getIndexesDataLoader(indexes=temp_lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+                temp_lSet_loader = data_obj.getLabeledSetLoader(indexes=temp_lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
                 temp_valSet_loader = data_obj.getIndexesDataLoader(indexes=temp_valSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
 
                 best_val_acc, best_val_epoch, tmp_checkpoint_file = train_model(
@@ -303,24 +314,30 @@ def main(cfg):
                 train_dataloader=lSet_loader)
             sample_time = time.time() - start_time
             sample_times.append(sample_time)
+            episode_metrics['sample_time'] = sample_time
             if hasattr(al_obj, 'delta'):
                 deltas.append(al_obj.delta)
             if hasattr(al_obj, 'budget_regime'):
                 budget_regimes.append(al_obj.budget_regime)
+            if hasattr(al_obj, 'exact_picks'):
+                artifacts.append('exact_picks', cur_episode, al_obj.exact_picks)
+                num_exact_picks.append(int(al_obj.exact_picks.sum()))
+                episode_metrics['num_exact_picks'] = num_exact_picks[-1]
+                print(f'exact picks: {num_exact_picks}')
 
             print(f'temperatues: {temps}')
             print(f'deltas: {deltas}')
             print(f'budget_regimes: {budget_regimes}')
             print(f'sample_times: {sample_times}')
 
-            # Save current lSet, new_uSet and activeSet in the episode directory
-            data_obj.saveSets(lSet, uSet, activeSet, cfg.EPISODE_DIR)
+            # Journal the activeSet, lSet/uSet of any episode are replayed from it
+            artifacts.append_labeled(cur_episode, activeSet)
 
             # Add activeSet to lSet, save new_uSet as uSet and update dataloader for the next episode
-            lSet = np.append(lSet, activeSet)
-            uSet = new_uSet
+            pool.label(activeSet, new_uSet)
+            lSet, uSet = pool.lSet, pool.uSet
 
-            lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+            lSet_loader = data_obj.getLabeledSetLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
             uSet_loader = data_obj.getSequentialDataLoader(indexes=uSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
 
             print("Active Sampling Complete. After Episode {}:\nNew Labeled Set: {}, New Unlabeled Set: {}, Active Set: {}\n".format(cur_episode, len(lSet), len(uSet), len(activeSet)))
@@ -328,7 +345,7 @@ def main(cfg):
             print("================================\n\n")
             logger.info("================================\n\n")
         else:
-            lSet_loader = data_obj.getIndexesDataLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
+            lSet_loader = data_obj.getLabeledSetLoader(indexes=lSet, batch_size=cfg.TRAIN.BATCH_SIZE, data=train_data)
             print(f"Active Sampling Skippped - Episode: {cur_episode}, lSet: {len(lSet)}")
 
         if checkpoint_file is not None:
@@ -359,6 +376,8 @@ def main(cfg):
         test_accs.append(test_acc)
         test_eces.append(test_ece)
         test_ents.append(test_ent)
+        artifacts.append_metrics(cur_episode, test_acc=float(test_acc), test_ece=float(test_ece),
+                                 test_ent=float(test_ent), num_labeled=len(lSet), **episode_metrics)
         print(test_accs)
         print(test_eces)
         print(test_ents)
@@ -368,6 +387,7 @@ def main(cfg):
             # Save current lSet, uSet in the final episode directory
             data_obj.saveSet(lSet, 'lSet', cfg.EPISODE_DIR)
             data_obj.saveSet(uSet, 'uSet', cfg.EPISODE_DIR)
+            pool.save(os.path.join(cfg.EPISODE_DIR, 'pool_state.npz'))
             break
 
         if not cfg.MODEL.KERNELIZE and not cfg.MODEL.NN:
@@ -415,6 +435,14 @@ def main(cfg):
     np.save(delta_path, deltas)
     print(f'save deltas to {delta_path}')
 
+    num_exact_picks = np.array(num_exact_picks)
+    exact_path = os.path.join(cfg.EXP_DIR, 'num_exact_picks.npy')
+    np.save(exact_path, num_exact_picks)
+    print(f'save num_exact_picks to {exact_path}')
+
+    if data_obj.loaders is not None:
+        data_obj.loaders.shutdown()
+
 
 
 def train_model(train_loader, val_loader, model, optimizer, cfg):
@@ -674,6 +702,9 @@ if __name__ == "__main__":
     cfg.ACTIVE_LEARNING.KERNEL = args.kernel
     cfg.ACTIVE_LEARNING.FEATURE = args.feature
     cfg.ACTIVE_LEARNING.HERDING_INIT = args.herding_init
+    cfg.ACTIVE_LEARNING.TIME_BUDGET = args.time_budget
+    cfg.ACTIVE_LEARNING.FEATURE_PRECISION = args.feature_precision
+    cfg.DATA_LOADER.LSET_CACHE = args.lset_cache
 
     # uherding
     cfg.ACTIVE_LEARNING.UNC_TRANS_FN = args.unc_trans_fn